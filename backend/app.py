@@ -1,55 +1,74 @@
 # app.py
 # This is a FastAPI application for a chatbot using Groq API
 # You can modify this file to change the chatbot behavior
-from fastapi import FastAPI, Request, HTTPException, Depends, status
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, FastAPI, Request, Response, HTTPException, Depends, Query, status, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-from groq import Groq
 import os
 import re
-import bcrypt
+import math
 import jwt
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from typing import Dict, Optional, List
 import time
+import asyncio
+from contextlib import asynccontextmanager
 import hashlib
 import secrets
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Import database models and session
-from database import get_db, User, Conversation, Message, engine, Base
+from database import get_async_db, AsyncSessionLocal, User, Conversation, Message, async_engine, create_tables
+from db_pool import pool_metrics
+from metrics import METRICS_ENABLED, MetricsMiddleware, add_collector, configure_tracing, render_metrics, span, watch_queries
+from streaming import StreamingResponseCleaner, sse_event
+from context import build_prompt_messages, load_recent_history, summary_message
+from auth_cache import CachedUser, user_cache, user_key
+from rate_limit import RateLimitResult, rate_limiter
+from response_cache import RESPONSE_CACHE_ENABLED, response_cache, response_cache_key
+from singleflight import SINGLEFLIGHT_ENABLED, llm_flight
+from llm_gateway import llm_gateway
+from llm_scheduler import LLM_SCHEDULER_ENABLED, SchedulerOverloaded, llm_scheduler
+from persistence import WRITE_BEHIND_ENABLED, PendingExchange, PersistenceBackpressure, PersistencePending, message_writer
+from passwords import PasswordPoolSaturated, needs_rehash, password_hasher
+from history import InvalidCursor, list_conversations, load_messages_for, load_summaries_for, load_message_page, count_messages
+from search import InvalidQuery, SearchUnavailable, search_messages
+from archive import archiver, load_archive_summaries, load_archived_message_page, load_archives
+from responses import RESPONSE_COMPRESSION_ENABLED, CompressionMiddleware, FastJSONResponse, etag_for, etag_matches
+from sync import load_changes
+from compaction import COMPACTION_ENABLED, compactor
+from moderation import MODERATED_RESPONSE, MODERATION_ENABLED, moderator
+from deletion import delete_account, delete_conversations
+from export import EXPORT_EXTENSIONS, EXPORT_MEDIA_TYPES, decode_export_cursor, export_chunks
+from usage import USAGE_ENABLED, QuotaExceeded, charge, usage_tracker
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize database tables on startup
+# Schema changes are applied by init_db.py (or the Alembic CLI) before the
+# server starts, not on import; set DB_MIGRATE_ON_STARTUP for single-process
+# development setups that want the app to migrate itself.
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "false").lower() == "true"
+READINESS_TIMEOUT_SECONDS = float(os.getenv("READINESS_TIMEOUT_SECONDS", "2"))
+
 def init_db():
     """Initialize database tables"""
     try:
-        Base.metadata.create_all(bind=engine)
+        create_tables()
         print("✅ Database tables created successfully")
     except Exception as e:
         print(f"⚠️ Database initialization warning: {e}")
 
-# Initialize database on startup
-init_db()
-
-app = FastAPI()
+router = APIRouter()
 
 # Set up templates
-templates = Jinja2Templates(directory="templates")
-
-# Set Groq API key from environment variable
-groq_api_key = os.getenv("GROQ_API_KEY")
-if not groq_api_key:
-    raise ValueError("GROQ_API_KEY environment variable is not set")
-
-client = Groq(api_key=groq_api_key)
+templates = Jinja2Templates(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates"))
 
 # JWT Configuration
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
@@ -58,16 +77,15 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 # Database storage is now used instead of in-memory storage
 
-# Rate limiting
-request_counts: Dict[str, List[float]] = {}
-RATE_LIMIT_PER_MINUTE = 10
-
 # Chat configuration
 CHAT_CONFIG = {
     "model": "llama3-8b-8192",
+    "fallback_models": ["llama-3.1-8b-instant"],  # tried in order when the model above is failing
     "temperature": 0.7,
     "max_tokens": 512,
     "max_history": 10,
+    "max_context_tokens": 4096,  # prompt budget for system prompt + history + new message
+    "cache_sampled_responses": True,  # reuse cached answers even when temperature > 0
     "system_prompt": "You are a helpful, professional, and friendly AI assistant. You provide accurate, helpful responses while maintaining a conversational tone. Always be respectful and considerate in your interactions.",
     "max_input_length": 1000
 }
@@ -78,18 +96,56 @@ security = HTTPBearer()
 # Pydantic models
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None  # continue an existing conversation
+    cache: bool = True  # set False to always get a freshly sampled answer
 
 class ChatResponse(BaseModel):
     response: str
     session_id: str
     timestamp: str
 
+class HistoryMessage(BaseModel):
+    role: str  # 'user' or 'assistant'
+    content: str
+
 class ChatHistoryResponse(BaseModel):
     session_id: str
-    messages: List[Dict[str, str]]
+    messages: List[HistoryMessage]
     created_at: str
     last_activity: str
     message_count: int
+    next_cursor: Optional[str] = None  # pages towards older messages
+
+class SearchResult(BaseModel):
+    session_id: str
+    message_id: int
+    role: str
+    snippet: str  # HTML-escaped, matched terms wrapped in <mark>
+    timestamp: str
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+    next_cursor: Optional[str] = None
+
+class SyncMessage(BaseModel):
+    id: int  # stable across syncs; dedupe on it
+    role: str
+    content: str
+    timestamp: str
+
+class SyncConversation(BaseModel):
+    session_id: str
+    created_at: str
+    last_activity: str
+    messages: List[SyncMessage]  # only messages new since the cursor
+
+class SyncResponse(BaseModel):
+    conversations: List[SyncConversation]  # created or continued since the cursor
+    deleted: List[str]  # session ids to drop
+    cursor: str  # send back as `cursor` on the next sync
+    has_more: bool  # more changes are waiting; sync again right away
+    reset: bool  # a full snapshot: discard the local copy first
 
 class UserSignup(BaseModel):
     username: str
@@ -108,15 +164,32 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
 
-def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+def password_pool_busy() -> HTTPException:
+    """429 returned when the password hashing pool is saturated"""
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many login attempts in progress. Please retry shortly.",
+        headers={"Retry-After": "1"},
+    )
+
+def llm_overloaded(error: SchedulerOverloaded) -> HTTPException:
+    """503 returned when the upstream LLM queue is full"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="The assistant is busy right now. Please retry shortly.",
+        headers={"Retry-After": str(math.ceil(error.retry_after))},
+    )
 
-def verify_password(password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+async def wait_for_writes(user_id: int):
+    """Wait for the user's queued messages to be written; 503 rather than reading history without them"""
+    try:
+        await message_writer.barrier(user_id)
+    except PersistencePending:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Your latest messages are still being saved. Please retry shortly.",
+            headers={"Retry-After": "1"},
+        )
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
@@ -125,65 +198,103 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    # Sub-second iat (a NumericDate may be fractional), compared with the account's created_at
+    to_encode.update({"exp": expire, "iat": time.time()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[str]:
-    """Verify JWT token and return username"""
+def decode_token(token: str) -> Optional[dict]:
+    """Verify JWT token and return its claims"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+        if payload.get("sub") is None:
             return None
-        return username
+        return payload
     except jwt.PyJWTError:
         return None
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+def verify_token(token: str) -> Optional[str]:
+    """Verify JWT token and return username"""
+    payload = decode_token(token)
+    return payload["sub"] if payload else None
+
+def token_claims(user) -> dict:
+    """Claims identifying a user in an access token"""
+    return {"sub": user.username, "uid": user.id}
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_async_db)):
     """Get current user from JWT token"""
-    token = credentials.credentials
-    username = verify_token(token)
-    if username is None:
+    return await authenticate_token(credentials.credentials, db)
+
+async def authenticate_token(token: str, db: AsyncSession) -> CachedUser:
+    """Resolve a bearer token to its user or raise 401
+
+    Served from the user cache when possible, so the hot path does no query.
+    """
+    with span("jwt_decode"):
+        payload = decode_token(token)
+    if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    username = payload["sub"]
+    uid = payload.get("uid")
     
-    # Get user from database
-    user = db.query(User).filter(User.username == username).first()
+    with span("user_lookup"):
+        # Keyed by id and checked against the name, so a token never resolves to another account
+        if uid is not None:
+            cached = await user_cache.get(user_key(uid))
+            if cached is not None and cached.id == uid and cached.username == username and cached.issued_token(payload):
+                return cached
+        
+        # Get user from database (by primary key when the token carries the id)
+        lookup_started = time.perf_counter()
+        if uid is not None:
+            user = await db.get(User, uid)
+            if user is not None and user.username != username:
+                user = None
+        else:
+            result = await db.execute(select(User).where(User.username == username))
+            user = result.scalars().first()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return user
+    if user.is_active is False:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Inactive user",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    cached = CachedUser(id=user.id, username=user.username, email=user.email, is_active=True,
+                        created_at=user.created_at)
+    if not cached.issued_token(payload):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    # Tokens issued before the uid claim are looked up by name every time
+    if uid is not None:
+        await user_cache.store(user_key(user.id), cached, lookup_started)
+    return cached
 
 def generate_session_id() -> str:
     """Generate a unique session ID"""
     return hashlib.sha256(f"{time.time()}{secrets.token_hex(8)}".encode()).hexdigest()[:16]
 
-def check_rate_limit(ip_address: str) -> bool:
-    """Simple rate limiting implementation"""
-    current_time = time.time()
-    minute_ago = current_time - 60
-    
-    # Clean old entries
-    if ip_address in request_counts:
-        request_counts[ip_address] = [req_time for req_time in request_counts[ip_address] 
-                                     if req_time > minute_ago]
-    
-    # Check if limit exceeded
-    if len(request_counts.get(ip_address, [])) >= RATE_LIMIT_PER_MINUTE:
-        return False
-    
-    # Add current request
-    if ip_address not in request_counts:
-        request_counts[ip_address] = []
-    request_counts[ip_address].append(current_time)
-    return True
+async def check_rate_limit(ip_address: str, user_id: Optional[int] = None) -> RateLimitResult:
+    """Rate limit by user id and by client IP; both must have budget left"""
+    if user_id is not None:
+        result = await rate_limiter.hit(f"user:{user_id}")
+        if not result.allowed:
+            return result
+    return await rate_limiter.hit(f"ip:{ip_address}")
 
 def validate_input(text: str) -> tuple[bool, str]:
     """Validate user input"""
@@ -193,9 +304,8 @@ def validate_input(text: str) -> tuple[bool, str]:
     if len(text.strip()) > CHAT_CONFIG["max_input_length"]:
         return False, f"Message too long (max {CHAT_CONFIG['max_input_length']} characters)"
     
-    # Basic content filtering
-    inappropriate_words = ['spam', 'advertisement']  # Add more as needed
-    if any(word in text.lower() for word in inappropriate_words):
+    # Blocklist moderation
+    if MODERATION_ENABLED and moderator.check_input(text) is not None:
         return False, "Message contains inappropriate content"
     
     return True, ""
@@ -213,55 +323,384 @@ def clean_response(text):
     
     return text.strip()
 
-def generate_chat_response(user_msg: str, session_id: str, username: str) -> str:
-    """Generate a response using Groq API"""
-    try:
-        # Prepare the message for the API
-        messages = [
-            {"role": "system", "content": CHAT_CONFIG["system_prompt"]},
-            {"role": "user", "content": user_msg}
-        ]
-        
-        # Call Groq API
-        response = client.chat.completions.create(
-            model=CHAT_CONFIG["model"],
-            messages=messages,
+FALLBACK_RESPONSE = "I apologize, but I'm having trouble processing your request right now. Please try again later."
+
+def build_llm_messages(user_msg: str, history: Optional[List[Dict[str, str]]]) -> List[Dict[str, str]]:
+    """Prepare the message list for the API within the context token budget"""
+    return build_prompt_messages(
+        CHAT_CONFIG["system_prompt"],
+        history or [],
+        user_msg,
+        CHAT_CONFIG["max_context_tokens"]
+    )
+
+def cache_key_for(messages: List[Dict[str, str]], use_cache: bool) -> Optional[str]:
+    """Response cache key for a prompt, or None when the cache must be bypassed"""
+    if not (RESPONSE_CACHE_ENABLED and use_cache):
+        return None
+    if CHAT_CONFIG["temperature"] > 0 and not CHAT_CONFIG["cache_sampled_responses"]:
+        return None
+    return prompt_key_for(messages)
+
+def prompt_key_for(messages: List[Dict[str, str]]) -> str:
+    """Hash identifying an upstream request (model, prompt and sampling params)"""
+    return response_cache_key(CHAT_CONFIG["model"], messages, CHAT_CONFIG["temperature"], CHAT_CONFIG["max_tokens"])
+
+def llm_models() -> List[str]:
+    """The configured model followed by its fallbacks"""
+    return [CHAT_CONFIG["model"], *CHAT_CONFIG["fallback_models"]]
+
+async def complete_upstream(messages: List[Dict[str, str]], cache_key: Optional[str]) -> str:
+    """Call Groq API through the gateway and return the cleaned response, raising on failure"""
+    with span("llm"):
+        response_text = await llm_gateway.complete(
+            llm_models(),
+            messages,
             temperature=CHAT_CONFIG["temperature"],
             max_tokens=CHAT_CONFIG["max_tokens"]
         )
-        
-        # Extract and clean the response
-        response_text = response.choices[0].message.content
+    
+    # Clean the response
+    with span("clean_response"):
         cleaned_response = clean_response(response_text)
+    
+    if MODERATION_ENABLED:
+        with span("moderation"):
+            cleaned_response = moderator.moderate_output(cleaned_response)
+    
+    if cache_key and cleaned_response:
+        await response_cache.set(cache_key, CHAT_CONFIG["model"], cleaned_response)
+    
+    return cleaned_response
+
+async def stream_upstream(messages: List[Dict[str, str]], cache_key: Optional[str]):
+    """Call Groq API in streaming mode through the gateway and yield cleaned deltas, raising on failure"""
+    cleaner = StreamingResponseCleaner()
+    screen = moderator.stream() if MODERATION_ENABLED else None
+    parts = []
+    stream = llm_gateway.stream(
+        llm_models(),
+        messages,
+        temperature=CHAT_CONFIG["temperature"],
+        max_tokens=CHAT_CONFIG["max_tokens"]
+    )
+    
+    # Covers the whole stream, including time the client takes to consume it
+    with span("llm_stream"):
+        async for content in stream:
+            delta = cleaner.feed(content)
+            if screen is not None:
+                delta = screen.feed(delta)
+            if delta:
+                parts.append(delta)
+                yield delta
+            if screen is not None and screen.blocked is not None:
+                await stream.aclose()
+                break
+    
+    delta = cleaner.flush()
+    if screen is not None:
+        delta = screen.feed(delta) + screen.flush()
+    if delta:
+        parts.append(delta)
+        yield delta
+    
+    # Text before the blocked term has been sent; end with the notice and do not cache
+    if screen is not None and screen.blocked is not None:
+        moderator.record_blocked_output()
+        yield ("\n\n" if parts else "") + MODERATED_RESPONSE
+        return
+    
+    if cache_key and parts:
+        await response_cache.set(cache_key, CHAT_CONFIG["model"], "".join(parts))
+
+async def scheduled_completion(messages: List[Dict[str, str]], cache_key: Optional[str], username: str) -> str:
+    """Run the upstream call in the scheduler's interactive lane when it is enabled"""
+    if not LLM_SCHEDULER_ENABLED:
+        return await complete_upstream(messages, cache_key)
+    return await llm_scheduler.run(username, lambda: complete_upstream(messages, cache_key))
+
+async def scheduled_stream(messages: List[Dict[str, str]], cache_key: Optional[str], username: str):
+    """Stream from upstream, holding a scheduler slot for the whole stream when it is enabled"""
+    if not LLM_SCHEDULER_ENABLED:
+        async for delta in stream_upstream(messages, cache_key):
+            yield delta
+        return
+    async with llm_scheduler.slot(username):
+        async for delta in stream_upstream(messages, cache_key):
+            yield delta
+
+async def generate_chat_response(user_msg: str, session_id: str, username: str, history: Optional[List[Dict[str, str]]] = None, use_cache: bool = True) -> str:
+    """Generate a response using Groq API"""
+    try:
+        # Prepare the message for the API
+        messages = build_llm_messages(user_msg, history)
         
-        return cleaned_response
+        # Serve repeated prompts from the response cache
+        cache_key = cache_key_for(messages, use_cache)
+        if cache_key:
+            with span("response_cache"):
+                cached_response = await response_cache.get(cache_key)
+            if cached_response is not None:
+                return moderator.moderate_output(cached_response) if MODERATION_ENABLED else cached_response
         
+        # Concurrent identical prompts share one upstream call (unless a fresh answer was requested)
+        if SINGLEFLIGHT_ENABLED and use_cache:
+            return await llm_flight.do(prompt_key_for(messages), lambda: scheduled_completion(messages, cache_key, username))
+        return await scheduled_completion(messages, cache_key, username)
+        
+    except SchedulerOverloaded:
+        raise
     except Exception as e:
         print(f"Error generating response: {e}")
-        return "I apologize, but I'm having trouble processing your request right now. Please try again later."
-
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, specify your frontend URL
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-@app.get("/")
+        return FALLBACK_RESPONSE
+
+async def stream_chat_response(user_msg: str, session_id: str, username: str, history: Optional[List[Dict[str, str]]] = None, use_cache: bool = True):
+    """Stream a response from Groq API, yielding cleaned text as it arrives"""
+    emitted = False
+    try:
+        # Prepare the message for the API
+        messages = build_llm_messages(user_msg, history)
+        
+        # Serve repeated prompts from the response cache in one chunk
+        cache_key = cache_key_for(messages, use_cache)
+        if cache_key:
+            with span("response_cache"):
+                cached_response = await response_cache.get(cache_key)
+            if cached_response is not None:
+                yield moderator.moderate_output(cached_response) if MODERATION_ENABLED else cached_response
+                return
+        
+        # Concurrent identical prompts share one upstream stream (unless a fresh answer was requested)
+        if SINGLEFLIGHT_ENABLED and use_cache:
+            deltas = llm_flight.stream(prompt_key_for(messages), lambda: scheduled_stream(messages, cache_key, username))
+        else:
+            deltas = scheduled_stream(messages, cache_key, username)
+        
+        async for delta in deltas:
+            emitted = True
+            yield delta
+        
+    except Exception as e:
+        print(f"Error streaming response: {e}")
+        if emitted:
+            raise
+        yield FALLBACK_RESPONSE
+
+async def check_chat_request(message: str, client_ip: str, user_id: int, username: Optional[str] = None):
+    """Apply rate limiting, input validation and LLM admission control, raising HTTPException on failure"""
+    # Rate limiting
+    with span("rate_limit"):
+        limit = await check_rate_limit(client_ip, user_id)
+    if not limit.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded. Please wait before sending more messages.",
+            headers={"Retry-After": str(max(1, math.ceil(limit.retry_after)))}
+        )
+    
+    # Token quotas, checked against in-memory totals; upstream calls from
+    # here on are counted against this user
+    if USAGE_ENABLED:
+        with span("quota"):
+            try:
+                await usage_tracker.check(user_id)
+            except QuotaExceeded as e:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail=f"{e}. Please try again later.",
+                    headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+                )
+        charge(user_id)
+    
+    # Input validation
+    with span("validate_input"):
+        is_valid, error_msg = validate_input(message)
+    if not is_valid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=error_msg
+        )
+    
+    # Refuse up front when the upstream queue is already too long
+    if LLM_SCHEDULER_ENABLED:
+        try:
+            llm_scheduler.admit(user=username)
+        except SchedulerOverloaded as e:
+            raise llm_overloaded(e)
+
+async def load_conversation_context(db: AsyncSession, user_id: int, session_id: Optional[str]):
+    """Resolve the session to continue and its recent history
+
+    A missing session_id starts a new conversation. Raises 404 if the
+    session does not exist or belongs to another user.
+    """
+    if session_id is None:
+        return generate_session_id(), []
+    
+    with span("history_load"):
+        # Queued messages for this user must be written before we read history
+        await wait_for_writes(user_id)
+    
+        result = await db.execute(select(
+            Conversation.id, Conversation.archived_at,
+            Conversation.summary, Conversation.summary_through_at, Conversation.summary_through_id
+        ).where(
+            Conversation.session_id == session_id,
+            Conversation.user_id == user_id
+        ))
+        row = result.first()
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Session not found"
+            )
+        conversation_id, archived_at, summary, summary_through_at, summary_through_id = row
+    
+        # A continued conversation is hot again: bring its archived messages back
+        if archived_at is not None:
+            await archiver.restore(db, conversation_id)
+    
+        # Messages already folded into the summary are sent as the summary instead
+        if summary:
+            after = (summary_through_at, summary_through_id)
+            history = [summary_message(summary)] + await load_recent_history(db, conversation_id, CHAT_CONFIG["max_history"], after)
+        else:
+            history = await load_recent_history(db, conversation_id, CHAT_CONFIG["max_history"])
+    return session_id, history
+
+async def save_chat_exchange(db: AsyncSession, user_id: int, session_id: str, user_msg: str, response_text: str):
+    """Persist a user message and the assistant reply to their conversation"""
+    # Create or get conversation in database
+    result = await db.execute(select(Conversation).where(Conversation.session_id == session_id))
+    conversation = result.scalars().first()
+    if not conversation:
+        conversation = Conversation(
+            session_id=session_id,
+            user_id=user_id,
+            created_at=datetime.utcnow(),
+            last_activity=datetime.utcnow()
+        )
+        db.add(conversation)
+        await db.flush()
+    
+    # Add user message to database
+    user_message = Message(
+        conversation_id=conversation.id,
+        role="user",
+        content=user_msg,
+        timestamp=datetime.utcnow()
+    )
+    db.add(user_message)
+    
+    # Add bot response to database
+    bot_message = Message(
+        conversation_id=conversation.id,
+        role="assistant",
+        content=response_text,
+        timestamp=datetime.utcnow()
+    )
+    db.add(bot_message)
+    
+    # Update conversation last activity
+    conversation.last_activity = datetime.utcnow()
+    
+    await db.commit()
+
+async def persist_chat_exchange(db: AsyncSession, user_id: int, session_id: str, user_msg: str, response_text: str):
+    """Queue an exchange for the batch writer, or write it now when write-behind is off or backed up
+
+    The conversation is then queued for a compaction check.
+    """
+    with span("persist"):
+        queued = False
+        if WRITE_BEHIND_ENABLED:
+            try:
+                await message_writer.enqueue(PendingExchange(
+                    session_id=session_id,
+                    user_id=user_id,
+                    user_msg=user_msg,
+                    response_text=response_text,
+                    timestamp=datetime.utcnow()
+                ))
+                queued = True
+            except PersistenceBackpressure:
+                print("⚠️ Message write queue is full, saving synchronously")
+        if not queued:
+            await save_chat_exchange(db, user_id, session_id, user_msg, response_text)
+    compactor.notify(user_id, session_id)
+
+def subsystem_gauges():
+    """Numeric values from the JSON /metrics/* snapshots, exported as gauges on /metrics"""
+    snapshots = {
+        "db_pool": pool_metrics.snapshot(),
+        "llm_gateway": llm_gateway.snapshot(),
+        "llm_scheduler": llm_scheduler.snapshot(),
+        "user_cache": user_cache.metrics.snapshot(),
+        "response_cache": response_cache.snapshot(),
+        "message_writer": message_writer.snapshot(),
+        "archiver": archiver.snapshot(),
+        "compactor": compactor.snapshot(),
+        "moderation": moderator.snapshot(),
+        "usage": usage_tracker.snapshot(),
+    }
+    for prefix, snapshot in snapshots.items():
+        for key, value in snapshot.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"{prefix}_{key}", f"{prefix} {key.replace('_', ' ')}", value
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background writers, the archive job, compaction workers and trace export; stop them on shutdown
+
+    Nothing here runs at import, so each worker process opens its own
+    connections and upstream clients only once it is serving.
+    """
+    if DB_MIGRATE_ON_STARTUP:
+        await asyncio.to_thread(init_db)
+    if not os.getenv("GROQ_API_KEY"):
+        print("⚠️ GROQ_API_KEY environment variable is not set; /readyz will report not ready")
+    if MODERATION_ENABLED:
+        # Compiled off the event loop before the first request; large lists take a while
+        await asyncio.to_thread(moderator.reload)
+        moderator.start()
+    configure_tracing()
+    if WRITE_BEHIND_ENABLED:
+        message_writer.start()
+    archiver.start()
+    if COMPACTION_ENABLED:
+        compactor.start()
+    if USAGE_ENABLED:
+        usage_tracker.start()
+    app.state.ready = True
+    try:
+        yield
+    finally:
+        # Flush queued writes and stop background worker pools
+        app.state.ready = False
+        await moderator.close()
+        await compactor.close()
+        await usage_tracker.close()
+        await message_writer.close()
+        await archiver.close()
+        await llm_gateway.close()
+        password_hasher.shutdown()
+        await async_engine.dispose()
+
+@router.get("/")
 async def root():
     return {"message": "Chatbot API is running"}
 
-@app.get("/signup", response_class=HTMLResponse)
+@router.get("/signup", response_class=HTMLResponse)
 async def signup_page(request: Request):
     return templates.TemplateResponse("signup.html", {"request": request})
 
-@app.post("/signup", response_model=Token)
-async def signup(user_data: UserSignup, db: Session = Depends(get_db)):
+@router.post("/signup", response_model=Token)
+async def signup(user_data: UserSignup, db: AsyncSession = Depends(get_async_db)):
     """Register a new user and return JWT token"""
     # Check if username already exists
-    existing_user = db.query(User).filter(User.username == user_data.username).first()
+    result = await db.execute(select(User).where(User.username == user_data.username))
+    existing_user = result.scalars().first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -269,15 +708,20 @@ async def signup(user_data: UserSignup, db: Session = Depends(get_db)):
         )
     
     # Check if email already exists
-    existing_email = db.query(User).filter(User.email == user_data.email).first()
+    result = await db.execute(select(User).where(User.email == user_data.email))
+    existing_email = result.scalars().first()
     if existing_email:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    # Hash the password
-    hashed_password = hash_password(user_data.password)
+    # Release the connection while hashing, then hash the password off the event loop
+    await db.commit()
+    try:
+        hashed_password = await password_hasher.hash(user_data.password)
+    except PasswordPoolSaturated:
+        raise password_pool_busy()
     
     # Create new user
     new_user = User(
@@ -288,13 +732,13 @@ async def signup(user_data: UserSignup, db: Session = Depends(get_db)):
     
     # Save to database
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user_data.username}, expires_delta=access_token_expires
+        data=token_claims(new_user), expires_delta=access_token_expires
     )
     
     return Token(
@@ -303,15 +747,16 @@ async def signup(user_data: UserSignup, db: Session = Depends(get_db)):
         username=user_data.username
     )
 
-@app.get("/login", response_class=HTMLResponse)
+@router.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
-@app.post("/login", response_model=Token)
-async def login(user_data: UserLogin, db: Session = Depends(get_db)):
+@router.post("/login", response_model=Token)
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Authenticate a user and return JWT token"""
     # Get user from database
-    user = db.query(User).filter(User.username == user_data.username).first()
+    result = await db.execute(select(User).where(User.username == user_data.username))
+    user = result.scalars().first()
     
     if not user:
         raise HTTPException(
@@ -319,17 +764,30 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
             detail="Invalid username or password"
         )
     
-    # Verify password
-    if not verify_password(user_data.password, user.hashed_password):
+    # Release the connection while verifying, then verify the password off the event loop
+    await db.commit()
+    try:
+        password_ok = await password_hasher.verify(user_data.password, user.hashed_password)
+    except PasswordPoolSaturated:
+        raise password_pool_busy()
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password"
         )
     
+    # Upgrade the stored hash if the configured bcrypt cost has changed
+    if needs_rehash(user.hashed_password):
+        try:
+            user.hashed_password = await password_hasher.hash(user_data.password)
+            await db.commit()
+        except PasswordPoolSaturated:
+            pass  # best effort; retried on the next login
+    
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user_data.username}, expires_delta=access_token_expires
+        data=token_claims(user), expires_delta=access_token_expires
     )
     
     return Token(
@@ -338,113 +796,198 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
         username=user_data.username
     )
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(chat_request: ChatRequest, request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.post("/chat", response_model=ChatResponse)
+async def chat(chat_request: ChatRequest, request: Request, current_user: CachedUser = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Chat endpoint that requires authentication"""
-    # Rate limiting
-    client_ip = request.client.host
-    if not check_rate_limit(client_ip):
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Rate limit exceeded. Please wait before sending more messages."
-        )
+    await check_chat_request(chat_request.message, request.client.host, current_user.id, current_user.username)
     
-    # Input validation
-    is_valid, error_msg = validate_input(chat_request.message)
-    if not is_valid:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=error_msg
-        )
+    # Continue the requested conversation or start a new one
+    session_id, history = await load_conversation_context(db, current_user.id, chat_request.session_id)
     
-    # Generate session ID for conversation tracking
-    session_id = generate_session_id()
+    # End the lookup transaction so no pooled connection is held while waiting on the LLM
+    await db.commit()
     
     # Generate response with username
-    response_text = generate_chat_response(chat_request.message, session_id, username=current_user.username)
+    try:
+        response_text = await generate_chat_response(chat_request.message, session_id, username=current_user.username, history=history, use_cache=chat_request.cache)
+    except SchedulerOverloaded as e:
+        raise llm_overloaded(e)
     
-    # Create or get conversation in database
-    conversation = db.query(Conversation).filter(Conversation.session_id == session_id).first()
-    if not conversation:
-        conversation = Conversation(
-            session_id=session_id,
-            user_id=current_user.id,
-            created_at=datetime.utcnow(),
-            last_activity=datetime.utcnow()
-        )
-        db.add(conversation)
-        db.commit()
-        db.refresh(conversation)
+    await persist_chat_exchange(db, current_user.id, session_id, chat_request.message, response_text)
     
-    # Add user message to database
-    user_message = Message(
-        conversation_id=conversation.id,
-        role="user",
-        content=chat_request.message,
-        timestamp=datetime.utcnow()
-    )
-    db.add(user_message)
+    return FastJSONResponse({
+        "response": response_text,
+        "session_id": session_id,
+        "timestamp": datetime.now().isoformat()
+    })
+
+@router.post("/chat/stream")
+async def chat_stream(chat_request: ChatRequest, request: Request, current_user: CachedUser = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    """Chat endpoint that streams the response as Server-Sent Events"""
+    await check_chat_request(chat_request.message, request.client.host, current_user.id, current_user.username)
     
-    # Add bot response to database
-    bot_message = Message(
-        conversation_id=conversation.id,
-        role="assistant",
-        content=response_text,
-        timestamp=datetime.utcnow()
-    )
-    db.add(bot_message)
+    session_id, history = await load_conversation_context(db, current_user.id, chat_request.session_id)
+    user_id, username = current_user.id, current_user.username
     
-    # Update conversation last activity
-    conversation.last_activity = datetime.utcnow()
+    # Release the lookup connection; the stream persists with its own session
+    await db.commit()
     
-    db.commit()
+    async def event_stream():
+        yield sse_event({"session_id": session_id}, event="start")
+        parts = []
+        try:
+            async for delta in stream_chat_response(chat_request.message, session_id, username=username, history=history, use_cache=chat_request.cache):
+                parts.append(delta)
+                yield sse_event({"delta": delta})
+        except Exception:
+            yield sse_event({"detail": "The response stream was interrupted"}, event="error")
+            return
+        
+        response_text = "".join(parts)
+        async with AsyncSessionLocal() as stream_db:
+            await persist_chat_exchange(stream_db, user_id, session_id, chat_request.message, response_text)
+        
+        yield sse_event({
+            "response": response_text,
+            "session_id": session_id,
+            "timestamp": datetime.now().isoformat()
+        }, event="done")
     
-    return ChatResponse(
-        response=response_text,
-        session_id=session_id,
-        timestamp=datetime.now().isoformat()
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
-@app.get("/chat/history", response_model=List[ChatHistoryResponse])
-async def get_chat_history(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Get chat history for the current user"""
-    # Get user's conversations from database
-    conversations = db.query(Conversation).filter(Conversation.user_id == current_user.id).all()
+@router.websocket("/chat/ws")
+async def chat_websocket(websocket: WebSocket, token: str, db: AsyncSession = Depends(get_async_db)):
+    """WebSocket chat: send {"message": ...}, receive delta frames then a done frame"""
+    try:
+        current_user = await authenticate_token(token, db)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    user_id, username = current_user.id, current_user.username
+    await db.commit()
+    
+    await websocket.accept()
+    client_ip = websocket.client.host
+    try:
+        while True:
+            payload = await websocket.receive_json()
+            if not isinstance(payload, dict):
+                payload = {}
+            message = str(payload.get("message") or "")
+            try:
+                await check_chat_request(message, client_ip, user_id, username)
+                session_id, history = await load_conversation_context(db, user_id, payload.get("session_id"))
+                await db.commit()
+            except HTTPException as e:
+                await websocket.send_json({"type": "error", "status": e.status_code, "detail": e.detail})
+                continue
+            
+            await websocket.send_json({"type": "start", "session_id": session_id})
+            parts = []
+            try:
+                async for delta in stream_chat_response(message, session_id, username=username, history=history, use_cache=payload.get("cache", True) is not False):
+                    parts.append(delta)
+                    await websocket.send_json({"type": "delta", "content": delta})
+            except WebSocketDisconnect:
+                raise
+            except Exception:
+                await websocket.send_json({"type": "error", "detail": "The response stream was interrupted"})
+                continue
+            
+            response_text = "".join(parts)
+            await persist_chat_exchange(db, user_id, session_id, message, response_text)
+            await websocket.send_json({
+                "type": "done",
+                "response": response_text,
+                "session_id": session_id,
+                "timestamp": datetime.now().isoformat()
+            })
+    except WebSocketDisconnect:
+        pass
+
+@router.get("/chat/history", response_model=List[ChatHistoryResponse])
+async def get_chat_history(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    summary: bool = False,
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get chat history for the current user, most recently active first
+
+    Paginated by conversation: the X-Next-Cursor response header holds the
+    cursor for the next page. With summary=true each conversation carries
+    only its last message plus the total message count.
+    """
+    await wait_for_writes(current_user.id)
+    
+    # Get one page of the user's conversations from database
+    try:
+        conversations, next_cursor = await list_conversations(db, current_user.id, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    # Get messages for all conversations on the page in one query
+    conversation_ids = [conversation.id for conversation in conversations]
+    archived_ids = [conversation.id for conversation in conversations if conversation.archived_at]
+    if summary:
+        # Counts and last messages only; archives are summarized from their row, never decoded
+        summaries = await load_summaries_for(db, conversation_ids)
+        archive_summaries = await load_archive_summaries(db, archived_ids)
+    else:
+        messages_by_conversation = await load_messages_for(db, conversation_ids)
+        archives = await load_archives(db, archived_ids)
     
     chat_history = []
     for conversation in conversations:
-        # Get messages for this conversation
-        messages = db.query(Message).filter(Message.conversation_id == conversation.id).order_by(Message.timestamp).all()
+        if summary:
+            message_count, last_message = summaries.get(conversation.id, (0, None))
+            archived_count, archived_last = archive_summaries.get(conversation.id, (0, None))
+            last_message = last_message or archived_last
+            message_count += archived_count
+            message_list = [last_message] if last_message else []
+        else:
+            archived = [{"role": m["role"], "content": m["content"]} for m in archives.get(conversation.id, [])]
+            message_list = archived + messages_by_conversation.get(conversation.id, [])
+            message_count = len(message_list)
         
-        # Convert messages to the expected format
-        message_list = []
-        for msg in messages:
-            message_list.append({
-                "role": msg.role,
-                "content": msg.content
-            })
-        
-        chat_history.append(ChatHistoryResponse(
-            session_id=conversation.session_id,
-            messages=message_list,
-            created_at=conversation.created_at.isoformat(),
-            last_activity=conversation.last_activity.isoformat(),
-            message_count=len(message_list)
-        ))
-    
-    # Sort by last activity (most recent first)
-    chat_history.sort(key=lambda x: x.last_activity, reverse=True)
+        chat_history.append({
+            "session_id": conversation.session_id,
+            "messages": message_list,
+            "created_at": conversation.created_at.isoformat(),
+            "last_activity": conversation.last_activity.isoformat(),
+            "message_count": message_count,
+            "next_cursor": None
+        })
     
-    return chat_history
+    # Rows come straight from the database, so serialize them without model validation
+    return FastJSONResponse(chat_history, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+@router.get("/chat/history/{session_id}", response_model=ChatHistoryResponse)
+async def get_chat_history_by_session(
+    session_id: str,
+    limit: int = Query(100, ge=1, le=500),
+    before: Optional[str] = None,
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get chat history for a specific session
 
-@app.get("/chat/history/{session_id}", response_model=ChatHistoryResponse)
-async def get_chat_history_by_session(session_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Get chat history for a specific session"""
+    Returns the newest `limit` messages (oldest first); pass next_cursor as
+    `before` to page towards older messages.
+    """
+    await wait_for_writes(current_user.id)
+    
     # Get conversation from database
-    conversation = db.query(Conversation).filter(
+    result = await db.execute(select(Conversation).where(
         Conversation.session_id == session_id,
         Conversation.user_id == current_user.id
-    ).first()
+    ))
+    conversation = result.scalars().first()
     
     if not conversation:
         raise HTTPException(
@@ -452,66 +995,213 @@ async def get_chat_history_by_session(session_id: str, current_user: User = Depe
             detail="Session not found"
         )
     
-    # Get messages for this conversation
-    messages = db.query(Message).filter(Message.conversation_id == conversation.id).order_by(Message.timestamp).all()
+    # Get one page of messages for this conversation, reading through its archive if it has one
+    try:
+        if conversation.archived_at:
+            message_list, next_cursor, message_count = await load_archived_message_page(db, conversation.id, limit, before)
+        else:
+            message_list, next_cursor = await load_message_page(db, conversation.id, limit, before)
+            message_count = await count_messages(db, conversation.id)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    # Convert messages to the expected format
-    message_list = []
-    for msg in messages:
-        message_list.append({
-            "role": msg.role,
-            "content": msg.content
-        })
+    return FastJSONResponse({
+        "session_id": session_id,
+        "messages": message_list,
+        "created_at": conversation.created_at.isoformat(),
+        "last_activity": conversation.last_activity.isoformat(),
+        "message_count": message_count,
+        "next_cursor": next_cursor
+    })
+
+@router.get("/chat/search", response_model=SearchResponse)
+async def search_chat_history(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Search the current user's messages, best matches first
+
+    Pass next_cursor as `cursor` for the next page of results.
+    """
+    await wait_for_writes(current_user.id)
     
-    return ChatHistoryResponse(
-        session_id=session_id,
-        messages=message_list,
-        created_at=conversation.created_at.isoformat(),
-        last_activity=conversation.last_activity.isoformat(),
-        message_count=len(message_list)
+    try:
+        with span("search"):
+            results, next_cursor = await search_messages(db, current_user.id, q, limit, cursor)
+    except (InvalidCursor, InvalidQuery) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except SearchUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+    
+    return FastJSONResponse({"query": q, "results": results, "next_cursor": next_cursor})
+
+@router.get("/chat/sync", response_model=SyncResponse)
+async def sync_chat_history(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Changes to the current user's conversations since `cursor`
+
+    Omit the cursor for a full snapshot. Returns 304 when the body would
+    match the If-None-Match ETag, i.e. nothing changed since that sync.
+    """
+    await wait_for_writes(current_user.id)
+    
+    try:
+        with span("sync"):
+            changes = await load_changes(db, current_user.id, cursor, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    response = FastJSONResponse(changes, headers={"Cache-Control": "private, no-cache"})
+    etag = etag_for(response.body)
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    response.headers["ETag"] = etag
+    return response
+
+@router.get("/chat/export")
+async def export_chat_history(
+    cursor: Optional[str] = None,
+    format: str = Query("ndjson", pattern="^(ndjson|gzip)$"),
+    current_user: CachedUser = Depends(get_current_user)
+):
+    """Stream all of the current user's conversations and messages as JSON Lines
+
+    Memory stays flat however long the history is. Pass the cursor of the
+    last checkpoint line received to resume an interrupted export.
+    """
+    if cursor:
+        try:
+            decode_export_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    await wait_for_writes(current_user.id)
+    
+    filename = f"chat-export-{current_user.username}.{EXPORT_EXTENSIONS[format]}"
+    return StreamingResponse(
+        export_chunks(current_user.id, cursor, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "private, no-store"},
     )
 
-@app.delete("/chat/history/{session_id}")
-async def delete_chat_history(session_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.delete("/chat/history")
+async def delete_all_chat_history(
+    older_than_days: Optional[float] = Query(None, gt=0),
+    current_user: CachedUser = Depends(get_current_user)
+):
+    """Delete all of the current user's conversations, or only those idle for more than older_than_days"""
+    await wait_for_writes(current_user.id)
+    
+    criteria = []
+    if older_than_days is not None:
+        criteria.append(Conversation.last_activity < datetime.utcnow() - timedelta(days=older_than_days))
+    with span("delete"):
+        deleted = await delete_conversations(current_user.id, *criteria)
+    
+    return {"message": "Chat history deleted successfully", "deleted": deleted}
+
+@router.delete("/chat/history/{session_id}")
+async def delete_chat_history(session_id: str, current_user: CachedUser = Depends(get_current_user)):
     """Delete chat history for a specific session"""
-    # Get conversation from database
-    conversation = db.query(Conversation).filter(
-        Conversation.session_id == session_id,
-        Conversation.user_id == current_user.id
-    ).first()
+    # Messages still queued for this session would otherwise be written after the delete
+    await wait_for_writes(current_user.id)
     
-    if not conversation:
+    # Delete its messages in batches, then the conversation (its archive
+    # goes with it by cascade), leaving a tombstone so other synced
+    # clients drop it too
+    with span("delete"):
+        deleted = await delete_conversations(current_user.id, Conversation.session_id == session_id)
+    
+    if not deleted["conversations"]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Session not found"
         )
     
-    # Delete conversation (messages will be deleted automatically due to cascade)
-    db.delete(conversation)
-    db.commit()
-    
     return {"message": "Chat history deleted successfully"}
 
-@app.get("/users")
-async def list_users(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.get("/users")
+async def list_users(current_user: CachedUser = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """List all users (for debugging, remove in production)"""
-    users = db.query(User).all()
+    result = await db.execute(select(User))
+    users = result.scalars().all()
     return {"users": [user.username for user in users]}
 
-@app.get("/me")
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+@router.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readyz(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Readiness: started, the database answers and the LLM API key is configured"""
+    checks = {"started": getattr(request.app.state, "ready", False), "llm_api_key": bool(os.getenv("GROQ_API_KEY"))}
+    try:
+        await asyncio.wait_for(db.execute(text("SELECT 1")), READINESS_TIMEOUT_SECONDS)
+        checks["database"] = True
+    except Exception:
+        checks["database"] = False
+    ready = all(checks.values())
+    return FastJSONResponse({"status": "ready" if ready else "not ready", "checks": checks},
+                            status_code=200 if ready else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+@router.get("/metrics")
+async def get_metrics():
+    """All metrics in the Prometheus text format"""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@router.get("/metrics/pool")
+async def get_pool_metrics():
+    """Database pool checkout wait, saturation and connection churn"""
+    return pool_metrics.snapshot()
+
+@router.get("/metrics/llm")
+async def get_llm_metrics():
+    """Upstream LLM retries, hedges, fallbacks and circuit breaker states"""
+    return llm_gateway.snapshot()
+
+@router.get("/metrics/scheduler")
+async def get_scheduler_metrics():
+    """LLM queue depth, wait-time histograms and admission counts"""
+    return llm_scheduler.snapshot()
+
+@router.get("/me")
+async def get_current_user_info(current_user: CachedUser = Depends(get_current_user)):
     """Get current user information"""
     return {
         "username": current_user.username,
         "email": current_user.email
     }
 
-@app.post("/refresh")
-async def refresh_token(current_user: User = Depends(get_current_user)):
+@router.get("/me/usage")
+async def get_current_user_usage(current_user: CachedUser = Depends(get_current_user)):
+    """Tokens used today, this month and per day this month, with the quotas that apply"""
+    return await usage_tracker.report(current_user.id)
+
+@router.delete("/me")
+async def delete_current_user(current_user: CachedUser = Depends(get_current_user)):
+    """Delete the current user's account with all of their conversations and messages"""
+    await wait_for_writes(current_user.id)
+    
+    with span("delete"):
+        deleted = await delete_account(current_user.id)
+    usage_tracker.forget(current_user.id)
+    
+    return {"message": "Account deleted successfully", "deleted": deleted}
+
+@router.post("/refresh")
+async def refresh_token(current_user: CachedUser = Depends(get_current_user)):
     """Refresh JWT token"""
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": current_user.username}, expires_delta=access_token_expires
+        data=token_claims(current_user), expires_delta=access_token_expires
     )
     
     return Token(
@@ -520,6 +1210,44 @@ async def refresh_token(current_user: User = Depends(get_current_user)):
         username=current_user.username
     )
 
+def create_app() -> FastAPI:
+    """Build the application; serve with `uvicorn app:create_app --factory`"""
+    application = FastAPI(lifespan=lifespan)
+    application.state.ready = False
+
+    application.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # In production, specify your frontend URL
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "ETag"],
+    )
+
+    # Compress large responses (history pages); SSE streams are left alone
+    if RESPONSE_COMPRESSION_ENABLED:
+        application.add_middleware(CompressionMiddleware)
+
+    # Count every upstream call's tokens against the user it was made for
+    if USAGE_ENABLED:
+        llm_gateway.add_usage_hook(usage_tracker.record)
+
+    # Per-route latency, per-stage spans and SQL statements per request
+    if METRICS_ENABLED:
+        application.add_middleware(MetricsMiddleware)
+        watch_queries(async_engine.sync_engine)
+        add_collector(subsystem_gauges)
+
+    application.include_router(router)
+    return application
+
+def __getattr__(name: str):
+    """Build `app` on first access, so `uvicorn app:app` and `from app import app` keep working"""
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=5001)
+    uvicorn.run("app:create_app", factory=True, host="0.0.0.0", port=5001)
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Archival of cold conversations and message retention
+
+Conversations idle for ARCHIVE_AFTER_DAYS have their messages moved out
+of the messages table into one compressed JSONL blob per conversation
+(conversation_archives). Reading an archived conversation decodes the
+blob transparently; continuing it restores the messages into the table.
+Retention deletes messages older than MESSAGE_RETENTION_DAYS, dropping
+whole monthly partitions on Postgres, and sync tombstones older than
+TOMBSTONE_RETENTION_DAYS.
+
+Runs in-process every ARCHIVE_INTERVAL_SECONDS, or from cron:
+    python archive.py [--archive-after-days 90] [--retention-days 365]
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import DateTime, delete, exists, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, Conversation, ConversationArchive, Message, Tombstone, async_engine
+from history import decode_cursor, encode_cursor
+from partitions import drop_partitions_before, ensure_partitions, month_start
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Archival configuration
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "100"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "0"))  # 0 = only via `python archive.py`
+ARCHIVE_CODEC = os.getenv("ARCHIVE_CODEC", "zstd")  # falls back to gzip when zstandard is not installed
+ARCHIVE_COMPRESSION_LEVEL = int(os.getenv("ARCHIVE_COMPRESSION_LEVEL", "9"))
+MESSAGE_RETENTION_DAYS = float(os.getenv("MESSAGE_RETENTION_DAYS", "0"))  # 0 = keep messages forever
+RETENTION_DELETE_BATCH = 10000
+TOMBSTONE_RETENTION_DAYS = float(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))  # older sync cursors get a full resync
+
+# Arbitrary key for the Postgres advisory lock that keeps one job running across workers
+JOB_LOCK_KEY = 7318261
+
+def archive_codec() -> str:
+    if ARCHIVE_CODEC == "zstd" and zstandard is None:
+        return "gzip"
+    return ARCHIVE_CODEC
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ARCHIVE_COMPRESSION_LEVEL).compress(data)
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=ARCHIVE_COMPRESSION_LEVEL)
+    raise ValueError(f"Unknown archive codec: {codec}")
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This archive is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "gzip":
+        return gzip.decompress(data)
+    raise ValueError(f"Unknown archive codec: {codec}")
+
+def encode_messages(messages: List[Dict]) -> bytes:
+    """One JSON object per line: id, role, content, timestamp"""
+    return "\n".join(
+        json.dumps({"id": m["id"], "role": m["role"], "content": m["content"],
+                    "timestamp": m["timestamp"].isoformat()}, ensure_ascii=False, separators=(",", ":"))
+        for m in messages
+    ).encode()
+
+def decode_messages(archive: ConversationArchive) -> List[Dict]:
+    messages = []
+    for line in decompress(archive.data, archive.codec).decode().splitlines():
+        message = json.loads(line)
+        message["timestamp"] = datetime.fromisoformat(message["timestamp"])
+        messages.append(message)
+    return messages
+
+def write_archive(archive: ConversationArchive, messages: List[Dict]):
+    codec = archive_codec()
+    archive.codec = codec
+    archive.data = compress(encode_messages(messages), codec)
+    archive.message_count = len(messages)
+    archive.first_timestamp = messages[0]["timestamp"]
+    archive.last_timestamp = messages[-1]["timestamp"]
+    archive.last_role = messages[-1]["role"]
+    archive.last_content = messages[-1]["content"]
+    archive.archived_at = datetime.utcnow()
+
+async def load_archives(db: AsyncSession, conversation_ids: List[int]) -> Dict[int, List[Dict]]:
+    """Decode the archived messages of several conversations, oldest first"""
+    if not conversation_ids:
+        return {}
+    result = await db.execute(select(ConversationArchive).where(ConversationArchive.conversation_id.in_(conversation_ids)))
+    return {archive.conversation_id: decode_messages(archive) for archive in result.scalars().all()}
+
+async def load_archive_summaries(db: AsyncSession, conversation_ids: List[int]) -> Dict[int, Tuple[int, Optional[Dict[str, str]]]]:
+    """load_summaries_for() for archives: message count and last message, without decoding any archive"""
+    if not conversation_ids:
+        return {}
+    result = await db.execute(
+        select(ConversationArchive.conversation_id, ConversationArchive.message_count,
+               ConversationArchive.last_role, ConversationArchive.last_content)
+        .where(ConversationArchive.conversation_id.in_(conversation_ids))
+    )
+    return {
+        conversation_id: (message_count, {"role": role, "content": content} if role is not None else None)
+        for conversation_id, message_count, role, content in result.all()
+    }
+
+async def load_archived_message_page(db: AsyncSession, conversation_id: int, limit: int, before: Optional[str] = None):
+    """load_message_page() for an archived conversation
+
+    Merges the archive with any messages written since it was archived and
+    pages through them in memory with the same cursors.
+    Returns (messages, next_cursor, message_count).
+    """
+    archived = (await load_archives(db, [conversation_id])).get(conversation_id, [])
+    result = await db.execute(
+        select(Message.id, Message.role, Message.content, Message.timestamp)
+        .where(Message.conversation_id == conversation_id)
+        .order_by(Message.timestamp, Message.id)
+    )
+    rows = archived + [row._asdict() for row in result.all()]
+    message_count = len(rows)
+
+    if before:
+        position = decode_cursor(before)
+        rows = [row for row in rows if (row["timestamp"], row["id"]) < position]
+    page = rows[-limit:]
+    next_cursor = encode_cursor(page[0]["timestamp"], page[0]["id"]) if len(rows) > limit else None
+    return [{"role": row["role"], "content": row["content"]} for row in page], next_cursor, message_count
+
+class Archiver:
+    """Periodic archival, retention and partition upkeep"""
+
+    def __init__(
+        self,
+        archive_after_days: float = ARCHIVE_AFTER_DAYS,
+        retention_days: float = MESSAGE_RETENTION_DAYS,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+        interval: float = ARCHIVE_INTERVAL_SECONDS,
+    ):
+        self.archive_after_days = archive_after_days
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.archived_conversations = 0
+        self.archived_messages = 0
+        self.restored_conversations = 0
+        self.deleted_messages = 0
+        self.dropped_partitions = 0
+        self.last_run_seconds = 0.0
+
+    def start(self):
+        """Start the periodic job when an interval is configured (idempotent)"""
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"⚠️ Archive job failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    @asynccontextmanager
+    async def _job_lock(self):
+        """Yield whether this process may run the job; only one may at a time on Postgres"""
+        if async_engine.dialect.name != "postgresql":
+            yield True
+            return
+        async with async_engine.connect() as connection:
+            acquired = await connection.scalar(select(func.pg_try_advisory_lock(JOB_LOCK_KEY)))
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    await connection.scalar(select(func.pg_advisory_unlock(JOB_LOCK_KEY)))
+                await connection.commit()
+
+    async def run_once(self) -> dict:
+        """Create upcoming partitions, archive cold conversations and apply retention"""
+        summary = {"created_partitions": [], "archived_conversations": 0, "archived_messages": 0,
+                   "deleted_messages": 0, "dropped_partitions": [], "pruned_tombstones": 0}
+        async with self._job_lock() as acquired:
+            if not acquired:
+                return summary
+            start = time.perf_counter()
+            if async_engine.dialect.name == "postgresql":
+                async with async_engine.begin() as connection:
+                    summary["created_partitions"] = await connection.run_sync(
+                        ensure_partitions, month_start(datetime.utcnow())
+                    )
+            if self.archive_after_days > 0:
+                cutoff = datetime.utcnow() - timedelta(days=self.archive_after_days)
+                summary["archived_conversations"], summary["archived_messages"] = await self.archive_before(cutoff)
+            if self.retention_days > 0:
+                cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+                summary["deleted_messages"], summary["dropped_partitions"] = await self.apply_retention(cutoff)
+            if TOMBSTONE_RETENTION_DAYS > 0:
+                summary["pruned_tombstones"] = await self.prune_tombstones(
+                    datetime.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+                )
+            self.runs += 1
+            self.last_run_seconds = time.perf_counter() - start
+        return summary
+
+    async def archive_before(self, cutoff: datetime) -> tuple:
+        """Archive every conversation idle since before cutoff that still has messages in the table"""
+        conversations = messages = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(Conversation)
+                    .where(Conversation.last_activity < cutoff,
+                           exists().where(Message.conversation_id == Conversation.id))
+                    .order_by(Conversation.last_activity)
+                    .limit(self.batch_size)
+                )
+                batch = result.scalars().all()
+                if not batch:
+                    break
+                for conversation in batch:
+                    messages += await self.archive_conversation(db, conversation)
+                await db.commit()
+            conversations += len(batch)
+        self.archived_conversations += conversations
+        self.archived_messages += messages
+        return conversations, messages
+
+    async def archive_conversation(self, db: AsyncSession, conversation: Conversation) -> int:
+        """Move a conversation's messages into its archive (appending to an existing one)"""
+        result = await db.execute(
+            select(Message.id, Message.role, Message.content, Message.timestamp)
+            .where(Message.conversation_id == conversation.id)
+            .order_by(Message.timestamp, Message.id)
+        )
+        rows = [row._asdict() for row in result.all()]
+        if not rows:
+            return 0
+        archive = await db.get(ConversationArchive, conversation.id)
+        if archive is None:
+            archive = ConversationArchive(conversation_id=conversation.id)
+            db.add(archive)
+            archived = []
+        else:
+            archived = decode_messages(archive)
+        write_archive(archive, archived + rows)
+        await db.execute(delete(Message).where(
+            Message.conversation_id == conversation.id,
+            Message.id.in_([row["id"] for row in rows])
+        ))
+        conversation.archived_at = datetime.utcnow()
+        return len(rows)
+
+    async def restore(self, db: AsyncSession, conversation_id: int):
+        """Move an archived conversation's messages back into the table, e.g. when it is continued"""
+        archive = await db.get(ConversationArchive, conversation_id, with_for_update=True)
+        try:
+            if archive is not None:
+                await db.execute(insert(Message), [
+                    {"id": m["id"], "conversation_id": conversation_id, "role": m["role"],
+                     "content": m["content"], "timestamp": m["timestamp"]}
+                    for m in decode_messages(archive)
+                ])
+                await db.delete(archive)
+            await db.execute(update(Conversation).where(Conversation.id == conversation_id).values(archived_at=None))
+            await db.commit()
+        except IntegrityError:
+            # A concurrent request restored it first
+            await db.rollback()
+            return
+        self.restored_conversations += 1
+
+    async def apply_retention(self, cutoff: datetime) -> tuple:
+        """Delete messages older than cutoff, then conversations left with nothing"""
+        dropped = []
+        if async_engine.dialect.name == "postgresql":
+            async with async_engine.begin() as connection:
+                dropped = await connection.run_sync(drop_partitions_before, cutoff)
+
+        # Rows in the partition straddling the cutoff (or anywhere, on SQLite)
+        deleted = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                expired = select(Message.id).where(Message.timestamp < cutoff).limit(RETENTION_DELETE_BATCH)
+                result = await db.execute(delete(Message).where(Message.id.in_(expired.scalar_subquery())))
+                await db.commit()
+            deleted += result.rowcount
+            if result.rowcount < RETENTION_DELETE_BATCH:
+                break
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(ConversationArchive).where(ConversationArchive.first_timestamp < cutoff))
+            for archive in result.scalars().all():
+                messages = [m for m in decode_messages(archive) if m["timestamp"] >= cutoff]
+                deleted += archive.message_count - len(messages)
+                if messages:
+                    write_archive(archive, messages)
+                else:
+                    await db.delete(archive)
+            await db.flush()
+            await db.execute(update(Conversation).where(
+                Conversation.archived_at.is_not(None),
+                ~exists().where(ConversationArchive.conversation_id == Conversation.id)
+            ).values(archived_at=None))
+            emptied = (
+                Conversation.last_activity < cutoff,
+                ~exists().where(Message.conversation_id == Conversation.id),
+                ~exists().where(ConversationArchive.conversation_id == Conversation.id)
+            )
+            # Syncing clients still hold these conversations
+            await db.execute(insert(Tombstone).from_select(
+                ["user_id", "session_id", "deleted_at"],
+                select(Conversation.user_id, Conversation.session_id, literal(datetime.utcnow(), DateTime)).where(*emptied)
+            ))
+            await db.execute(delete(Conversation).where(*emptied))
+            await db.commit()
+
+        self.deleted_messages += deleted
+        self.dropped_partitions += len(dropped)
+        return deleted, dropped
+
+    async def prune_tombstones(self, cutoff: datetime) -> int:
+        """Delete sync tombstones older than cutoff; clients with older cursors resync in full"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(delete(Tombstone).where(Tombstone.deleted_at < cutoff))
+            await db.commit()
+        return result.rowcount
+
+    def snapshot(self) -> dict:
+        return {
+            "runs": self.runs,
+            "archived_conversations": self.archived_conversations,
+            "archived_messages": self.archived_messages,
+            "restored_conversations": self.restored_conversations,
+            "deleted_messages": self.deleted_messages,
+            "dropped_partitions": self.dropped_partitions,
+            "last_run_seconds": self.last_run_seconds,
+            "codec": archive_codec(),
+        }
+
+archiver = Archiver()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive-after-days", type=float, default=ARCHIVE_AFTER_DAYS, help="0 disables archiving")
+    parser.add_argument("--retention-days", type=float, default=MESSAGE_RETENTION_DAYS, help="0 keeps messages forever")
+    args = parser.parse_args()
+
+    async def run():
+        job = Archiver(archive_after_days=args.archive_after_days, retention_days=args.retention_days)
+        try:
+            summary = await job.run_once()
+        finally:
+            await async_engine.dispose()
+        print(f"🗄️ Archived {summary['archived_messages']} messages from {summary['archived_conversations']} conversations "
+              f"({archive_codec()})")
+        if summary["created_partitions"]:
+            print(f"📅 Created partitions: {', '.join(summary['created_partitions'])}")
+        if args.retention_days > 0:
+            print(f"🧹 Deleted {summary['deleted_messages']} expired messages"
+                  + (f", dropped {', '.join(summary['dropped_partitions'])}" if summary["dropped_partitions"] else ""))
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
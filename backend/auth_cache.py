@@ -0,0 +1,203 @@
+"""
+Cache of authenticated user identities so protected endpoints skip the users-table lookup
+
+Entries are keyed by user id (the token's uid claim), never by username:
+a username freed by a deleted account and signed up again is a different
+user, and tokens of the old account must not resolve to it (see
+CachedUser.issued_token). Code that
+deactivates or deletes users calls invalidate() itself; the is_active
+listener below only covers changes made through the ORM.
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Set
+
+from pydantic import BaseModel
+from sqlalchemy import event
+
+from database import User
+from ttl_cache import TTLCache
+
+# Cache configuration
+USER_CACHE_BACKEND = os.getenv("USER_CACHE_BACKEND", "memory")  # "memory" or "redis"
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+class CachedUser(BaseModel):
+    """The subset of a User the request path needs"""
+    id: int
+    username: str
+    email: str
+    is_active: bool = True
+    created_at: Optional[datetime] = None
+
+    def issued_token(self, payload: dict) -> bool:
+        """Whether a token was issued to this account
+
+        SQLite hands a deleted user's id to the next account, so uid alone
+        does not identify one: a token issued (iat) before the account was
+        created belongs to an earlier account with the same id and name.
+        Tokens without iat predate the claim and are accepted until they
+        expire.
+        """
+        if payload.get("iat") is None or self.created_at is None:
+            return True
+        return self.created_at.replace(tzinfo=timezone.utc).timestamp() <= payload["iat"]
+
+class UserCacheMetrics:
+    """Hit/miss counters plus an estimate of the DB time saved by hits
+
+    Hooks registered with add_hook are called as hook(event, value) where
+    event is "hit", "miss" (value = lookup seconds) or "invalidate".
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lookup_seconds_total = 0.0
+        self._hooks: List[Callable[[str, float], None]] = []
+
+    def add_hook(self, hook: Callable[[str, float], None]):
+        self._hooks.append(hook)
+
+    def record_hit(self):
+        self.hits += 1
+        self._emit("hit", 0.0)
+
+    def record_miss(self, lookup_seconds: float):
+        self.misses += 1
+        self.lookup_seconds_total += lookup_seconds
+        self._emit("miss", lookup_seconds)
+
+    def record_invalidation(self):
+        self.invalidations += 1
+        self._emit("invalidate", 0.0)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def seconds_saved(self) -> float:
+        """Hits multiplied by the average cost of a miss lookup"""
+        return self.hits * (self.lookup_seconds_total / self.misses) if self.misses else 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hit_rate,
+            "seconds_saved": self.seconds_saved,
+        }
+
+    def _emit(self, name: str, value: float):
+        for hook in self._hooks:
+            hook(name, value)
+
+class InMemoryUserCache:
+    """Per-process LRU/TTL cache of CachedUser keyed by user id"""
+
+    def __init__(self, maxsize: int = USER_CACHE_MAX_ENTRIES, ttl: float = USER_CACHE_TTL_SECONDS):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, subject: str) -> Optional[CachedUser]:
+        return self._cache.get(subject)
+
+    async def set(self, subject: str, user: CachedUser):
+        self._cache.set(subject, user)
+
+    async def delete(self, subject: str):
+        self._cache.delete(subject)
+
+    def discard(self, subject: str):
+        """Synchronous delete, so invalidation takes effect immediately"""
+        self._cache.delete(subject)
+
+class RedisUserCache:
+    """Cache shared by all workers, stored as JSON in Redis
+
+    Takes any client exposing the asyncio redis get/set/delete API, so a
+    local stand-in such as fakeredis can be swapped in.
+    """
+
+    def __init__(self, client, ttl: float = USER_CACHE_TTL_SECONDS, prefix: str = "user:"):
+        self._client = client
+        self._ttl = int(ttl)
+        self._prefix = prefix
+
+    async def get(self, subject: str) -> Optional[CachedUser]:
+        raw = await self._client.get(self._prefix + subject)
+        return CachedUser.model_validate_json(raw) if raw else None
+
+    async def set(self, subject: str, user: CachedUser):
+        await self._client.set(self._prefix + subject, user.model_dump_json(), ex=self._ttl)
+
+    async def delete(self, subject: str):
+        await self._client.delete(self._prefix + subject)
+
+def user_key(user_id: int) -> str:
+    """Cache key of a user"""
+    return str(user_id)
+
+class UserCache:
+    """Front end of the configured backend that records metrics"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.metrics = UserCacheMetrics()
+        self._pending: Set[asyncio.Task] = set()  # the event loop only holds tasks weakly
+
+    async def get(self, subject: str) -> Optional[CachedUser]:
+        user = await self.backend.get(subject)
+        if user is not None:
+            self.metrics.record_hit()
+        return user
+
+    async def store(self, subject: str, user: CachedUser, lookup_started: float):
+        """Cache a user fetched from the database; lookup_started is a perf_counter() value"""
+        self.metrics.record_miss(time.perf_counter() - lookup_started)
+        await self.backend.set(subject, user)
+
+    async def invalidate(self, subject: str):
+        self.metrics.record_invalidation()
+        await self.backend.delete(subject)
+
+    def invalidate_soon(self, subject: str):
+        """Invalidate from synchronous code such as ORM event listeners"""
+        if hasattr(self.backend, "discard"):
+            self.metrics.record_invalidation()
+            self.backend.discard(subject)
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self.invalidate(subject))
+        else:
+            task = loop.create_task(self.invalidate(subject))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+def create_user_cache() -> UserCache:
+    """Build the user cache for the configured backend"""
+    if USER_CACHE_BACKEND == "redis":
+        from redis_client import get_redis_client
+        return UserCache(RedisUserCache(get_redis_client()))
+    return UserCache(InMemoryUserCache())
+
+user_cache = create_user_cache()
+
+@event.listens_for(User.is_active, "set")
+def _invalidate_deactivated_user(target, value, oldvalue, initiator):
+    """Drop a user from the cache as soon as their account is deactivated
+
+    Other processes using the in-memory backend see the change once their
+    entry expires (USER_CACHE_TTL_SECONDS); the Redis backend is shared.
+    """
+    if not value and target.id is not None:
+        user_cache.invalidate_soon(user_key(target.id))
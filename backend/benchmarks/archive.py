@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Cold conversation archival
+Seeds conversations with varied text, then archives all of them and
+reports archive throughput, compression (JSONL vs stored blobs), database
+size before and after, and /chat/history/{session_id} latency for hot vs
+archived conversations.
+
+Usage: python benchmarks/archive.py [--users 200] [--conversations 10] [--messages 50]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from harness import BACKEND_DIR
+from seed import seed, seed_session_id, seed_username
+
+WORDS = ("the a to of and in is it you that for on with as can be this are your or have not from "
+         "python query index table answer model token cache request user error server data function "
+         "partition archive message history search latency memory thread async await retry").split()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--conversations", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    def content(conversation_id: int, index: int) -> str:
+        rng = random.Random(conversation_id * 1000003 + index)
+        return " ".join(rng.choices(WORDS, k=rng.randint(8, 80))) + f" #{rng.randrange(10 ** 6)}"
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    database_url = f"sqlite:///{path}"
+    seeded = seed(database_url, args.users, args.conversations, args.messages, bcrypt_rounds=4, content=content)
+    print(f"Seeded {seeded['messages']} messages in {seeded['seconds']:.1f}s")
+
+    os.environ.setdefault("GROQ_API_KEY", "fake-key")
+    os.environ["RATE_LIMIT_PER_MINUTE"] = "1000000"
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+
+    import httpx
+    from sqlalchemy import func, select, text
+    from app import app, create_access_token
+    from archive import Archiver, archive_codec
+    from database import ConversationArchive, Message, engine
+
+    def database_size() -> int:
+        with engine.connect() as connection:
+            connection.execute(text("VACUUM"))
+        return os.path.getsize(path)
+
+    async def read_latency(http) -> float:
+        samples = []
+        rng = random.Random(1)
+        for _ in range(args.repeat):
+            user = rng.randrange(args.users)
+            headers = {"Authorization": f"Bearer {create_access_token({'sub': seed_username(user)})}"}
+            session_id = seed_session_id(user, rng.randrange(args.conversations))
+            start = time.perf_counter()
+            response = await http.get(f"/chat/history/{session_id}", params={"limit": 20}, headers=headers)
+            samples.append(time.perf_counter() - start)
+            response.raise_for_status()
+        return statistics.median(samples) * 1000
+
+    async def run():
+        with engine.connect() as connection:
+            raw = connection.execute(select(func.sum(func.length(Message.content)))).scalar()
+        size_before = database_size()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            hot = await read_latency(http)
+            start = time.perf_counter()
+            summary = await Archiver(archive_after_days=1, retention_days=0).run_once()
+            elapsed = time.perf_counter() - start
+            archived = await read_latency(http)
+        with engine.connect() as connection:
+            stored = connection.execute(select(func.sum(func.length(ConversationArchive.data)))).scalar()
+        size_after = database_size()
+
+        print(f"archived {summary['archived_messages']} messages / {summary['archived_conversations']} conversations "
+              f"in {elapsed:.1f}s ({summary['archived_messages'] / elapsed:.0f} msg/s, codec {archive_codec()})")
+        print(f"message text {raw / 1e6:.1f} MB -> archive blobs {stored / 1e6:.1f} MB ({raw / stored:.1f}x)")
+        print(f"database file {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB (after VACUUM)")
+        print(f"/chat/history/{{session_id}} median: hot {hot:.1f} ms, archived {archived:.1f} ms")
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Context compaction against the fake Groq server
+Holds one long conversation through /chat while the compaction workers
+fold older turns into the rolling summary, then reports what each turn
+sent upstream, how much of the conversation the prompt still covers,
+and the tokens saved against sending the full history. Finally checks
+that compaction is idempotent: repeating it, or running it twice
+concurrently, leaves one consistent summary.
+
+Usage: python benchmarks/compaction.py [--turns 100] [--threshold 30] [--keep-recent 10]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+from harness import BACKEND_DIR, fake_groq_server
+
+REPLY = ("Here is a detailed answer that walks through the reasoning step by step, names the trade-offs, "
+         "and ends with a short recommendation you can act on right away.")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--threshold", type=int, default=30)
+    parser.add_argument("--keep-recent", type=int, default=10)
+    args = parser.parse_args()
+
+    with fake_groq_server(latency_ms=5, FAKE_GROQ_REPLY=REPLY) as groq_url:
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}",
+            GROQ_API_KEY="fake-key", GROQ_BASE_URL=groq_url, RATE_LIMIT_PER_MINUTE="1000000",
+            COMPACTION_THRESHOLD=str(args.threshold), COMPACTION_KEEP_RECENT=str(args.keep_recent),
+            LLM_SCHEDULER_ENABLED="true",
+        )
+        sys.path.insert(0, BACKEND_DIR)
+        os.chdir(BACKEND_DIR)
+
+        from sqlalchemy import select
+        from app import CHAT_CONFIG, app, message_writer
+        from compaction import COMPACTION_MODEL, compactor
+        from context import estimate_tokens
+        from database import AsyncSessionLocal, Conversation, Message, create_tables
+
+        create_tables()
+
+        def upstream_prompt_tokens(model):
+            return httpx.get(f"{groq_url}/stats").json()["prompt_tokens_by_model"].get(model, 0)
+
+        async def run():
+            compactor.start()
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as http:
+                token = (await http.post("/signup", json={"username": "longtalk", "email": "longtalk@example.com",
+                                                             "password": "benchmark"})).json()["access_token"]
+                headers = {"Authorization": f"Bearer {token}"}
+                session_id, latencies, prompt_tokens = None, [], []
+                for turn in range(args.turns):
+                    before = upstream_prompt_tokens(CHAT_CONFIG["model"])
+                    start = time.perf_counter()
+                    response = await http.post("/chat", headers=headers, json={
+                        "message": f"Turn {turn}: tell me more about topic {turn % 7}, remembering what we said.",
+                        "session_id": session_id, "cache": False})
+                    latencies.append(time.perf_counter() - start)
+                    response.raise_for_status()
+                    session_id = response.json()["session_id"]
+                    prompt_tokens.append(upstream_prompt_tokens(CHAT_CONFIG["model"]) - before)
+                    await compactor.idle()  # outside the timed request
+
+            await message_writer.close()
+            async with AsyncSessionLocal() as db:
+                conversation = (await db.execute(select(Conversation).where(Conversation.session_id == session_id))).scalar_one()
+                contents = (await db.execute(select(Message.content).where(Message.conversation_id == conversation.id))).scalars().all()
+                summarized = (await db.execute(select(Message.id).where(
+                    Message.conversation_id == conversation.id, Message.id <= conversation.summary_through_id))).scalars().all()
+
+            full_history = sum(estimate_tokens(content) for content in contents)
+            snapshot = compactor.snapshot()
+            print(f"{args.turns} turns, {len(contents)} messages; /chat p50 {statistics.median(latencies) * 1000:.1f} ms")
+            print(f"upstream prompt tokens per turn: first {prompt_tokens[0]}, max {max(prompt_tokens)}, "
+                  f"last {prompt_tokens[-1]}; summarization calls used {upstream_prompt_tokens(COMPACTION_MODEL)} prompt tokens in total")
+            print(f"prompt covers all {len(contents)} messages: {len(summarized)} summarized + recent turns "
+                  f"(without compaction: last {CHAT_CONFIG['max_history']})")
+            print(f"full history would be ~{full_history} tokens; summary is {estimate_tokens(conversation.summary)} "
+                  f"tokens for {conversation.summarized_tokens}; tokens saved {snapshot['tokens_saved']}")
+            print(f"compactor: {snapshot}")
+
+            # Idempotency: nothing left over the threshold, so a repeat is a no-op
+            repeat = await compactor.compact(conversation.user_id, session_id)
+            print(f"repeat run summarized {repeat} messages")
+
+            # Concurrent runs over the same backlog: one wins, the other sees a conflict
+            compactor.threshold = compactor.keep_recent
+            conflicts = compactor.conflicts
+            results = await asyncio.gather(*(compactor.compact(conversation.user_id, session_id) for _ in range(2)))
+            async with AsyncSessionLocal() as db:
+                after = await db.get(Conversation, conversation.id)
+            print(f"concurrent runs summarized {results}, conflicts +{compactor.conflicts - conflicts}, "
+                  f"summary through message {after.summary_through_id}")
+            await compactor.close()
+
+        asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark suite results
+Prints requests/sec, p95 and SQL statements per request for every
+endpoint and concurrency level present in both files, with the change
+from the baseline. Exits with status 1 if any endpoint's throughput fell
+or its p95 rose by more than --threshold percent, so it can gate CI.
+
+Usage: python benchmarks/compare.py baseline.json candidate.json [--threshold 10]
+"""
+
+import argparse
+import json
+import sys
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def change(old: float, new: float) -> float:
+    """Relative change in percent"""
+    return (new - old) / old * 100 if old else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0)
+    parser.add_argument("--min-requests", type=int, default=20,
+                        help="skip endpoints with fewer samples than this (too noisy to judge)")
+    args = parser.parse_args()
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    print(f"baseline  {baseline['commit']} {baseline.get('label', '')} ({baseline['database']}, {baseline['timestamp']})")
+    print(f"candidate {candidate['commit']} {candidate.get('label', '')} ({candidate['database']}, {candidate['timestamp']})")
+    if baseline["config"] != candidate["config"]:
+        print("⚠️ The runs used different settings; differences may not be regressions")
+
+    old_points = {point["concurrency"]: point for point in baseline["points"]}
+    regressions = []
+    for point in candidate["points"]:
+        old_point = old_points.get(point["concurrency"])
+        if old_point is None:
+            continue
+        print(f"\nconcurrency {point['concurrency']}: {old_point['rps']:.0f} -> {point['rps']:.0f} req/s "
+              f"({change(old_point['rps'], point['rps']):+.1f}%)")
+        print(f"{'endpoint':>10} {'rps':>16} {'change':>8} {'p95_ms':>18} {'change':>8} {'queries':>12}")
+        for op, stats in point["endpoints"].items():
+            old = old_point["endpoints"].get(op)
+            if old is None:
+                continue
+            rps_change = change(old["rps"], stats["rps"])
+            p95_change = change(old["p95_ms"], stats["p95_ms"])
+            queries = "-"
+            if old.get("db_queries_per_request") is not None and stats.get("db_queries_per_request") is not None:
+                queries = f"{old['db_queries_per_request']:.1f} -> {stats['db_queries_per_request']:.1f}"
+            flag = ""
+            if min(old["requests"], stats["requests"]) >= args.min_requests and \
+                    (rps_change < -args.threshold or p95_change > args.threshold):
+                flag = "  REGRESSION"
+                regressions.append((point["concurrency"], op))
+            print(f"{op:>10} {old['rps']:>7.1f} -> {stats['rps']:>6.1f} {rps_change:>+7.1f}% "
+                  f"{old['p95_ms']:>8.1f} -> {stats['p95_ms']:>7.1f} {p95_change:>+7.1f}% {queries:>12}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0f}%: "
+              + ", ".join(f"{op}@{concurrency}" for concurrency, op in regressions))
+        sys.exit(1)
+    print("\nNo regressions beyond the threshold")
+
+if __name__ == "__main__":
+    main()
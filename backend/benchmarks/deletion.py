@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Deleting a long conversation: ORM cascade vs ON DELETE CASCADE vs batches
+Seeds one user with a few 50k-message conversations into SQLite and
+deletes one per method: the previous ORM delete-orphan cascade (every
+message loaded into the session and deleted by primary key), a single
+DELETE of the conversation left to the database cascade, and
+deletion.delete_conversations (messages in DELETE_BATCH_ROWS batches,
+then the conversation). Reports wall time, Python memory, the longest
+write transaction and the worst latency of a chat writing to another
+conversation of the same database meanwhile.
+
+Usage: python benchmarks/deletion.py [--messages 50000] [--batch-rows 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from harness import BACKEND_DIR
+from seed import seed_session_id
+
+METHODS = ["orm", "cascade", "batched"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--batch-rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    database_url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    # One conversation per method plus one the concurrent writer appends to
+    subprocess.run([sys.executable, "benchmarks/seed.py", "--database-url", database_url, "--users", "1",
+                    "--conversations", str(len(METHODS) + 1), "--messages", str(args.messages),
+                    "--bcrypt-rounds", "4"], cwd=BACKEND_DIR, check=True, stdout=subprocess.DEVNULL)
+    os.environ["DATABASE_URL"] = database_url
+    sys.path.insert(0, BACKEND_DIR)
+
+    from datetime import datetime
+    from sqlalchemy import delete, event, insert, select
+    from sqlalchemy.orm import selectinload
+    from database import AsyncSessionLocal, Conversation, Message, async_engine
+    from deletion import delete_conversations
+
+    transactions = {"longest": 0.0}
+
+    @event.listens_for(async_engine.sync_engine, "begin")
+    def begin(connection):
+        connection.info["began"] = time.perf_counter()
+
+    @event.listens_for(async_engine.sync_engine, "commit")
+    def commit(connection):
+        # Transactions of the deletion that wrote, i.e. held the write lock
+        if connection.info.pop("wrote", False):
+            transactions["longest"] = max(transactions["longest"], time.perf_counter() - connection.info["began"])
+
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def before_execute(connection, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("SELECT") and not context.execution_options.get("chat"):
+            connection.info["wrote"] = True
+
+    async def conversation(session_id: str):
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(
+                select(Conversation.id, Conversation.user_id).where(Conversation.session_id == session_id)
+            )).one()
+
+    async def orm(session_id: str):
+        """The previous endpoint: cascade="all, delete-orphan" without passive_deletes"""
+        async with AsyncSessionLocal() as db:
+            conversation = (await db.execute(
+                select(Conversation).where(Conversation.session_id == session_id)
+                .options(selectinload(Conversation.messages), selectinload(Conversation.archive))
+            )).scalar_one()
+            for message in conversation.messages:
+                await db.delete(message)
+            await db.delete(conversation)
+            await db.commit()
+
+    async def cascade(session_id: str):
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Conversation).where(Conversation.session_id == session_id))
+            await db.commit()
+
+    async def batched(session_id: str):
+        _, user_id = await conversation(session_id)
+        await delete_conversations(user_id, Conversation.session_id == session_id, batch_rows=args.batch_rows)
+
+    async def writer(target: int, stop: asyncio.Event, latencies: list):
+        """A chat appending to another conversation every 10 ms"""
+        while not stop.is_set():
+            start = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(Message).values(
+                    conversation_id=target, role="user", content="Still chatting", timestamp=datetime.utcnow()
+                ).execution_options(chat=True))
+                await db.commit()
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        target, _ = await conversation(seed_session_id(0, len(METHODS)))
+        print(f"{'method':>8} {'seconds':>8} {'memory_mb':>10} {'longest_txn_ms':>15} {'writer_max_ms':>14}")
+        for index, (name, method) in enumerate(zip(METHODS, [orm, cascade, batched])):
+            session_id = seed_session_id(0, index)
+            transactions["longest"] = 0.0
+            stop, latencies = asyncio.Event(), []
+            chatting = asyncio.create_task(writer(target, stop, latencies))
+            await asyncio.sleep(0.05)
+            tracemalloc.start()
+            start = time.perf_counter()
+            await method(session_id)
+            seconds = time.perf_counter() - start
+            memory_mb = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+            stop.set()
+            await chatting
+
+            async with AsyncSessionLocal() as db:
+                assert await db.scalar(select(Conversation.id).where(Conversation.session_id == session_id)) is None
+                assert not (await db.execute(select(Message.id).where(
+                    Message.conversation_id.not_in(select(Conversation.id))).limit(1))).first()
+            print(f"{name:>8} {seconds:>8.2f} {memory_mb:>10.1f} {transactions['longest'] * 1000:>15.0f} "
+                  f"{max(latencies) * 1000:>14.0f}")
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Export memory profile: streaming JSON Lines export vs paging /chat/history
+Seeds one user per size (1000 conversations each) and, in a fresh
+process per run, exports the whole history with `export.py export`
+(gzip), fetches every /chat/history page in process (the only way to get
+the data out before), and imports the export into an empty second
+database with `export.py import`. Reports peak RSS and wall time of
+each process; the export's peak should stay flat as the history grows.
+
+Usage: python benchmarks/export.py [--sizes 10000,100000,1000000]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+
+from harness import BACKEND_DIR
+from seed import seed_username
+
+# Every /chat/history page of a user, each page discarded before the next
+HISTORY_PAGES = """
+import asyncio, httpx, app
+async def run():
+    headers = {"Authorization": "Bearer " + app.create_access_token({"sub": USERNAME})}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://bench",
+                                 headers=headers, timeout=600) as http:
+        cursor, messages = None, 0
+        while True:
+            response = await http.get("/chat/history", params={"limit": 200, **({"cursor": cursor} if cursor else {})})
+            messages += sum(len(conversation["messages"]) for conversation in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+    await app.message_writer.close()
+asyncio.run(run())
+"""
+
+def profiled(args, env):
+    """Run a process; returns (seconds, peak RSS in MB)"""
+    start = time.perf_counter()
+    proc = subprocess.Popen(args, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    if status != 0:
+        raise RuntimeError(f"{args} exited with status {status}")
+    return time.perf_counter() - start, usage.ru_maxrss / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    args = parser.parse_args()
+
+    print(f"{'messages':>9} {'export_s':>9} {'export_mb':>10} {'gz_mb':>7} {'history_s':>10} {'history_mb':>11} "
+          f"{'import_s':>9} {'import_mb':>10}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        directory = tempfile.mkdtemp()
+        database_url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        target_url = f"sqlite:///{os.path.join(directory, 'target.db')}"
+        # Separate processes: the database module binds its engine on import
+        for url, conversations in [(database_url, 1000), (target_url, 0)]:
+            subprocess.run([sys.executable, "benchmarks/seed.py", "--database-url", url, "--users", "1",
+                            "--conversations", str(conversations), "--messages", str(max(1, size // 1000)),
+                            "--bcrypt-rounds", "4"], cwd=BACKEND_DIR, check=True, stdout=subprocess.DEVNULL)
+        env = {**os.environ, "DATABASE_URL": database_url, "GROQ_API_KEY": "fake-key",
+               "RATE_LIMIT_PER_MINUTE": "1000000"}
+        output = os.path.join(directory, "export.jsonl.gz")
+
+        export_s, export_mb = profiled([sys.executable, "export.py", "export", "--username", seed_username(0),
+                                        "--output", output], env)
+        with gzip.open(output, "rb") as f:
+            last = deque(f, maxlen=1)[0]
+        assert json.loads(last) == {"type": "end", "conversations": 1000, "messages": size}, last
+
+        history_s, history_mb = profiled(
+            [sys.executable, "-c", f"USERNAME = {seed_username(0)!r}\n" + HISTORY_PAGES], env
+        )
+        import_s, import_mb = profiled([sys.executable, "export.py", "import", "--username", seed_username(0), output],
+                                       {**env, "DATABASE_URL": target_url})
+
+        print(f"{size:>9} {export_s:>9.1f} {export_mb:>10.1f} {os.path.getsize(output) / 1e6:>7.1f} {history_s:>10.1f} "
+              f"{history_mb:>11.1f} {import_s:>9.1f} {import_mb:>10.1f}")
+
+if __name__ == "__main__":
+    main()
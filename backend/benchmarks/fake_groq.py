@@ -0,0 +1,140 @@
+"""
+Fake OpenAI-compatible Groq server for local load tests and benchmarks
+Point the app at it with GROQ_BASE_URL=http://127.0.0.1:<port>
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Simulated upstream behaviour
+LATENCY_MS = float(os.getenv("FAKE_GROQ_LATENCY_MS", "500"))
+TOKENS_PER_SEC = float(os.getenv("FAKE_GROQ_TOKENS_PER_SEC", "0"))  # 0 = whole reply at once
+REPLY_TEXT = os.getenv("FAKE_GROQ_REPLY", "This is a canned answer from the fake Groq server.")
+
+# Injected faults, also adjustable at runtime through POST /faults
+faults = {
+    "error_rate": float(os.getenv("FAKE_GROQ_ERROR_RATE", "0")),  # share of requests that fail
+    "error_status": int(os.getenv("FAKE_GROQ_ERROR_STATUS", "503")),
+    "retry_after": os.getenv("FAKE_GROQ_RETRY_AFTER"),  # Retry-After header sent with errors
+    "slow_rate": float(os.getenv("FAKE_GROQ_SLOW_RATE", "0")),  # share of requests given extra latency
+    "slow_ms": float(os.getenv("FAKE_GROQ_SLOW_MS", "2000")),
+    "failing_models": [m for m in os.getenv("FAKE_GROQ_FAILING_MODELS", "").split(",") if m],  # always 503
+}
+
+app = FastAPI()
+
+# Completions requested and prompt tokens received (about 4 characters each), read by benchmarks through /stats
+stats = {"requests": 0, "errors": 0, "by_model": {}, "prompt_tokens_by_model": {}}
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+@app.post("/faults")
+async def set_faults(request: Request):
+    """Change injected faults mid-run, e.g. {"error_rate": 1.0} for an outage"""
+    faults.update(await request.json())
+    return faults
+
+def injected_error(model: str):
+    """An OpenAI-style error response if a fault should fire for this request"""
+    if model in faults["failing_models"]:
+        status_code = 503
+    elif random.random() < faults["error_rate"]:
+        status_code = faults["error_status"]
+    else:
+        return None
+    stats["errors"] += 1
+    headers = {"retry-after": str(faults["retry_after"])} if faults["retry_after"] is not None else {}
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"message": f"Injected fault {status_code}", "type": "fake_error"}},
+        headers=headers,
+    )
+
+def extra_latency() -> float:
+    return faults["slow_ms"] / 1000 if random.random() < faults["slow_rate"] else 0.0
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    """Sleep for the configured latency, then answer like the real API"""
+    body = await request.json()
+    stats["requests"] += 1
+    model = body.get("model", "fake-model")
+    stats["by_model"][model] = stats["by_model"].get(model, 0) + 1
+    prompt_tokens = sum(len(m.get("content", "")) // 4 for m in body.get("messages", []))
+    stats["prompt_tokens_by_model"][model] = stats["prompt_tokens_by_model"].get(model, 0) + prompt_tokens
+    error = injected_error(model)
+    if error is not None:
+        return error
+    if body.get("stream"):
+        return StreamingResponse(stream_completion(body), media_type="text/event-stream")
+
+    await asyncio.sleep(LATENCY_MS / 1000 + extra_latency() + token_delay() * len(reply_tokens()))
+
+    completion_tokens = len(REPLY_TEXT) // 4
+    return {
+        "id": f"chatcmpl-fake-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake-model"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": REPLY_TEXT},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+def reply_tokens():
+    """Split the reply into word-sized tokens, keeping the separating spaces"""
+    words = REPLY_TEXT.split(" ")
+    return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+def token_delay() -> float:
+    return 1 / TOKENS_PER_SEC if TOKENS_PER_SEC > 0 else 0.0
+
+async def stream_completion(body: dict):
+    """Emit chat.completion.chunk events with the configured first-token latency and token rate"""
+    completion_id = f"chatcmpl-fake-{time.time_ns()}"
+    await asyncio.sleep(LATENCY_MS / 1000 + extra_latency())
+    for token in reply_tokens():
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-model"),
+            "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(token_delay())
+    # Groq reports usage on the last chunk
+    prompt_tokens = sum(len(m.get("content", "")) // 4 for m in body.get("messages", []))
+    final = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": body.get("model", "fake-model"),
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        "x_groq": {"id": completion_id, "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(reply_tokens()),
+            "total_tokens": prompt_tokens + len(reply_tokens()),
+        }},
+    }
+    yield f"data: {json.dumps(final)}\n\n"
+    yield "data: [DONE]\n\n"
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("FAKE_GROQ_PORT", "9100")), log_level="warning")
@@ -0,0 +1,93 @@
+"""
+Shared helpers for benchmarks: boot the fake Groq server and the API as subprocesses
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(BACKEND_DIR, "benchmarks")
+
+def free_port() -> int:
+    """Ask the OS for an unused TCP port"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_for_http(url: str, proc: subprocess.Popen, timeout: float = 30.0):
+    """Poll a URL until it answers, the process dies or the timeout expires"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Process serving {url} exited with code {proc.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+@contextmanager
+def fake_groq_server(latency_ms: float = 500, **extra_env):
+    """Run benchmarks/fake_groq.py and yield its base URL"""
+    port = free_port()
+    env = {**os.environ, "FAKE_GROQ_PORT": str(port), "FAKE_GROQ_LATENCY_MS": str(latency_ms)}
+    env.update({key: str(value) for key, value in extra_env.items()})
+    proc = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "fake_groq.py")], cwd=BENCH_DIR, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for_http(base_url + "/docs", proc)
+        yield base_url
+    finally:
+        proc.terminate()
+        proc.wait()
+
+@contextmanager
+def api_server(groq_base_url: str, database_url: str, **extra_env):
+    """Run the FastAPI app under uvicorn against the given database and fake Groq"""
+    port = free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "GROQ_API_KEY": "fake-key",
+        "GROQ_BASE_URL": groq_base_url,
+        "RATE_LIMIT_PER_MINUTE": "1000000",
+        "DB_MIGRATE_ON_STARTUP": "true",  # fresh benchmark databases have no schema yet
+    }
+    env.update({key: str(value) for key, value in extra_env.items()})
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:create_app", "--factory", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for_http(base_url + "/", proc)
+        yield base_url
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def signup(base_url: str, username: str, password: str = "benchmark-password") -> str:
+    """Create a user and return its bearer token"""
+    response = httpx.post(
+        base_url + "/signup",
+        json={"username": username, "email": f"{username}@example.com", "password": password},
+        timeout=30.0,
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+def percentile(samples, pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
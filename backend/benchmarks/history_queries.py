@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+/chat/history before and after batching and pagination
+Seeds one heavy user into SQLite and compares the original N+1
+implementation with the paginated endpoint (full and summary mode),
+reporting latency, SQL statements issued and payload size.
+
+Usage: python benchmarks/history_queries.py [--conversations 500] [--messages 20] [--repeat 10]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from harness import BACKEND_DIR
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--conversations", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ.setdefault("GROQ_API_KEY", "fake-key")
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+
+    import httpx
+    from sqlalchemy import event, insert, select
+    from app import app, create_access_token
+    from database import AsyncSessionLocal, Conversation, Message, SessionLocal, User, async_engine, create_tables
+
+    create_tables()
+
+    # Seed one heavy user
+    with SessionLocal() as db:
+        user = User(username="heavy", email="heavy@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        start = datetime.utcnow() - timedelta(days=365)
+        conversations = [
+            {"session_id": f"s{i}", "user_id": user.id, "created_at": start + timedelta(hours=i),
+             "last_activity": start + timedelta(hours=i, minutes=30)}
+            for i in range(args.conversations)
+        ]
+        db.execute(insert(Conversation), conversations)
+        ids = db.execute(select(Conversation.id)).scalars().all()
+        db.execute(insert(Message), [
+            {"conversation_id": cid, "role": "user" if j % 2 == 0 else "assistant",
+             "content": f"Message {j} of conversation {cid} with some filler text.",
+             "timestamp": start + timedelta(hours=k, seconds=j)}
+            for k, cid in enumerate(ids) for j in range(args.messages)
+        ])
+        db.commit()
+        user_id = user.id
+
+    statements = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *a: statements.append(1))
+
+    async def original_history():
+        """The pre-pagination implementation: one message query per conversation"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Conversation).where(Conversation.user_id == user_id))
+            chat_history = []
+            for conversation in result.scalars().all():
+                result = await db.execute(
+                    select(Message).where(Message.conversation_id == conversation.id).order_by(Message.timestamp)
+                )
+                message_list = [{"role": m.role, "content": m.content} for m in result.scalars().all()]
+                chat_history.append({
+                    "session_id": conversation.session_id, "messages": message_list,
+                    "created_at": conversation.created_at.isoformat(),
+                    "last_activity": conversation.last_activity.isoformat(),
+                    "message_count": len(message_list),
+                })
+            chat_history.sort(key=lambda x: x["last_activity"], reverse=True)
+            return len(httpx.Response(200, json=chat_history).content)
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'heavy'})}"}
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as http:
+            async def endpoint(params):
+                response = await http.get("/chat/history", params=params)
+                response.raise_for_status()
+                return len(response.content)
+
+            async def all_pages():
+                size, cursor = 0, None
+                while True:
+                    response = await http.get("/chat/history", params={"limit": 200, **({"cursor": cursor} if cursor else {})})
+                    size += len(response.content)
+                    cursor = response.headers.get("X-Next-Cursor")
+                    if not cursor:
+                        return size
+
+            cases = [
+                ("original (all)", original_history),
+                ("paged, all pages", all_pages),
+                ("first page (50)", lambda: endpoint({"limit": 50})),
+                ("summary page (50)", lambda: endpoint({"limit": 50, "summary": "true"})),
+            ]
+            print(f"{'case':>20} {'median_ms':>10} {'queries':>8} {'bytes':>10}")
+            for name, fn in cases:
+                samples = []
+                for _ in range(args.repeat):
+                    statements.clear()
+                    t0 = time.perf_counter()
+                    size = await fn()
+                    samples.append(time.perf_counter() - t0)
+                print(f"{name:>20} {statistics.median(samples) * 1000:>10.1f} {len(statements):>8} {size:>10}")
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
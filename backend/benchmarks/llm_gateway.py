@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+LLM gateway under injected upstream faults
+Drives LLMGateway directly against the fake Groq server and compares it
+with a bare single-attempt client (the old behaviour) in four scenarios:
+
+- tail:     5% of calls take 2 s extra; hedging cuts p99
+- flaky:    30% of calls return 503 with Retry-After; retries recover them
+- outage:   every call fails; the circuit breaker fails fast
+- fallback: the primary model is down; the next model answers
+
+Usage: python benchmarks/llm_gateway.py [--requests 200] [--concurrency 20]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+import httpx
+
+from harness import BACKEND_DIR, fake_groq_server, percentile
+
+sys.path.insert(0, BACKEND_DIR)
+
+from llm_gateway import LLMGateway
+
+MESSAGES = [{"role": "user", "content": "Hello there"}]
+PRIMARY, FALLBACK = "primary-model", "fallback-model"
+
+async def drive(call, requests: int, concurrency: int):
+    latencies, failures = [], 0
+    remaining = list(range(requests))
+
+    async def worker():
+        nonlocal failures
+        while remaining:
+            remaining.pop()
+            start = time.perf_counter()
+            try:
+                await call()
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, failures
+
+def set_faults(groq_url: str, **faults):
+    defaults = {"error_rate": 0.0, "slow_rate": 0.0, "retry_after": None, "failing_models": []}
+    httpx.post(groq_url + "/faults", json={**defaults, **faults}).raise_for_status()
+
+async def run_scenario(groq_url: str, name: str, args):
+    print(f"\n{name}")
+    print(f"{'client':>10} {'ok':>5} {'failed':>7} {'p50_ms':>8} {'p99_ms':>8} {'max_ms':>8} {'upstream':>9}")
+    configs = {
+        "baseline": LLMGateway(api_key="fake-key", base_url=groq_url, max_retries=0, hedge=False,
+                               breaker_threshold=10 ** 9),
+        "gateway": LLMGateway(api_key="fake-key", base_url=groq_url, hedge=name == "tail",
+                              breaker_reset=60),
+    }
+    for label, gateway in configs.items():
+        models = [PRIMARY] if label == "baseline" else [PRIMARY, FALLBACK]
+        if name == "tail" and label == "gateway":
+            # Warm the latency tracker so the hedge delay reflects the real p95
+            await drive(lambda: gateway.complete([PRIMARY], MESSAGES), 50, 5)
+        before = httpx.get(groq_url + "/stats").json()["requests"]
+        latencies, failures = await drive(lambda: gateway.complete(models, MESSAGES), args.requests, args.concurrency)
+        upstream = httpx.get(groq_url + "/stats").json()["requests"] - before
+        print(f"{label:>10} {args.requests - failures:>5} {failures:>7} {percentile(latencies, 50) * 1000:>8.0f} "
+              f"{percentile(latencies, 99) * 1000:>8.0f} {max(latencies) * 1000:>8.0f} {upstream:>9}")
+        await gateway.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    scenarios = {
+        "tail": {"slow_rate": 0.05, "slow_ms": 2000},
+        "flaky": {"error_rate": 0.3, "error_status": 503, "retry_after": "0.2"},
+        "outage": {"error_rate": 1.0, "error_status": 503},
+        "fallback": {"failing_models": [PRIMARY]},
+    }
+    with fake_groq_server(latency_ms=args.latency_ms) as groq_url:
+        for name, faults in scenarios.items():
+            set_faults(groq_url, **faults)
+            asyncio.run(run_scenario(groq_url, name, args))
+
+if __name__ == "__main__":
+    main()
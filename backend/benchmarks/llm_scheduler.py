@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+LLM scheduler: fairness, priority lanes and admission control
+Simulated upstream calls (fixed service time) go through either a plain
+FIFO semaphore with the same concurrency (what a bounded client pool
+gives) or the LLMScheduler, in three scenarios:
+
+- fairness: one user floods the queue, then light users arrive
+- priority: a backlog of background summarization, then interactive chats
+- overload: a burst far beyond capacity
+
+Usage: python benchmarks/llm_scheduler.py [--concurrency 16] [--service-ms 100]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+from harness import BACKEND_DIR, percentile
+
+sys.path.insert(0, BACKEND_DIR)
+
+from llm_scheduler import BACKGROUND, INTERACTIVE, LLMScheduler, SchedulerOverloaded
+
+class FifoGate:
+    """Baseline: one semaphore, first come first served, no limit on waiters"""
+
+    def __init__(self, concurrency: int):
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(self, user: str, fn, lane: str = INTERACTIVE):
+        async with self._semaphore:
+            return await fn()
+
+async def submit(gate, user: str, lane: str, service: float, results: dict, delay: float = 0.0):
+    await asyncio.sleep(delay)
+    group = "heavy" if user == "heavy" else lane if lane == BACKGROUND else "light"
+    start = time.perf_counter()
+    try:
+        await gate.run(user, lambda: asyncio.sleep(service), lane=lane)
+    except SchedulerOverloaded:
+        results.setdefault("rejected:" + group, []).append(time.perf_counter() - start)
+        return
+    results.setdefault(group, []).append(time.perf_counter() - start)
+
+def report(label: str, results: dict, group: str):
+    latencies = results.get(group, [])
+    rejected = len(results.get("rejected:" + group, []))
+    print(f"{label:>10} {group:>10} {len(latencies):>6} {rejected:>9} "
+          f"{percentile(latencies, 50) * 1000:>8.0f} {percentile(latencies, 95) * 1000:>8.0f} "
+          f"{(max(latencies) if latencies else 0) * 1000:>8.0f}")
+
+async def scenario(name: str, gate, args) -> dict:
+    service = args.service_ms / 1000
+    results: dict = {}
+    jobs = []
+    if name == "fairness":
+        jobs += [submit(gate, "heavy", INTERACTIVE, service, results) for _ in range(300)]
+        jobs += [submit(gate, f"light{i}", INTERACTIVE, service, results, delay=0.05) for i in range(10) for _ in range(3)]
+    elif name == "priority":
+        jobs += [submit(gate, f"summarizer{i % 5}", BACKGROUND, service, results) for i in range(200)]
+        jobs += [submit(gate, f"light{i}", INTERACTIVE, service, results, delay=0.05) for i in range(40)]
+    else:
+        jobs += [submit(gate, f"user{i % 100}", INTERACTIVE, service, results) for i in range(2000)]
+    await asyncio.gather(*jobs)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--service-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    print(f"{'gate':>10} {'group':>10} {'served':>6} {'rejected':>9} {'p50_ms':>8} {'p95_ms':>8} {'max_ms':>8}")
+    for name, groups in (("fairness", ("light", "heavy")), ("priority", ("light", BACKGROUND)), ("overload", ("light",))):
+        print(f"-- {name}")
+        for label in ("fifo", "scheduler"):
+            async def run():
+                if label == "fifo":
+                    gate = FifoGate(args.concurrency)
+                else:
+                    gate = LLMScheduler(concurrency=args.concurrency, max_wait=2.0)
+                results = await scenario(name, gate, args)
+                return results, gate
+            results, gate = asyncio.run(run())
+            for group in groups:
+                report(label, results, group)
+            if label == "scheduler" and name == "overload":
+                waits = gate.snapshot()["wait_seconds"][INTERACTIVE]
+                print(f"{'':>10} mean queue wait {waits['sum'] / max(1, waits['count']) * 1000:.0f} ms over {waits['count']} dispatches")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Load test for /chat against the fake Groq server
+With a non-blocking request path throughput should grow with concurrency
+(roughly concurrency / upstream latency) instead of flat-lining at 1 / latency.
+
+Usage: python benchmarks/load_chat.py [--latency-ms 500] [--levels 1,10,50,100,200]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from harness import api_server, fake_groq_server, percentile, signup
+
+async def run_level(base_url: str, token: str, concurrency: int):
+    """Fire `concurrency` simultaneous /chat requests and time them"""
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=120.0,
+                                 limits=httpx.Limits(max_connections=concurrency)) as http:
+        async def one(i: int):
+            start = time.perf_counter()
+            response = await http.post("/chat", json={"message": f"load test message {i}"})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return elapsed, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--levels", default="1,10,50,100,200")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}?timeout=60"
+        with fake_groq_server(latency_ms=args.latency_ms) as groq_url, api_server(groq_url, database_url) as api_url:
+            token = signup(api_url, "loadtest")
+            print(f"{'concurrency':>12} {'elapsed_s':>10} {'rps':>8} {'ideal_rps':>10} {'p50_ms':>8} {'p99_ms':>8}")
+            for level in [int(x) for x in args.levels.split(",")]:
+                elapsed, latencies = asyncio.run(run_level(api_url, token, level))
+                ideal = level / (args.latency_ms / 1000)
+                print(f"{level:>12} {elapsed:>10.2f} {level / elapsed:>8.1f} {ideal:>10.1f} "
+                      f"{percentile(latencies, 50) * 1000:>8.0f} {percentile(latencies, 99) * 1000:>8.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+/chat latency during a login storm
+Runs a steady stream of /chat requests, first alone and then while many
+clients log in concurrently, and reports chat p50/p99 for both phases.
+Run it twice to compare hashing inline on the event loop with the pool:
+
+    PASSWORD_HASH_WORKERS=0 python benchmarks/login_storm.py
+    python benchmarks/login_storm.py
+
+Usage: python benchmarks/login_storm.py [--chat-concurrency 20] [--logins 200] [--duration 5]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from harness import api_server, fake_groq_server, percentile, signup
+
+async def chat_load(http: httpx.AsyncClient, token: str, concurrency: int, duration: float):
+    """Keep `concurrency` chat requests in flight for `duration` seconds"""
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await http.post("/chat", json={"message": "ping"}, headers={"Authorization": f"Bearer {token}"})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+async def login_storm(http: httpx.AsyncClient, logins: int, duration: float):
+    """Fire waves of concurrent logins until `duration` elapses"""
+    statuses = {}
+    deadline = time.perf_counter() + duration
+
+    async def login():
+        response = await http.post("/login", json={"username": "stormer", "password": "benchmark-password"})
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    while time.perf_counter() < deadline:
+        await asyncio.gather(*(login() for _ in range(logins)))
+    return statuses
+
+async def run(api_url: str, token: str, args):
+    limits = httpx.Limits(max_connections=args.chat_concurrency + args.logins)
+    async with httpx.AsyncClient(base_url=api_url, timeout=120.0, limits=limits) as http:
+        quiet = await chat_load(http, token, args.chat_concurrency, args.duration)
+        storm_task = asyncio.create_task(login_storm(http, args.logins, args.duration))
+        stormy = await chat_load(http, token, args.chat_concurrency, args.duration)
+        statuses = await storm_task
+
+    print(f"hash workers: {os.getenv('PASSWORD_HASH_WORKERS', 'default')}, login statuses: {statuses}")
+    print(f"{'phase':>12} {'requests':>9} {'p50_ms':>8} {'p99_ms':>8}")
+    for name, samples in (("quiet", quiet), ("login storm", stormy)):
+        print(f"{name:>12} {len(samples):>9} {percentile(samples, 50) * 1000:>8.0f} {percentile(samples, 99) * 1000:>8.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chat-concurrency", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}?timeout=60"
+        with fake_groq_server(latency_ms=args.latency_ms) as groq_url, api_server(groq_url, database_url) as api_url:
+            token = signup(api_url, "chatter")
+            signup(api_url, "stormer")
+            asyncio.run(run(api_url, token, args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Instrumentation overhead
+Runs the API with METRICS_ENABLED=true and false and compares throughput
+and latency of an authenticated /chat/history loop (middleware, auth
+spans and SQL counting all on the path). Rounds alternate between the two
+servers to cancel out drift. Also reports the raw cost of one span().
+
+Usage: python benchmarks/metrics_overhead.py [--rounds 3] [--duration 5] [--concurrency 16]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+
+import httpx
+
+from harness import BACKEND_DIR, api_server, fake_groq_server, percentile, signup
+
+async def load(api_url: str, token: str, concurrency: int, duration: float):
+    latencies = []
+    headers = {"Authorization": f"Bearer {token}"}
+    deadline = time.perf_counter() + duration
+    async with httpx.AsyncClient(base_url=api_url, headers=headers, timeout=30.0) as http:
+        async def worker():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await http.get("/chat/history", params={"limit": 10})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return len(latencies) / (time.perf_counter() - start), latencies
+
+def span_cost(iterations: int = 200000) -> float:
+    """Seconds per span() enter/exit, measured in this process"""
+    sys.path.insert(0, BACKEND_DIR)
+    from metrics import RequestStats, _current_request, span
+    _current_request.set(RequestStats())
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with span("bench"):
+            pass
+    return (time.perf_counter() - start) / iterations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    results = {"false": [], "true": []}
+    latencies = {"false": [], "true": []}
+    with tempfile.TemporaryDirectory() as tmp, ExitStack() as stack:
+        groq_url = stack.enter_context(fake_groq_server(latency_ms=0))
+        servers = {}
+        for enabled in results:
+            database_url = f"sqlite:///{os.path.join(tmp, f'bench_{enabled}.db')}?timeout=60"
+            api_url = stack.enter_context(api_server(groq_url, database_url, METRICS_ENABLED=enabled))
+            token = signup(api_url, "metrics")
+            for i in range(5):
+                httpx.post(api_url + "/chat", json={"message": f"seed {i}"},
+                           headers={"Authorization": f"Bearer {token}"}, timeout=30.0).raise_for_status()
+            servers[enabled] = (api_url, token)
+
+        for _ in range(args.rounds):
+            for enabled, (api_url, token) in servers.items():
+                rps, samples = asyncio.run(load(api_url, token, args.concurrency, args.duration))
+                results[enabled].append(rps)
+                latencies[enabled].extend(samples)
+
+    print(f"{'metrics':>8} {'rps':>8} {'p50_ms':>8} {'p99_ms':>8}")
+    for enabled in results:
+        print(f"{enabled:>8} {statistics.mean(results[enabled]):>8.0f} "
+              f"{percentile(latencies[enabled], 50) * 1000:>8.2f} {percentile(latencies[enabled], 99) * 1000:>8.2f}")
+    overhead = 1 - statistics.mean(results["true"]) / statistics.mean(results["false"])
+    print(f"throughput overhead: {overhead * 100:.1f}%")
+    print(f"span() cost: {span_cost() * 1e6:.2f} us")
+
+if __name__ == "__main__":
+    main()
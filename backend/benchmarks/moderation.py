@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Moderation cost vs blocklist size
+Compiles blocklists of 2 to 100k generated terms (a fifth of them
+two-word phrases) and times checking typical chat messages with the
+Aho-Corasick automaton, the streaming moderator fed in small chunks, and
+the previous `any(word in text.lower() ...)` loop. Also reports compile
+time and automaton memory. Per-message cost should stay flat for the
+automaton and grow linearly for the loop.
+
+Usage: python benchmarks/moderation.py [--sizes 2,100,1000,10000,100000] [--messages 200]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from harness import BACKEND_DIR
+
+WORDS = ("the a to and of in is you that it for on with as this be are your can have not at or how what "
+         "python function error database query request response server deploy docker cache latency token "
+         "model prompt history message user session configure install version update migrate test").split()
+
+def generated_terms(count: int, rnd: random.Random):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    terms = ["spam", "advertisement"]
+    while len(terms) < count:
+        word = "".join(rnd.choice(letters) for _ in range(rnd.randint(5, 12)))
+        if rnd.random() < 0.2:
+            word += " " + "".join(rnd.choice(letters) for _ in range(rnd.randint(4, 9)))
+        terms.append(word)
+    return terms[:count]
+
+def generated_message(rnd: random.Random, length: int = 400) -> str:
+    words = []
+    while sum(len(word) + 1 for word in words) < length:
+        words.append(rnd.choice(WORDS))
+    if rnd.random() < 0.1:
+        words.append("Café naïve ＵＮＩＣＯＤＥ")
+    return " ".join(words).capitalize() + "."
+
+def per_message_us(check, messages) -> float:
+    samples = []
+    for message in messages:
+        start = time.perf_counter()
+        check(message)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="2,100,1000,10000,100000")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--chunk", type=int, default=8, help="characters per streamed chunk")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from moderation import Automaton, StreamModerator
+
+    rnd = random.Random(42)
+    messages = [generated_message(rnd) for _ in range(args.messages)]
+
+    def streamed(automaton):
+        def check(message):
+            screen = StreamModerator(automaton)
+            for i in range(0, len(message), args.chunk):
+                screen.feed(message[i:i + args.chunk])
+            screen.flush()
+        return check
+
+    print(f"{'terms':>7} {'compile_ms':>10} {'states':>8} {'memory_mb':>9} "
+          f"{'find_us':>8} {'stream_us':>9} {'loop_us':>9}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        terms = generated_terms(size, rnd)
+        start = time.perf_counter()
+        automaton = Automaton(terms)
+        compile_ms = (time.perf_counter() - start) * 1000
+        tracemalloc.start()
+        traced = Automaton(terms)  # again, traced (tracing slows it down several times)
+        memory_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+        del traced
+
+        assert all(automaton.find(message) is None for message in messages)
+        assert automaton.find(f"please stop the {terms[-1].upper()} now") == terms[-1]
+
+        def loop(message, words=terms):
+            return any(word in message.lower() for word in words)
+
+        find_us = per_message_us(automaton.find, messages)
+        stream_us = per_message_us(streamed(automaton), messages)
+        loop_us = per_message_us(loop, messages[:max(10, args.messages * 100 // size)])
+        print(f"{size:>7} {compile_ms:>10.1f} {len(automaton.goto):>8} {memory_mb:>9.1f} "
+              f"{find_us:>8.1f} {stream_us:>9.1f} {loop_us:>9.1f}")
+
+if __name__ == "__main__":
+    main()
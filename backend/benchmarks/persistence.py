@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Chat message persistence throughput
+Writes the same chat exchanges from many concurrent "requests" two ways:
+the original per-exchange transaction (conversation lookup, commit,
+refresh, two inserts, commit) and the write-behind batch writer, then
+reports sustained exchanges/sec and the time each request spends waiting
+on persistence. Runs in-process against a temporary SQLite database.
+
+Usage: python benchmarks/persistence.py [--exchanges 5000] [--concurrency 50] [--sessions 200]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from harness import BACKEND_DIR, percentile
+
+sys.path.insert(0, BACKEND_DIR)
+
+async def write_exchanges(persist, exchanges, concurrency: int):
+    """Run persist(session_id, user_id, message) over exchanges with bounded concurrency
+
+    Like real users, each session's turns are sent one after another, so a
+    session is always handled by the same worker.
+    """
+    waits = []
+    lanes = [[] for _ in range(concurrency)]
+    for exchange in exchanges:
+        lanes[hash(exchange[0]) % concurrency].append(exchange)
+
+    async def worker(lane):
+        for session_id, user_id, message in lane:
+            start = time.perf_counter()
+            await persist(session_id, user_id, message)
+            waits.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker(lane) for lane in lanes))
+    return waits
+
+async def run(args):
+    from sqlalchemy import func, select
+
+    from database import AsyncSessionLocal, Base, Conversation, Message, User, async_engine
+    from persistence import MessageWriter, PendingExchange
+
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        db.add(User(id=1, username="bench", email="bench@example.com", hashed_password="x"))
+        await db.commit()
+
+    async def original(session_id, user_id, message):
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Conversation).where(Conversation.session_id == session_id))
+            conversation = result.scalars().first()
+            if not conversation:
+                conversation = Conversation(session_id=session_id, user_id=user_id,
+                                            created_at=datetime.utcnow(), last_activity=datetime.utcnow())
+                db.add(conversation)
+                await db.commit()
+                await db.refresh(conversation)
+            db.add(Message(conversation_id=conversation.id, role="user", content=message, timestamp=datetime.utcnow()))
+            db.add(Message(conversation_id=conversation.id, role="assistant", content="reply " + message, timestamp=datetime.utcnow()))
+            conversation.last_activity = datetime.utcnow()
+            await db.commit()
+
+    writer = MessageWriter()
+
+    async def write_behind(session_id, user_id, message):
+        await writer.enqueue(PendingExchange(session_id=session_id, user_id=user_id, user_msg=message,
+                                             response_text="reply " + message, timestamp=datetime.utcnow()))
+
+    print(f"{'mode':>14} {'exchanges/s':>12} {'wait_p50_ms':>12} {'wait_p99_ms':>12} {'commits':>8}")
+    for mode, persist in (("per-request", original), ("write-behind", write_behind)):
+        exchanges = [(f"{mode}-{i % args.sessions}", 1, f"message {i}") for i in range(args.exchanges)]
+        start = time.perf_counter()
+        waits = await write_exchanges(persist, exchanges, args.concurrency)
+        if persist is write_behind:
+            await writer.close()
+            commits = writer.batches
+        else:
+            commits = args.exchanges + args.sessions
+        elapsed = time.perf_counter() - start
+        print(f"{mode:>14} {args.exchanges / elapsed:>12.0f} {percentile(waits, 50) * 1000:>12.2f} "
+              f"{percentile(waits, 99) * 1000:>12.2f} {commits:>8}")
+
+    async with AsyncSessionLocal() as db:
+        stored = await db.scalar(select(func.count(Message.id)))
+    assert stored == 4 * args.exchanges, f"expected {4 * args.exchanges} messages, found {stored}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--exchanges", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--sessions", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}?timeout=60"
+        os.environ.pop("ASYNC_DATABASE_URL", None)
+        asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
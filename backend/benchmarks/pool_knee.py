@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Connection pool throughput knee under concurrent /chat/history load
+For each pool size, sweeps client concurrency against /chat/history and
+reports requests/sec, latency and the average time requests waited for a
+pooled connection (from /metrics/pool). Throughput stops growing once
+concurrency passes what the pool can serve; past that point the extra
+latency is pool wait, not database time.
+
+Runs on a temporary SQLite database by default; pass --database-url to
+point it at Postgres.
+
+Usage: python benchmarks/pool_knee.py [--pool-sizes 2,5,20] [--concurrency 1,4,16,64] [--duration 5]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from harness import api_server, fake_groq_server, percentile, signup
+
+async def sweep_point(api_url: str, token: str, concurrency: int, duration: float):
+    latencies = []
+    headers = {"Authorization": f"Bearer {token}"}
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=api_url, headers=headers, timeout=60.0, limits=limits) as http:
+        async def worker():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await http.get("/chat/history", params={"limit": 20})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, latencies
+
+def seed(api_url: str, token: str, conversations: int):
+    headers = {"Authorization": f"Bearer {token}"}
+    with httpx.Client(base_url=api_url, headers=headers, timeout=60.0) as http:
+        for i in range(conversations):
+            session_id = None
+            for turn in range(3):
+                response = http.post("/chat", json={"message": f"Seed question {i}.{turn}", "session_id": session_id, "cache": False})
+                response.raise_for_status()
+                session_id = response.json()["session_id"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pool-sizes", default="2,5,20")
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    print(f"{'pool':>5} {'conc':>5} {'rps':>8} {'p50_ms':>8} {'p99_ms':>8} {'wait_avg_ms':>12} {'timeouts':>9}")
+    with fake_groq_server(latency_ms=0) as groq_url:
+        for pool_size in [int(size) for size in args.pool_sizes.split(",")]:
+            with tempfile.TemporaryDirectory() as tmp:
+                database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}?timeout=60"
+                with api_server(groq_url, database_url, DB_POOL_SIZE=pool_size, DB_MAX_OVERFLOW=0,
+                                DB_POOL_TIMEOUT=30) as api_url:
+                    token = signup(api_url, f"pool{pool_size}_{int(time.time())}")
+                    seed(api_url, token, args.conversations)
+                    for concurrency in [int(level) for level in args.concurrency.split(",")]:
+                        before = httpx.get(api_url + "/metrics/pool").json()
+                        rps, latencies = asyncio.run(sweep_point(api_url, token, concurrency, args.duration))
+                        after = httpx.get(api_url + "/metrics/pool").json()
+                        checkouts = after["checkouts"] - before["checkouts"]
+                        waited = after["wait_seconds_total"] - before["wait_seconds_total"]
+                        wait_avg = waited / checkouts if checkouts else 0.0
+                        print(f"{pool_size:>5} {concurrency:>5} {rps:>8.0f} {percentile(latencies, 50) * 1000:>8.1f} "
+                              f"{percentile(latencies, 99) * 1000:>8.1f} {wait_avg * 1000:>12.2f} "
+                              f"{after['timeouts'] - before['timeouts']:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Prompt assembly cost as a conversation grows
+Seeds conversations of increasing length into SQLite and times loading the
+recent history plus token-budget trimming. With the (conversation_id,
+timestamp) index the cost should stay flat from 10 to 10k messages; the
+"full" column loads the whole conversation for comparison.
+
+Usage: python benchmarks/prompt_assembly.py [--sizes 10,100,1000,10000] [--repeat 50]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from harness import BACKEND_DIR
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10,100,1000,10000")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    sizes = [int(x) for x in args.sizes.split(",")]
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    sys.path.insert(0, BACKEND_DIR)
+
+    from sqlalchemy import insert, select
+    from database import AsyncSessionLocal, Conversation, Message, User, create_tables, SessionLocal
+    from context import build_prompt_messages, load_recent_history
+
+    create_tables()
+    with SessionLocal() as db:
+        user = User(username="bench", email="bench@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        conversation_ids = {}
+        start = datetime.utcnow() - timedelta(days=30)
+        for size in sizes:
+            conversation = Conversation(session_id=f"bench-{size}", user_id=user.id)
+            db.add(conversation)
+            db.flush()
+            conversation_ids[size] = conversation.id
+            db.execute(insert(Message), [
+                {
+                    "conversation_id": conversation.id,
+                    "role": "user" if i % 2 == 0 else "assistant",
+                    "content": f"Message number {i} with a little bit of realistic filler text to estimate.",
+                    "timestamp": start + timedelta(seconds=i),
+                }
+                for i in range(size)
+            ])
+        db.commit()
+
+    system_prompt = "You are a helpful assistant."
+
+    async def time_it(conversation_id: int, full: bool) -> float:
+        samples = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                if full:
+                    result = await db.execute(
+                        select(Message.role, Message.content)
+                        .where(Message.conversation_id == conversation_id)
+                        .order_by(Message.timestamp)
+                    )
+                    history = [{"role": role, "content": content} for role, content in result.all()]
+                else:
+                    history = await load_recent_history(db, conversation_id, 10)
+            build_prompt_messages(system_prompt, history, "What did we talk about?", 4096)
+            samples.append(time.perf_counter() - t0)
+        return statistics.median(samples) * 1000
+
+    async def run():
+        print(f"{'messages':>9} {'recent_ms':>10} {'full_ms':>9}")
+        for size in sizes:
+            recent = await time_it(conversation_ids[size], full=False)
+            full = await time_it(conversation_ids[size], full=True)
+            print(f"{size:>9} {recent:>10.2f} {full:>9.2f}")
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
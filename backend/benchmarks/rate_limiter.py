@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Rate limiter micro-benchmark and memory test
+Compares the original per-IP timestamp lists with the GCRA limiter:
+check throughput for a hot key, and memory after 1M distinct IPs (the
+scanning-traffic case). If fakeredis (with lupa) is installed the Redis
+limiter's Lua script is exercised as well.
+
+Usage: python benchmarks/rate_limiter.py [--ips 1000000] [--checks 200000]
+"""
+
+import argparse
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+from harness import BACKEND_DIR
+
+sys.path.insert(0, BACKEND_DIR)
+
+from rate_limit import InMemoryRateLimiter, RedisRateLimiter
+
+class ListRateLimiter:
+    """The original implementation from app.py, kept for comparison"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.request_counts: Dict[str, List[float]] = {}
+
+    def hit(self, ip_address: str, current_time: float) -> bool:
+        minute_ago = current_time - 60
+        if ip_address in self.request_counts:
+            self.request_counts[ip_address] = [t for t in self.request_counts[ip_address] if t > minute_ago]
+        if len(self.request_counts.get(ip_address, [])) >= self.limit:
+            return False
+        self.request_counts.setdefault(ip_address, []).append(current_time)
+        return True
+
+def throughput(check, checks: int) -> float:
+    start = time.perf_counter()
+    for i in range(checks):
+        check("203.0.113.7", start + i * 1e-5)
+    return checks / (time.perf_counter() - start)
+
+def memory_after(check, ips: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    now = time.monotonic()
+    for i in range(ips):
+        check(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:{i >> 24}", now)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / 1024 / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ips", type=int, default=1_000_000)
+    parser.add_argument("--checks", type=int, default=200_000)
+    parser.add_argument("--limit", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'limiter':>24} {'checks/s':>12}")
+    old = ListRateLimiter(args.limit)
+    print(f"{'list (original)':>24} {throughput(old.hit, args.checks):>12,.0f}")
+    new = InMemoryRateLimiter(limit=args.limit)
+    print(f"{'gcra in-memory':>24} {throughput(new.hit_nowait, args.checks):>12,.0f}")
+
+    print(f"\n{'limiter':>24} {'keys kept':>10} {'MiB after ' + str(args.ips) + ' IPs':>22}")
+    old = ListRateLimiter(args.limit)
+    mib = memory_after(old.hit, args.ips)
+    print(f"{'list (original)':>24} {len(old.request_counts):>10} {mib:>22.1f}")
+    del old
+    for max_keys in (100_000, args.ips):
+        new = InMemoryRateLimiter(limit=args.limit, max_keys=max_keys)
+        mib = memory_after(new.hit_nowait, args.ips)
+        print(f"{'gcra max_keys=' + str(max_keys):>24} {len(new):>10} {mib:>22.1f}")
+        del new
+
+    try:
+        import fakeredis
+    except ImportError:
+        print("\nfakeredis not installed; skipping the Redis limiter")
+        return
+
+    async def redis_run():
+        limiter = RedisRateLimiter(fakeredis.FakeAsyncRedis(), limit=5, period=60)
+        results = [await limiter.hit("user:1") for _ in range(7)]
+        allowed = [r.allowed for r in results]
+        start = time.perf_counter()
+        for i in range(2000):
+            await limiter.hit(f"ip:{i}")
+        rate = 2000 / (time.perf_counter() - start)
+        print(f"\nredis (fakeredis): burst of 7 at 5/min -> {allowed}, retry_after={results[-1].retry_after:.1f}s, "
+              f"{rate:,.0f} checks/s in-process")
+
+    asyncio.run(redis_run())
+
+if __name__ == "__main__":
+    main()
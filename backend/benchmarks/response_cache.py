@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Response cache on FAQ-style traffic
+Sends first-turn questions drawn from a small, skewed pool of FAQs (plus a
+share of unique questions) with and without the response cache, and
+reports upstream calls to the fake Groq server and /chat latency.
+
+Usage: python benchmarks/response_cache.py [--requests 300] [--faqs 20] [--unique-share 0.2]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import httpx
+
+from harness import api_server, fake_groq_server, percentile, signup
+
+async def drive(api_url: str, token: str, questions, concurrency: int):
+    latencies = []
+    queue = list(questions)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=api_url, headers=headers, timeout=120.0) as http:
+        async def worker():
+            while queue:
+                question = queue.pop()
+                start = time.perf_counter()
+                response = await http.post("/chat", json={"message": question})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--faqs", type=int, default=20)
+    parser.add_argument("--unique-share", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    faqs = [f"How do I do common task number {i}?" for i in range(args.faqs)]
+    weights = [1 / (rank + 1) for rank in range(args.faqs)]  # Zipf-like popularity
+    questions = [
+        f"A one-off question {i}?" if rng.random() < args.unique_share else rng.choices(faqs, weights)[0]
+        for i in range(args.requests)
+    ]
+
+    print(f"{'cache':>8} {'upstream_calls':>15} {'p50_ms':>8} {'p95_ms':>8}")
+    for enabled in ("false", "true"):
+        with tempfile.TemporaryDirectory() as tmp:
+            database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}?timeout=60"
+            with fake_groq_server(latency_ms=args.latency_ms) as groq_url, \
+                    api_server(groq_url, database_url, RESPONSE_CACHE_ENABLED=enabled) as api_url:
+                token = signup(api_url, "faq")
+                latencies = asyncio.run(drive(api_url, token, questions, args.concurrency))
+                upstream = httpx.get(groq_url + "/stats").json()["requests"]
+                print(f"{enabled:>8} {upstream:>15} {percentile(latencies, 50) * 1000:>8.0f} {percentile(latencies, 95) * 1000:>8.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+/chat/search latency at scale
+Seeds messages drawn from a Zipf-distributed vocabulary, so queries can
+target rare, medium and common words, then times /chat/search in process
+for random users: first pages per word class, two-word queries and
+second pages. The baseline is what clients did before: page through
+/chat/history and filter in the browser. On SQLite the FTS5 fallback is measured; pass
+--database-url for Postgres (tsvector + GIN).
+
+Usage: python benchmarks/search.py [--users 1000] [--conversations 10] [--messages 100] [--queries 200]
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from harness import BACKEND_DIR, percentile
+from seed import seed, seed_username
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "qu", "do", "fi", "gu", "ha", "jo"]
+
+def vocabulary(size: int) -> list:
+    """Deterministic pronounceable pseudo-words, so the stemmer leaves them alone"""
+    words = []
+    for i in range(size):
+        word, n = "", i + len(SYLLABLES)
+        while n:
+            n, digit = divmod(n, len(SYLLABLES))
+            word += SYLLABLES[digit]
+        words.append(word + "x")
+    return words
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--conversations", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=100, help="messages per conversation")
+    parser.add_argument("--words", type=int, default=12, help="words per message")
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    words = vocabulary(args.vocabulary)
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    cumulative = list(itertools.accumulate(weights))
+
+    def content(conversation_id: int, index: int) -> str:
+        rng = random.Random(conversation_id * 1000003 + index)
+        return " ".join(rng.choices(words, cum_weights=cumulative, k=args.words))
+
+    tmp = tempfile.mkdtemp()
+    database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    seeded = seed(database_url, args.users, args.conversations, args.messages, bcrypt_rounds=4, content=content)
+    print(f"Seeded {seeded['messages']} messages in {seeded['seconds']:.1f}s")
+
+    os.environ.setdefault("GROQ_API_KEY", "fake-key")
+    os.environ["RATE_LIMIT_PER_MINUTE"] = "1000000"
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+
+    import httpx
+    from app import app, create_access_token
+
+    rng = random.Random(7)
+    cases = {
+        "rare word": lambda: rng.choice(words[5000:]),
+        "medium word": lambda: rng.choice(words[200:1000]),
+        "common word": lambda: rng.choice(words[10:50]),
+        "two words": lambda: f"{rng.choice(words[10:200])} {rng.choice(words[200:2000])}",
+    }
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            async def search(user: int, query: str, cursor=None):
+                headers = {"Authorization": f"Bearer {create_access_token({'sub': seed_username(user)})}"}
+                params = {"q": query, "limit": 20, **({"cursor": cursor} if cursor else {})}
+                start = time.perf_counter()
+                response = await http.get("/chat/search", params=params, headers=headers)
+                elapsed = time.perf_counter() - start
+                response.raise_for_status()
+                return elapsed, response.json()
+
+            async def history_scan(user: int, query: str):
+                """Download every page of /chat/history and filter client-side"""
+                headers = {"Authorization": f"Bearer {create_access_token({'sub': seed_username(user)})}"}
+                start, cursor, hits = time.perf_counter(), None, 0
+                while True:
+                    response = await http.get("/chat/history", headers=headers,
+                                              params={"limit": 200, **({"cursor": cursor} if cursor else {})})
+                    response.raise_for_status()
+                    hits += sum(query in m["content"] for c in response.json() for m in c["messages"])
+                    cursor = response.headers.get("X-Next-Cursor")
+                    if not cursor:
+                        return time.perf_counter() - start, hits
+
+            await search(0, words[0])  # warm up caches and the connection pool
+            samples = [(await history_scan(rng.randrange(args.users), rng.choice(words[200:1000])))[0]
+                       for _ in range(min(args.queries, 20))]
+            print(f"{'case':>14} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'avg_hits':>9}")
+            print(f"{'history scan':>14} {percentile(samples, 50) * 1000:>8.1f} {percentile(samples, 95) * 1000:>8.1f} "
+                  f"{percentile(samples, 99) * 1000:>8.1f} {'-':>9}")
+            for name, make_query in cases.items():
+                samples, hits, second_pages = [], [], []
+                for _ in range(args.queries):
+                    user = rng.randrange(args.users)
+                    elapsed, body = await search(user, make_query())
+                    samples.append(elapsed)
+                    hits.append(len(body["results"]))
+                    if body["next_cursor"]:
+                        elapsed, _ = await search(user, body["query"], body["next_cursor"])
+                        second_pages.append(elapsed)
+                print(f"{name:>14} {percentile(samples, 50) * 1000:>8.1f} {percentile(samples, 95) * 1000:>8.1f} "
+                      f"{percentile(samples, 99) * 1000:>8.1f} {statistics.mean(hits):>9.1f}")
+                if second_pages:
+                    print(f"{'  page 2':>14} {percentile(second_pages, 50) * 1000:>8.1f} "
+                          f"{percentile(second_pages, 95) * 1000:>8.1f} {percentile(second_pages, 99) * 1000:>8.1f}")
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
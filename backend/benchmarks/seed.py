@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Seed a database with benchmark users, conversations and messages
+Rows are bulk-inserted in chunks, so millions of messages load in
+seconds. Every user gets the same password (hashed once) and predictable
+names, so load generators can log in and address seeded conversations:
+
+    user:          bench{u}           password: benchmark-password
+    conversation:  seed-{u}-{c}
+
+Usage: python benchmarks/seed.py --database-url sqlite:///bench.db [--users 1000] [--conversations 10] [--messages 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from harness import BACKEND_DIR
+
+SEED_PASSWORD = "benchmark-password"
+CHUNK_SIZE = 10000
+
+def seed_username(index: int) -> str:
+    return f"bench{index}"
+
+def seed_session_id(user_index: int, conversation_index: int) -> str:
+    return f"seed-{user_index}-{conversation_index}"
+
+def default_content(conversation_id: int, index: int) -> str:
+    return f"Seeded message {index} with enough text to look like a short chat turn."
+
+def seed(database_url: str, users: int, conversations: int, messages: int, bcrypt_rounds: int = 12,
+         content=default_content) -> dict:
+    """Create the schema and insert the rows; returns counts and elapsed seconds
+
+    content(conversation_id, index) supplies each message's text.
+    """
+    os.environ["DATABASE_URL"] = database_url
+    sys.path.insert(0, BACKEND_DIR)
+    from sqlalchemy import insert, select
+    from database import Conversation, Message, User, create_tables, engine
+    from passwords import hash_password
+
+    start = time.perf_counter()
+    create_tables()
+    hashed = hash_password(SEED_PASSWORD, rounds=bcrypt_rounds)
+    epoch = datetime.utcnow() - timedelta(days=90)
+
+    with engine.begin() as conn:
+        for offset in range(0, users, CHUNK_SIZE):
+            conn.execute(insert(User), [
+                {"username": seed_username(u), "email": f"{seed_username(u)}@example.com",
+                 "hashed_password": hashed, "is_active": True, "created_at": epoch}
+                for u in range(offset, min(users, offset + CHUNK_SIZE))
+            ])
+        user_ids = dict(conn.execute(select(User.username, User.id).where(User.username.like("bench%"))).all())
+
+        rows = []
+        for u in range(users):
+            for c in range(conversations):
+                started = epoch + timedelta(minutes=u * conversations + c)
+                rows.append({"session_id": seed_session_id(u, c), "user_id": user_ids[seed_username(u)],
+                             "created_at": started, "last_activity": started + timedelta(minutes=messages)})
+                if len(rows) >= CHUNK_SIZE:
+                    conn.execute(insert(Conversation), rows)
+                    rows = []
+        if rows:
+            conn.execute(insert(Conversation), rows)
+
+        conversation_ids = conn.execute(
+            select(Conversation.id, Conversation.created_at).where(Conversation.session_id.like("seed-%"))
+        ).all()
+        rows = []
+        for conversation_id, created_at in conversation_ids:
+            for m in range(messages):
+                rows.append({
+                    "conversation_id": conversation_id,
+                    "role": "user" if m % 2 == 0 else "assistant",
+                    "content": content(conversation_id, m),
+                    "timestamp": created_at + timedelta(seconds=m),
+                })
+                if len(rows) >= CHUNK_SIZE:
+                    conn.execute(insert(Message), rows)
+                    rows = []
+        if rows:
+            conn.execute(insert(Message), rows)
+
+    engine.dispose()
+    return {
+        "users": users,
+        "conversations": users * conversations,
+        "messages": users * conversations * messages,
+        "seconds": time.perf_counter() - start,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--conversations", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    args = parser.parse_args()
+
+    counts = seed(args.database_url, args.users, args.conversations, args.messages, args.bcrypt_rounds)
+    print(f"Seeded {counts['users']} users, {counts['conversations']} conversations, "
+          f"{counts['messages']} messages in {counts['seconds']:.1f}s")
+
+if __name__ == "__main__":
+    main()
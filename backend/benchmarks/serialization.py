@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+History serialization: Pydantic models vs plain dicts + orjson, and compression
+Seeds one heavy user and times /chat/history (full pages) and
+/chat/history/{session_id} in process, measuring CPU per request. The
+"before" routes rebuild the previous implementation (ChatHistoryResponse
+objects with Dict[str, str] messages, validated again by FastAPI against
+response_model). Also reports payload size and CPU with gzip and brotli.
+
+Usage: python benchmarks/serialization.py [--conversations 500] [--messages 40] [--repeat 50]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from harness import BACKEND_DIR
+from seed import seed, seed_session_id, seed_username
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--conversations", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    def content(conversation_id: int, index: int) -> str:
+        return (f"Message {index} of conversation {conversation_id}: a typical answer runs a few sentences, "
+                f"mentions some code like `print(x)` and a bit of “unicode” text. ") * (1 + index % 4)
+
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    seeded = seed(database_url, 1, args.conversations, args.messages, bcrypt_rounds=4, content=content)
+    print(f"Seeded {seeded['messages']} messages in {seeded['seconds']:.1f}s")
+
+    os.environ.setdefault("GROQ_API_KEY", "fake-key")
+    os.environ["RATE_LIMIT_PER_MINUTE"] = "1000000"
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+
+    from typing import Dict, List, Optional
+
+    import httpx
+    from fastapi import Depends
+    from pydantic import BaseModel
+    from sqlalchemy import select
+    from app import app, create_access_token, get_current_user
+    from database import Conversation, get_async_db
+    from history import count_messages, list_conversations, load_message_page, load_messages_for
+
+    class BeforeHistoryResponse(BaseModel):
+        session_id: str
+        messages: List[Dict[str, str]]
+        created_at: str
+        last_activity: str
+        message_count: int
+        next_cursor: Optional[str] = None
+
+    @app.get("/bench/before/history", response_model=List[BeforeHistoryResponse])
+    async def history_before(limit: int = 50, current_user=Depends(get_current_user), db=Depends(get_async_db)):
+        conversations, _ = await list_conversations(db, current_user.id, limit)
+        messages = await load_messages_for(db, [conversation.id for conversation in conversations])
+        return [BeforeHistoryResponse(
+            session_id=conversation.session_id,
+            messages=messages.get(conversation.id, []),
+            created_at=conversation.created_at.isoformat(),
+            last_activity=conversation.last_activity.isoformat(),
+            message_count=len(messages.get(conversation.id, [])),
+        ) for conversation in conversations]
+
+    @app.get("/bench/before/history/{session_id}", response_model=BeforeHistoryResponse)
+    async def session_before(session_id: str, limit: int = 100, current_user=Depends(get_current_user), db=Depends(get_async_db)):
+        result = await db.execute(select(Conversation).where(Conversation.session_id == session_id))
+        conversation = result.scalars().first()
+        message_list, next_cursor = await load_message_page(db, conversation.id, limit)
+        return BeforeHistoryResponse(
+            session_id=session_id,
+            messages=message_list,
+            created_at=conversation.created_at.isoformat(),
+            last_activity=conversation.last_activity.isoformat(),
+            message_count=await count_messages(db, conversation.id),
+            next_cursor=next_cursor,
+        )
+
+    token = create_access_token({"sub": seed_username(0)})
+    session_id = seed_session_id(0, 0)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                     headers={"Authorization": f"Bearer {token}"}) as http:
+            async def measure(path, params, encoding="identity"):
+                cpu, wall = [], []
+                for _ in range(args.repeat):
+                    c0, w0 = time.process_time(), time.perf_counter()
+                    response = await http.get(path, params=params, headers={"Accept-Encoding": encoding})
+                    cpu.append(time.process_time() - c0)
+                    wall.append(time.perf_counter() - w0)
+                    response.raise_for_status()
+                return statistics.median(cpu) * 1000, statistics.median(wall) * 1000, response.num_bytes_downloaded
+
+            cases = [
+                ("history 200, before", "/bench/before/history", {"limit": 200}, "identity"),
+                ("history 200, after", "/chat/history", {"limit": 200}, "identity"),
+                ("history 200, gzip", "/chat/history", {"limit": 200}, "gzip"),
+                ("history 200, br", "/chat/history", {"limit": 200}, "br"),
+                ("session 100, before", f"/bench/before/history/{session_id}", {"limit": 100}, "identity"),
+                ("session 100, after", f"/chat/history/{session_id}", {"limit": 100}, "identity"),
+                ("session 100, br", f"/chat/history/{session_id}", {"limit": 100}, "br"),
+            ]
+            for _, path, params, encoding in cases:
+                await measure(path, params, encoding)  # warm up
+            print(f"{'case':>22} {'cpu_ms':>8} {'wall_ms':>8} {'bytes':>10}")
+            for name, path, params, encoding in cases:
+                cpu, wall, size = await measure(path, params, encoding)
+                print(f"{name:>22} {cpu:>8.2f} {wall:>8.2f} {size:>10}")
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Single-flight coalescing during a traffic spike
+Many users send the same question at the same moment. The response cache
+is disabled so only coalescing is measured; the fake Groq server's /stats
+shows how many upstream calls were actually made.
+
+Usage: python benchmarks/singleflight.py [--users 100] [--latency-ms 1000]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from harness import api_server, fake_groq_server, percentile, signup
+
+async def spike(api_url: str, tokens, path: str):
+    latencies = []
+    async with httpx.AsyncClient(base_url=api_url, timeout=120.0,
+                                 limits=httpx.Limits(max_connections=len(tokens))) as http:
+        async def one(token):
+            start = time.perf_counter()
+            response = await http.post(path, json={"message": "What's new today?"},
+                                       headers={"Authorization": f"Bearer {token}"})
+            response.raise_for_status()
+            await response.aread()
+            latencies.append(time.perf_counter() - start)
+        await asyncio.gather(*(one(token) for token in tokens))
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'singleflight':>13} {'endpoint':>13} {'upstream_calls':>15} {'p50_ms':>8} {'p99_ms':>8}")
+    for enabled in ("false", "true"):
+        with tempfile.TemporaryDirectory() as tmp:
+            database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}?timeout=60"
+            with fake_groq_server(latency_ms=args.latency_ms, FAKE_GROQ_TOKENS_PER_SEC=100) as groq_url, \
+                    api_server(groq_url, database_url, SINGLEFLIGHT_ENABLED=enabled, RESPONSE_CACHE_ENABLED="false") as api_url:
+                tokens = [signup(api_url, f"user{i}") for i in range(args.users)]
+                for path in ("/chat", "/chat/stream"):
+                    before = httpx.get(groq_url + "/stats").json()["requests"]
+                    latencies = asyncio.run(spike(api_url, tokens, path))
+                    upstream = httpx.get(groq_url + "/stats").json()["requests"] - before
+                    print(f"{enabled:>13} {path:>13} {upstream:>15} "
+                          f"{percentile(latencies, 50) * 1000:>8.0f} {percentile(latencies, 99) * 1000:>8.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Import time and cold start
+Times `import app` in a fresh interpreter (what every worker process and
+every tool that imports the module pays), the same import followed by
+the schema check that used to run on import, and building the app with
+create_app(). Then starts uvicorn with the factory and 1 or more preforked
+workers against an already migrated database and times process start to
+the first 200 from /readyz. Exits 1 if the median import exceeds
+--budget-ms.
+
+Usage: python benchmarks/startup.py [--repeat 5] [--workers 1,4] [--budget-ms 1000]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from harness import BACKEND_DIR, free_port
+
+IMPORT_ONLY = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+IMPORT_AND_MIGRATE = "import time; t = time.perf_counter(); import app; app.init_db(); print(time.perf_counter() - t)"
+IMPORT_AND_BUILD = "import time; t = time.perf_counter(); import app; app.create_app(); print(time.perf_counter() - t)"
+
+def timed_python(code: str, env: dict) -> float:
+    output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def time_to_ready(env: dict, workers: int, timeout: float = 60.0) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:create_app", "--factory", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/readyz", timeout=1.0).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError("Timed out waiting for /readyz")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", default="1,4")
+    parser.add_argument("--budget-ms", type=float, default=1000)
+    args = parser.parse_args()
+
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    env = {**os.environ, "DATABASE_URL": database_url, "GROQ_API_KEY": "fake-key"}
+    subprocess.run([sys.executable, "init_db.py"], cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    timed_python(IMPORT_ONLY, env)  # warm up: bytecode caches and page cache
+
+    print(f"{'case':>28} {'p50_ms':>8} {'min_ms':>8}")
+    results = {}
+    for name, code in [("import app", IMPORT_ONLY), ("import + schema check", IMPORT_AND_MIGRATE),
+                       ("import + create_app()", IMPORT_AND_BUILD)]:
+        samples = [timed_python(code, env) for _ in range(args.repeat)]
+        results[name] = statistics.median(samples) * 1000
+        print(f"{name:>28} {results[name]:>8.1f} {min(samples) * 1000:>8.1f}")
+
+    for workers in [int(w) for w in args.workers.split(",")]:
+        samples = [time_to_ready(env, workers) for _ in range(args.repeat)]
+        print(f"{f'ready, {workers} worker(s)':>28} {statistics.median(samples) * 1000:>8.1f} {min(samples) * 1000:>8.1f}")
+
+    if results["import app"] > args.budget_ms:
+        print(f"import app took {results['import app']:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite
+Seeds a database at scale, boots the API against it and the fake Groq
+server, then drives a realistic mix of signup, login, chat, history and
+delete requests at each concurrency level. Reports requests/sec and
+p50/p95/p99 per endpoint plus average SQL statements per request (from
+/metrics), and writes everything to JSON for benchmarks/compare.py.
+
+Runs on a temporary SQLite database by default; pass --database-url for
+a local Postgres (it must be empty; the suite seeds it).
+
+Usage: python benchmarks/suite.py [--concurrency 4,16,64] [--duration 10] [--users 1000] [--output results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+from harness import BACKEND_DIR, BENCH_DIR, api_server, fake_groq_server, percentile
+from seed import SEED_PASSWORD, seed, seed_session_id, seed_username
+
+DEFAULT_MIX = "chat=40,history=20,session=15,login=10,signup=5,delete=5"
+
+# Route template each operation hits, to match the per-route metrics
+OPERATION_ROUTES = {
+    "chat": "/chat",
+    "history": "/chat/history",
+    "session": "/chat/history/{session_id}",
+    "login": "/login",
+    "signup": "/signup",
+    "delete": "/chat/history/{session_id}",
+}
+
+QUERY_METRIC = re.compile(r'^db_queries_per_request_(sum|count)\{route="([^"]*)"\} ([0-9.e+]+)$')
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for item in text.split(","):
+        name, weight = item.split("=")
+        if name not in OPERATION_ROUTES:
+            raise SystemExit(f"Unknown operation in --mix: {name}")
+        mix[name] = float(weight)
+    return mix
+
+def query_totals(api_url: str) -> dict:
+    """route -> [statement sum, request count] scraped from /metrics"""
+    totals = {}
+    for line in httpx.get(api_url + "/metrics", timeout=30.0).text.splitlines():
+        match = QUERY_METRIC.match(line)
+        if match:
+            kind, route, value = match.groups()
+            totals.setdefault(route, [0.0, 0.0])[0 if kind == "sum" else 1] = float(value)
+    return totals
+
+class VirtualUser:
+    """One seeded user logged in with its own client, cycling through the mix"""
+
+    def __init__(self, http: httpx.AsyncClient, index: int, conversations: int, rng: random.Random):
+        self.http = http
+        self.username = seed_username(index)
+        self.sessions = [seed_session_id(index, c) for c in range(conversations)]
+        self.rng = rng
+        self.headers = {}
+        self.counter = 0
+
+    async def login(self) -> httpx.Response:
+        response = await self.http.post("/login", json={"username": self.username, "password": SEED_PASSWORD})
+        if response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return response
+
+    async def run(self, operation: str) -> httpx.Response:
+        self.counter += 1
+        if operation == "login":
+            return await self.login()
+        if operation == "signup":
+            name = f"new{os.getpid()}_{id(self)}_{self.counter}_{self.rng.randrange(10 ** 9)}"
+            return await self.http.post("/signup", json={"username": name, "email": f"{name}@example.com", "password": SEED_PASSWORD})
+        if operation == "chat":
+            session_id = self.rng.choice(self.sessions) if self.sessions and self.rng.random() < 0.5 else None
+            return await self.http.post("/chat", headers=self.headers,
+                                        json={"message": f"Question {self.counter} from {self.username}", "session_id": session_id})
+        if operation == "history":
+            return await self.http.get("/chat/history", headers=self.headers, params={"limit": 20})
+        if operation == "session":
+            return await self.http.get(f"/chat/history/{self.rng.choice(self.sessions)}", headers=self.headers, params={"limit": 50})
+        # delete: remove one of this user's seeded conversations
+        return await self.http.delete(f"/chat/history/{self.sessions.pop()}", headers=self.headers)
+
+    def pick(self, mix: dict) -> str:
+        operations = [op for op in mix if self.sessions or op not in ("session", "delete")]
+        return self.rng.choices(operations, [mix[op] for op in operations])[0]
+
+async def run_point(api_url: str, concurrency: int, duration: float, mix: dict, first_user: int, conversations: int, seed_value: int):
+    samples = {op: [] for op in mix}
+    errors = {op: 0 for op in mix}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=api_url, timeout=120.0, limits=limits) as http:
+        users = [VirtualUser(http, first_user + i, conversations, random.Random(seed_value + i)) for i in range(concurrency)]
+        await asyncio.gather(*(user.login() for user in users))
+        deadline = time.perf_counter() + duration
+
+        async def drive(user: VirtualUser):
+            while time.perf_counter() < deadline:
+                operation = user.pick(mix)
+                start = time.perf_counter()
+                response = await user.run(operation)
+                samples[operation].append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors[operation] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(drive(user) for user in users))
+        elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for op, latencies in samples.items():
+        endpoints[op] = {
+            "requests": len(latencies),
+            "errors": errors[op],
+            "rps": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+    return elapsed, endpoints
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", default="4,16,64")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--conversations", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-sec", type=float, default=0)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--output", default=None, help="default: benchmarks/results/<commit>.json")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    if sum(levels) > args.users:
+        raise SystemExit("--users must be at least the sum of --concurrency levels (each virtual user owns a seeded user)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}?timeout=60"
+        seeded = seed(database_url, args.users, args.conversations, args.messages, args.bcrypt_rounds)
+        print(f"Seeded {seeded['users']} users, {seeded['conversations']} conversations, "
+              f"{seeded['messages']} messages in {seeded['seconds']:.1f}s")
+
+        points = []
+        with fake_groq_server(latency_ms=args.latency_ms, FAKE_GROQ_TOKENS_PER_SEC=args.tokens_per_sec) as groq_url, \
+                api_server(groq_url, database_url, BCRYPT_ROUNDS=args.bcrypt_rounds) as api_url:
+            first_user = 0
+            for concurrency in levels:
+                before = query_totals(api_url)
+                elapsed, endpoints = asyncio.run(
+                    run_point(api_url, concurrency, args.duration, mix, first_user, args.conversations, args.seed)
+                )
+                after = query_totals(api_url)
+                first_user += concurrency  # fresh users, so deletes never hit already-deleted sessions
+
+                queries = {}
+                for route, (total, count) in after.items():
+                    old_total, old_count = before.get(route, [0.0, 0.0])
+                    if count > old_count:
+                        queries[route] = (total - old_total) / (count - old_count)
+                for op, stats in endpoints.items():
+                    stats["db_queries_per_request"] = queries.get(OPERATION_ROUTES[op])
+
+                total_requests = sum(stats["requests"] for stats in endpoints.values())
+                points.append({"concurrency": concurrency, "seconds": elapsed,
+                               "rps": total_requests / elapsed, "endpoints": endpoints})
+
+                print(f"\nconcurrency {concurrency}: {total_requests / elapsed:.0f} req/s")
+                print(f"{'endpoint':>10} {'reqs':>6} {'errs':>5} {'rps':>7} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'queries':>8}")
+                for op, stats in endpoints.items():
+                    queries_text = f"{stats['db_queries_per_request']:.1f}" if stats["db_queries_per_request"] is not None else "-"
+                    print(f"{op:>10} {stats['requests']:>6} {stats['errors']:>5} {stats['rps']:>7.1f} {stats['p50_ms']:>8.1f} "
+                          f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {queries_text:>8}")
+
+    commit = git_commit()
+    result = {
+        "commit": commit,
+        "label": args.label,
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "database": "postgres" if database_url.startswith("postgresql") else "sqlite",
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "database_url")},
+        "seeded": seeded,
+        "points": points,
+    }
+    output = args.output or os.path.join(BENCH_DIR, "results", f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults written to {output}")
+
+if __name__ == "__main__":
+    main()
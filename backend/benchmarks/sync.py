@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Refresh after each message: full /chat/history vs incremental /chat/sync
+Seeds one heavy user, then repeatedly sends a message in one conversation
+(fake Groq upstream) and refreshes the client's copy three ways: the
+default /chat/history page the frontend used to fetch, every /chat/history
+page, and /chat/sync from the previous cursor. Once the overlap window has
+passed, also times a sync with If-None-Match when nothing changed (304).
+Reports median latency and bytes.
+
+Usage: python benchmarks/sync.py [--conversations 500] [--messages 20] [--rounds 30]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from harness import BACKEND_DIR, fake_groq_server
+from seed import seed, seed_session_id, seed_username
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--conversations", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=30)
+    args = parser.parse_args()
+
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    seeded = seed(database_url, 1, args.conversations, args.messages, bcrypt_rounds=4)
+    print(f"Seeded {seeded['messages']} messages in {seeded['seconds']:.1f}s")
+
+    with fake_groq_server(latency_ms=0) as groq_url:
+        os.environ.update(GROQ_API_KEY="fake-key", GROQ_BASE_URL=groq_url, RATE_LIMIT_PER_MINUTE="1000000",
+                          RESPONSE_COMPRESSION_ENABLED="false")
+        sys.path.insert(0, BACKEND_DIR)
+        os.chdir(BACKEND_DIR)
+
+        import httpx
+        from app import app, create_access_token, message_writer
+        from sync import SYNC_OVERLAP_SECONDS
+
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': seed_username(0)})}"}
+        session_id = seed_session_id(0, 0)
+        samples = {"history page": [], "history all pages": [], "sync delta": [], "sync unchanged (304)": []}
+        sizes = {name: [] for name in samples}
+
+        async def timed(name, requests):
+            start = time.perf_counter()
+            size = 0
+            for request in requests:
+                response = await request()
+                size += len(response.content)
+            samples[name].append(time.perf_counter() - start)
+            sizes[name].append(size)
+            return response
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                         headers=headers, timeout=60) as http:
+                # Initial full sync, as on page load
+                cursor, has_more = None, True
+                while has_more:
+                    data = (await http.get("/chat/sync", params={"cursor": cursor} if cursor else {})).json()
+                    cursor, has_more = data["cursor"], data["has_more"]
+
+                for i in range(args.rounds):
+                    response = await http.post("/chat", json={"message": f"round {i}", "session_id": session_id, "cache": False})
+                    response.raise_for_status()
+
+                    await timed("history page", [lambda: http.get("/chat/history")])
+
+                    start = time.perf_counter()
+                    size = 0
+                    page_cursor = None
+                    while True:
+                        response = await http.get("/chat/history", params={"limit": 200, **({"cursor": page_cursor} if page_cursor else {})})
+                        size += len(response.content)
+                        page_cursor = response.headers.get("X-Next-Cursor")
+                        if not page_cursor:
+                            break
+                    samples["history all pages"].append(time.perf_counter() - start)
+                    sizes["history all pages"].append(size)
+
+                    response = await timed("sync delta", [lambda: http.get("/chat/sync", params={"cursor": cursor})])
+                    data = response.json()
+                    assert any(m["content"] == f"round {i}" for c in data["conversations"] for m in c["messages"])
+                    cursor = data["cursor"]
+
+                # Once the last exchange is older than the overlap window the cursor settles
+                await asyncio.sleep(SYNC_OVERLAP_SECONDS + 1)
+                for _ in range(2):
+                    response = await http.get("/chat/sync", params={"cursor": cursor})
+                    cursor, etag = response.json()["cursor"], response.headers["ETag"]
+                for _ in range(args.rounds):
+                    response = await timed("sync unchanged (304)", [
+                        lambda: http.get("/chat/sync", params={"cursor": cursor}, headers={"If-None-Match": etag})
+                    ])
+                    assert response.status_code == 304
+                await message_writer.close()
+
+        asyncio.run(run())
+
+    print(f"{'refresh':>22} {'p50_ms':>8} {'bytes':>10}")
+    for name in samples:
+        print(f"{name:>22} {statistics.median(samples[name]) * 1000:>8.2f} {int(statistics.median(sizes[name])):>10}")
+
+if __name__ == "__main__":
+    main()
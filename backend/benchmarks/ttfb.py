@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Time-to-first-byte of /chat versus /chat/stream against the fake Groq server
+The fake upstream answers its first token after --latency-ms and then emits
+--tokens-per-sec, so the blocking endpoint pays for the whole generation.
+
+Usage: python benchmarks/ttfb.py [--latency-ms 300] [--tokens-per-sec 50] [--requests 10]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from harness import api_server, fake_groq_server, signup
+
+REPLY = " ".join(["word"] * 100)
+
+def time_request(http: httpx.Client, path: str):
+    """Return (time to first byte, time to first answer text, total time) for one POST"""
+    start = time.perf_counter()
+    first_byte = first_text = None
+    with http.stream("POST", path, json={"message": "How fast is the first byte?"}) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            now = time.perf_counter() - start
+            if first_byte is None:
+                first_byte = now
+            if first_text is None and ('"delta"' in line or '"response"' in line):
+                first_text = now
+    return first_byte, first_text, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-sec", type=float, default=50)
+    parser.add_argument("--requests", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        with fake_groq_server(latency_ms=args.latency_ms, FAKE_GROQ_TOKENS_PER_SEC=args.tokens_per_sec,
+                              FAKE_GROQ_REPLY=REPLY) as groq_url, \
+                api_server(groq_url, database_url) as api_url:
+            token = signup(api_url, "ttfb")
+            with httpx.Client(base_url=api_url, headers={"Authorization": f"Bearer {token}"}, timeout=120.0) as http:
+                print(f"{'endpoint':>14} {'ttfb_ms':>9} {'first_text_ms':>14} {'total_ms':>9}")
+                for path in ("/chat", "/chat/stream"):
+                    samples = [time_request(http, path) for _ in range(args.requests)]
+                    ttfb, first_text, total = (statistics.median(column) * 1000 for column in zip(*samples))
+                    print(f"{path:>14} {ttfb:>9.0f} {first_text:>14.0f} {total:>9.0f}")
+
+if __name__ == "__main__":
+    main()
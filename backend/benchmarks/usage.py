@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Token quota check and usage accounting cost on the /chat hot path
+Tracks usage for 10k users on SQLite and times, per request: the
+in-memory quota check, recording a call's tokens, and the alternatives
+they replace, a SUM query against token_usage for the check and an
+upsert per request for the write. Also times a user's first check, which
+loads their totals, and one batched flush of every user's pending
+counts. The in-memory check should cost microseconds against
+milliseconds for a query.
+
+Usage: python benchmarks/usage.py [--users 10000] [--requests 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from harness import BACKEND_DIR
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    sys.path.insert(0, BACKEND_DIR)
+
+    from sqlalchemy import func, insert, select
+    from database import AsyncSessionLocal, TokenUsage, User, async_engine, create_tables, engine
+    from usage import UsageTracker, first_of_month, upsert_statement, utc_today
+
+    create_tables()
+    today = utc_today()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"username": f"usage{u}", "email": f"usage{u}@example.com", "hashed_password": "x", "is_active": True}
+            for u in range(args.users)
+        ])
+        user_ids = conn.execute(select(User.id)).scalars().all()
+        # A month of history for everyone
+        conn.execute(insert(TokenUsage), [
+            {"user_id": user_id, "day": day, "prompt_tokens": 900, "completion_tokens": 300, "requests": 3}
+            for user_id in user_ids
+            for day in {first_of_month(today).replace(day=d) for d in range(1, today.day + 1)}
+        ])
+
+    rnd = random.Random(42)
+    requests = [rnd.choice(user_ids) for _ in range(args.requests)]
+
+    def timed(samples):
+        return statistics.median(samples) * 1e6, sorted(samples)[int(len(samples) * 0.99)] * 1e6
+
+    async def run():
+        tracker = UsageTracker(daily_quota=10 ** 9, monthly_quota=10 ** 12)
+        # Every user's first request loads their totals
+        results = {}
+        samples = []
+        for user_id in user_ids:
+            start = time.perf_counter()
+            await tracker.check(user_id)
+            samples.append(time.perf_counter() - start)
+        results["check (first)"] = timed(samples)
+
+        samples = []
+        for user_id in requests:
+            start = time.perf_counter()
+            await tracker.check(user_id)
+            samples.append(time.perf_counter() - start)
+        results["check (memory)"] = timed(samples)
+
+        samples = []
+        for user_id in requests:
+            start = time.perf_counter()
+            tracker.add(user_id, 1200, 300)
+            samples.append(time.perf_counter() - start)
+        results["record (memory)"] = timed(samples)
+
+        tokens = TokenUsage.prompt_tokens + TokenUsage.completion_tokens
+        samples = []
+        for user_id in requests[:500]:
+            start = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                await db.scalar(select(func.sum(tokens)).where(
+                    TokenUsage.user_id == user_id, TokenUsage.day >= first_of_month(today)
+                ))
+            samples.append(time.perf_counter() - start)
+        results["check (SUM query)"] = timed(samples)
+
+        statement = upsert_statement(async_engine.dialect.name)
+        samples = []
+        for user_id in requests[:500]:
+            start = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                await db.execute(statement, [{"user_id": user_id, "day": today, "prompt_tokens": 1200,
+                                              "completion_tokens": 300, "requests": 1}])
+                await db.commit()
+            samples.append(time.perf_counter() - start)
+        results["record (upsert)"] = timed(samples)
+
+        print(f"{'per request':<18} {'median_us':>10} {'p99_us':>10}")
+        for name, (median, p99) in results.items():
+            print(f"{name:<18} {median:>10.1f} {p99:>10.1f}")
+
+        for user_id in user_ids:
+            tracker.add(user_id, 1200, 300)
+        start = time.perf_counter()
+        rows = await tracker.flush()
+        flush_s = time.perf_counter() - start
+        print(f"\none flush of {rows} pending rows (upsert and refresh of {len(user_ids)} users): {flush_s:.2f}s")
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Background compaction of long conversations into a rolling summary
+
+After each exchange the conversation is queued here. Once more than
+COMPACTION_THRESHOLD messages follow its summary, a worker asks the LLM
+to fold all but the newest COMPACTION_KEEP_RECENT of them into the
+summary, in the scheduler's background lane under the user's name, the
+same tenant key as their chat requests. Prompt assembly then sends
+the summary plus the messages after it instead of ever-longer history.
+
+Compaction is idempotent: the summary only moves forward from the
+position it was computed from (a conditional UPDATE), so duplicate or
+concurrent runs, here or in another worker process, change nothing.
+"""
+
+import asyncio
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, func, or_, select, update
+
+from context import estimate_tokens
+from database import AsyncSessionLocal, Conversation, Message, User
+from llm_gateway import llm_gateway
+from llm_scheduler import BACKGROUND, LLM_SCHEDULER_ENABLED, SchedulerOverloaded, llm_scheduler
+from metrics import METRICS_ENABLED, compaction_tokens_saved
+from persistence import message_writer
+from usage import charge
+
+# Compaction configuration
+COMPACTION_ENABLED = os.getenv("COMPACTION_ENABLED", "true").lower() == "true"
+COMPACTION_THRESHOLD = int(os.getenv("COMPACTION_THRESHOLD", "30"))  # unsummarized messages that trigger a run
+COMPACTION_KEEP_RECENT = int(os.getenv("COMPACTION_KEEP_RECENT", "10"))  # newest messages left out of the summary
+COMPACTION_BATCH_MESSAGES = int(os.getenv("COMPACTION_BATCH_MESSAGES", "200"))  # messages folded in per LLM call
+COMPACTION_WORKERS = int(os.getenv("COMPACTION_WORKERS", "2"))
+COMPACTION_QUEUE_SIZE = int(os.getenv("COMPACTION_QUEUE_SIZE", "1000"))
+COMPACTION_MODEL = os.getenv("COMPACTION_MODEL", "llama-3.1-8b-instant")
+COMPACTION_SUMMARY_MAX_TOKENS = int(os.getenv("COMPACTION_SUMMARY_MAX_TOKENS", "300"))
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a chat between a user and an AI assistant. "
+    "Merge the new messages into the existing summary. Keep facts about the user, names, "
+    "decisions, open questions and anything the assistant promised; drop small talk. "
+    f"Answer with the updated summary only, in at most {COMPACTION_SUMMARY_MAX_TOKENS * 3 // 4} words."
+)
+
+def summary_prompt(summary: Optional[str], messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Messages asking the LLM to fold `messages` into `summary`"""
+    transcript = "\n".join(
+        f"{'User' if message['role'] == 'user' else 'Assistant'}: {message['content']}" for message in messages
+    )
+    return [
+        {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+        {"role": "user", "content": f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+    ]
+
+class Compactor:
+    """Queue of conversations to check, drained by a small pool of worker tasks"""
+
+    def __init__(
+        self,
+        threshold: int = COMPACTION_THRESHOLD,
+        keep_recent: int = COMPACTION_KEEP_RECENT,
+        batch_messages: int = COMPACTION_BATCH_MESSAGES,
+        workers: int = COMPACTION_WORKERS,
+        queue_size: int = COMPACTION_QUEUE_SIZE,
+    ):
+        self.threshold = threshold
+        self.keep_recent = keep_recent
+        self.batch_messages = batch_messages
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._queue_size = queue_size
+        self._queued: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+        self.compactions = 0
+        self.summarized_messages = 0
+        self.tokens_saved = 0
+        self.conflicts = 0
+        self.deferred = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def start(self):
+        """Start the worker pool (idempotent)"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(self._queue_size)
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._work()))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def notify(self, user_id: int, session_id: str):
+        """Queue a conversation for a threshold check; never blocks the request path"""
+        if self._queue is None or session_id in self._queued:
+            return
+        try:
+            self._queue.put_nowait((user_id, session_id))
+        except asyncio.QueueFull:
+            self.dropped += 1  # checked again after its next exchange
+            return
+        self._queued.add(session_id)
+
+    async def idle(self):
+        """Wait until every queued conversation has been processed"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _work(self):
+        while True:
+            user_id, session_id = await self._queue.get()
+            self._queued.discard(session_id)
+            try:
+                await self.compact(user_id, session_id)
+            except SchedulerOverloaded:
+                self.deferred += 1
+            except Exception as e:
+                self.failures += 1
+                print(f"⚠️ Compaction of conversation {session_id} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def compact(self, user_id: int, session_id: str) -> int:
+        """Fold older messages into the summary while the conversation is over the threshold
+
+        Returns the number of messages summarized.
+        """
+        await message_writer.barrier(user_id)
+        charge(user_id)  # summaries are upstream tokens spent on this user's behalf
+        summarized = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(
+                    Conversation.id, Conversation.summary, Conversation.summary_through_at,
+                    Conversation.summary_through_id, Conversation.summarized_tokens, User.username
+                ).join(User, User.id == Conversation.user_id).where(Conversation.session_id == session_id))
+                conversation = result.first()
+                if conversation is None:
+                    return summarized
+                after = self._after(conversation)
+                pending = await db.scalar(select(func.count()).select_from(Message).where(
+                    Message.conversation_id == conversation.id, *after
+                ))
+                if pending <= max(self.threshold, self.keep_recent):
+                    return summarized
+                result = await db.execute(
+                    select(Message.id, Message.role, Message.content, Message.timestamp)
+                    .where(Message.conversation_id == conversation.id, *after)
+                    .order_by(Message.timestamp, Message.id)
+                    .limit(min(pending - self.keep_recent, self.batch_messages))
+                )
+                rows = result.all()
+
+            # No connection is held during the upstream call
+            summary = await self._summarize(conversation.username, conversation.summary, [row._asdict() for row in rows])
+            if not summary:
+                return summarized
+
+            last = rows[-1]
+            source_tokens = conversation.summarized_tokens + sum(estimate_tokens(row.content) for row in rows)
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    update(Conversation)
+                    .where(Conversation.id == conversation.id,
+                           Conversation.summary_through_id.is_not_distinct_from(conversation.summary_through_id))
+                    .values(summary=summary, summary_through_at=last.timestamp, summary_through_id=last.id,
+                            summarized_tokens=source_tokens)
+                )
+                await db.commit()
+            if result.rowcount == 0:
+                self.conflicts += 1  # another run got there first
+                return summarized
+
+            # Prompt tokens saved = what the summarized messages would cost minus the summary
+            saved = max(0, source_tokens - estimate_tokens(summary))
+            previously_saved = max(0, conversation.summarized_tokens - estimate_tokens(conversation.summary or ""))
+            self.compactions += 1
+            self.summarized_messages += len(rows)
+            self.tokens_saved += saved - previously_saved
+            if METRICS_ENABLED:
+                compaction_tokens_saved.labels().observe(saved)
+            summarized += len(rows)
+
+    @staticmethod
+    def _after(conversation) -> Tuple:
+        """Filter for messages after the summarized position"""
+        if conversation.summary_through_id is None:
+            return ()
+        return (or_(
+            Message.timestamp > conversation.summary_through_at,
+            and_(Message.timestamp == conversation.summary_through_at, Message.id > conversation.summary_through_id)
+        ),)
+
+    async def _summarize(self, username: str, summary: Optional[str], rows: List[Dict]) -> str:
+        messages = summary_prompt(summary, rows)
+
+        async def call():
+            text = await llm_gateway.complete(
+                [COMPACTION_MODEL], messages, temperature=0.2, max_tokens=COMPACTION_SUMMARY_MAX_TOKENS
+            )
+            return text.strip()
+
+        if LLM_SCHEDULER_ENABLED:
+            return await llm_scheduler.run(username, call, lane=BACKGROUND)
+        return await call()
+
+    def snapshot(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "compactions": self.compactions,
+            "summarized_messages": self.summarized_messages,
+            "tokens_saved": self.tokens_saved,
+            "conflicts": self.conflicts,
+            "deferred": self.deferred,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
+
+compactor = Compactor()
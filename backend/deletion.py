@@ -0,0 +1,113 @@
+"""
+Bulk deletion of conversations and accounts
+
+Messages, archives and sync tombstones go with their conversation or
+user through ON DELETE CASCADE foreign keys, so nothing is loaded into
+the session to delete it. A single cascading DELETE of a long
+conversation would still lock every one of its rows until commit, so
+messages are deleted first, DELETE_BATCH_ROWS per transaction, and then
+conversations DELETE_BATCH_CONVERSATIONS at a time, with a short pause
+between batches; chats writing concurrently only ever wait for one
+short batch. Whatever slips in
+between two batches is caught by the cascade.
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import delete, insert, select, update
+
+from auth_cache import user_cache, user_key
+from database import AsyncSessionLocal, Conversation, ConversationArchive, Message, Tombstone, User
+
+# Rows per delete transaction
+DELETE_BATCH_ROWS = int(os.getenv("DELETE_BATCH_ROWS", "2000"))
+DELETE_BATCH_CONVERSATIONS = int(os.getenv("DELETE_BATCH_CONVERSATIONS", "100"))
+# Pause between batches so waiting writers get the lock (SQLite has one for the whole database)
+DELETE_BATCH_PAUSE_MS = float(os.getenv("DELETE_BATCH_PAUSE_MS", "10"))
+
+async def delete_messages(conversation_ids: List[int], batch_rows: int = DELETE_BATCH_ROWS) -> int:
+    """Delete the messages of some conversations, one committed batch at a time"""
+    deleted = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            batch = (
+                select(Message.id)
+                .where(Message.conversation_id.in_(conversation_ids))
+                .limit(batch_rows)
+            )
+            result = await db.execute(delete(Message).where(
+                Message.conversation_id.in_(conversation_ids),
+                Message.id.in_(batch.scalar_subquery())
+            ))
+            await db.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_rows:
+            return deleted
+        await asyncio.sleep(DELETE_BATCH_PAUSE_MS / 1000)
+
+async def delete_conversations(user_id: int, *criteria, tombstones: bool = True,
+                               batch_rows: int = DELETE_BATCH_ROWS) -> Dict[str, int]:
+    """Delete a user's conversations matching criteria (all of them when none are given)
+
+    Leaves a sync tombstone per conversation unless tombstones is False.
+    Returns the number of conversations and messages (live and archived)
+    deleted.
+    """
+    matching = (Conversation.user_id == user_id, *criteria)
+    summary = {"conversations": 0, "messages": 0}
+    while True:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Conversation.id).where(*matching).order_by(Conversation.id).limit(DELETE_BATCH_CONVERSATIONS)
+            )
+            conversation_ids = result.scalars().all()
+        if not conversation_ids:
+            return summary
+
+        summary["messages"] += await delete_messages(conversation_ids, batch_rows)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(ConversationArchive.conversation_id, ConversationArchive.message_count)
+                .where(ConversationArchive.conversation_id.in_(conversation_ids))
+            )
+            archived = dict(result.all())
+            # Criteria are checked again: a conversation may have changed since it was selected
+            result = await db.execute(
+                delete(Conversation).where(Conversation.id.in_(conversation_ids), *matching)
+                .returning(Conversation.id, Conversation.session_id)
+            )
+            deleted = result.all()
+            if tombstones and deleted:
+                now = datetime.utcnow()
+                await db.execute(insert(Tombstone), [
+                    {"user_id": user_id, "session_id": session_id, "deleted_at": now} for _, session_id in deleted
+                ])
+            await db.commit()
+        summary["conversations"] += len(deleted)
+        summary["messages"] += sum(archived.get(conversation_id, 0) for conversation_id, _ in deleted)
+
+async def delete_account(user_id: int, batch_rows: int = DELETE_BATCH_ROWS) -> Dict[str, int]:
+    """Delete a user with all of their conversations and messages
+
+    The account is deactivated and dropped from the user cache first, so
+    its tokens stop authenticating while its history is being deleted.
+    Workers using the in-memory cache backend may still accept them until
+    their entry expires (USER_CACHE_TTL_SECONDS).
+    """
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(User).where(User.id == user_id).values(is_active=False))
+        await db.commit()
+    # A Core update does not fire the ORM is_active listener
+    await user_cache.invalidate(user_key(user_id))
+    summary = await delete_conversations(user_id, tombstones=False, batch_rows=batch_rows)
+    async with AsyncSessionLocal() as db:
+        # Conversations written by requests that were already in flight cascade with them
+        await db.execute(delete(Conversation).where(Conversation.user_id == user_id))
+        await db.execute(delete(User).where(User.id == user_id))
+        await db.commit()
+    # A request that looked the user up before the deactivation may have cached them again
+    await user_cache.invalidate(user_key(user_id))
+    return summary
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Streaming export and bulk import of a user's conversations
+
+The export is JSON Lines, optionally gzip-compressed, one record per line:
+    {"type": "conversation", "session_id", "created_at", "last_activity"}
+    {"type": "message", "session_id", "id", "role", "content", "timestamp"}
+    {"type": "checkpoint", "cursor"}   every EXPORT_CHECKPOINT_RECORDS records
+    {"type": "end", "conversations", "messages"}
+Each conversation line is followed by all its messages (archived ones
+included), oldest first. Rows come from one query read through a
+server-side cursor EXPORT_BATCH_ROWS at a time, so memory does not grow
+with the size of the history. An interrupted export is resumed by
+passing the cursor of the last checkpoint received; the resumed export
+starts with the current conversation's line again, and lines after the
+checkpoint are either dropped by the client or skipped by the import.
+
+The import reads the same format and appends the conversations to a
+user: COPY on Postgres, batched multi-row inserts elsewhere. Messages of
+a conversation the user already has are only added if they are newer
+than its latest message, so importing a file twice, or an export with a
+resumed overlap, adds nothing twice.
+
+    python export.py export --username alice [--output alice.jsonl.gz] [--cursor CURSOR]
+    python export.py import --username alice alice.jsonl.gz
+"""
+
+import argparse
+import asyncio
+import base64
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+import zlib
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import and_, func, insert, or_, select, update
+
+load_dotenv()
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from archive import load_archives
+from database import AsyncSessionLocal, Conversation, ConversationArchive, Message, User, async_engine, engine
+from history import InvalidCursor
+from partitions import month_start
+from responses import dumps
+
+# Export configuration
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "1000"))  # rows fetched per round trip from the server-side cursor
+EXPORT_CHECKPOINT_RECORDS = int(os.getenv("EXPORT_CHECKPOINT_RECORDS", "1000"))
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", str(64 * 1024)))  # bytes per write / response body chunk
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", "6"))
+IMPORT_BATCH_ROWS = int(os.getenv("IMPORT_BATCH_ROWS", "5000"))
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "gzip": "application/gzip"}
+EXPORT_EXTENSIONS = {"ndjson": "jsonl", "gzip": "jsonl.gz"}
+
+# Message id paired with an existing conversation's newest timestamp: skips every message at that time
+EXISTING = sys.maxsize
+
+# Resume position: after message (timestamp, id) of conversation id; no timestamp = from its start
+Position = Tuple[int, Optional[datetime], int]
+
+def encode_export_cursor(conversation_id: int, moment: Optional[datetime], message_id: int) -> str:
+    raw = json.dumps([conversation_id, moment.isoformat() if moment else None, message_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_export_cursor(cursor: str) -> Position:
+    """Decode a cursor produced by encode_export_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        conversation_id, moment, message_id = json.loads(base64.urlsafe_b64decode(padded))
+        return int(conversation_id), datetime.fromisoformat(moment) if moment else None, int(message_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+def export_query(user_id: int, position: Optional[Position]):
+    """Every conversation of a user joined with its messages, in export order"""
+    query = (
+        select(Conversation.id.label("conversation_id"), Conversation.session_id, Conversation.created_at,
+               Conversation.last_activity, Conversation.archived_at,
+               Message.id.label("message_id"), Message.role, Message.content, Message.timestamp)
+        .select_from(Conversation)
+        .outerjoin(Message, Message.conversation_id == Conversation.id)
+        .where(Conversation.user_id == user_id)
+    )
+    if position is not None:
+        conversation_id, moment, message_id = position
+        if moment is None:
+            query = query.where(Conversation.id >= conversation_id)
+        else:
+            query = query.where(or_(
+                Conversation.id > conversation_id,
+                and_(Conversation.id == conversation_id, or_(
+                    Message.id.is_(None),
+                    Message.timestamp > moment,
+                    and_(Message.timestamp == moment, Message.id > message_id),
+                )),
+            ))
+    return query.order_by(Conversation.id, Message.timestamp, Message.id)
+
+def message_record(session_id: str, message_id: int, role: str, content: str, moment: datetime) -> dict:
+    return {"type": "message", "session_id": session_id, "id": message_id, "role": role,
+            "content": content, "timestamp": moment.isoformat()}
+
+async def export_records(user_id: int, cursor: Optional[str] = None) -> AsyncIterator[dict]:
+    """Yield export records for a user's conversations, starting after cursor
+
+    Archived messages are decoded one conversation at a time (through a
+    second session, since the first is busy streaming) and merged into
+    the conversation's live messages by (timestamp, id).
+    """
+    position = decode_export_cursor(cursor) if cursor else None
+    conversations = messages = since_checkpoint = 0
+    current, session_id, archived = None, None, deque()
+
+    def emit(message_id: int, role: str, content: str, moment: datetime) -> List[dict]:
+        """A message record, followed by a checkpoint every EXPORT_CHECKPOINT_RECORDS messages"""
+        nonlocal messages, since_checkpoint
+        messages += 1
+        since_checkpoint += 1
+        records = [message_record(session_id, message_id, role, content, moment)]
+        if since_checkpoint >= EXPORT_CHECKPOINT_RECORDS:
+            since_checkpoint = 0
+            records.append({"type": "checkpoint", "cursor": encode_export_cursor(current, moment, message_id)})
+        return records
+
+    async with AsyncSessionLocal() as db, AsyncSessionLocal() as archives_db:
+        result = await db.stream(export_query(user_id, position).execution_options(yield_per=EXPORT_BATCH_ROWS))
+        async for row in result:
+            if row.conversation_id != current:
+                while archived:
+                    for record in emit(**archived.popleft()):
+                        yield record
+                current, session_id = row.conversation_id, row.session_id
+                conversations += 1
+                yield {"type": "conversation", "session_id": session_id, "created_at": row.created_at.isoformat(),
+                       "last_activity": row.last_activity.isoformat()}
+                if row.archived_at is not None:
+                    entries = (await load_archives(archives_db, [current])).get(current, [])
+                    if position is not None and position[0] == current and position[1] is not None:
+                        entries = [m for m in entries if (m["timestamp"], m["id"]) > position[1:]]
+                    archived = deque({"message_id": m["id"], "role": m["role"], "content": m["content"],
+                                      "moment": m["timestamp"]} for m in entries)
+
+            if row.message_id is not None:
+                while archived and (archived[0]["moment"], archived[0]["message_id"]) < (row.timestamp, row.message_id):
+                    for record in emit(**archived.popleft()):
+                        yield record
+                for record in emit(row.message_id, row.role, row.content, row.timestamp):
+                    yield record
+
+        while archived:
+            for record in emit(**archived.popleft()):
+                yield record
+    yield {"type": "end", "conversations": conversations, "messages": messages}
+
+async def export_chunks(user_id: int, cursor: Optional[str] = None, format: str = "ndjson") -> AsyncIterator[bytes]:
+    """export_records() serialized as JSON Lines, in chunks of about EXPORT_CHUNK_BYTES, gzipped if asked"""
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31) if format == "gzip" else None
+    buffer, size = [], 0
+    async for record in export_records(user_id, cursor):
+        line = dumps(record) + b"\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            chunk = b"".join(buffer)
+            buffer, size = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = b"".join(buffer)
+    chunk = compressor.compress(chunk) + compressor.flush() if compressor else chunk
+    if chunk:
+        yield chunk
+
+def read_records(lines: Iterable[bytes]) -> Iterable[dict]:
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+def copy_messages(connection, rows: List[Dict]):
+    """Insert message rows with COPY (Postgres) or one multi-row INSERT"""
+    if connection.dialect.name != "postgresql":
+        connection.execute(insert(Message), rows)
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow((row["conversation_id"], row["role"], row["content"], row["timestamp"].isoformat()))
+    buffer.seek(0)
+    with connection.connection.cursor() as cursor:
+        cursor.copy_expert("COPY messages (conversation_id, role, content, timestamp) FROM STDIN WITH (FORMAT csv)", buffer)
+
+def latest_message(connection, conversation_id: int) -> Tuple[datetime, int]:
+    """Import position of a conversation that already exists: after its newest message, live or archived"""
+    latest = connection.scalar(select(func.max(Message.timestamp)).where(Message.conversation_id == conversation_id))
+    archived = connection.scalar(select(ConversationArchive.last_timestamp)
+                                 .where(ConversationArchive.conversation_id == conversation_id))
+    return max(filter(None, (latest, archived)), default=datetime.min), EXISTING
+
+def import_records(records: Iterable[dict], user_id: int, batch_rows: int = IMPORT_BATCH_ROWS) -> dict:
+    """Append exported conversations to a user; returns counts"""
+    summary = {"conversations": 0, "renamed_conversations": 0, "messages": 0, "skipped_messages": 0}
+    conversation_ids: Dict[str, int] = {}     # exported session_id -> conversation id here
+    newest: Dict[str, Tuple[datetime, int]] = {}  # newest message (timestamp, exported id) per conversation
+    partitions_from: Optional[datetime] = None
+    rows: List[Dict] = []
+
+    def flush(connection):
+        nonlocal partitions_from, rows
+        if not rows:
+            return
+        if connection.dialect.name == "postgresql":
+            from partitions import ensure_partitions
+            oldest = month_start(min(row["timestamp"] for row in rows))
+            if partitions_from is None or oldest < partitions_from:
+                ensure_partitions(connection, oldest)
+                partitions_from = oldest
+        copy_messages(connection, rows)
+        summary["messages"] += len(rows)
+        rows = []
+
+    with engine.connect() as connection:
+        for record in records:
+            kind = record.get("type")
+            if kind == "conversation":
+                session_id = record["session_id"]
+                if session_id in conversation_ids:
+                    continue  # repeated by a resumed export
+                existing = connection.execute(
+                    select(Conversation.id, Conversation.user_id).where(Conversation.session_id == session_id)
+                ).first()
+                if existing is not None and existing.user_id == user_id:
+                    conversation_ids[session_id] = existing.id
+                    newest[session_id] = latest_message(connection, existing.id)
+                    continue
+                new_session_id = session_id
+                if existing is not None:
+                    # Taken by another user: derive a new id, the same on every import of this file
+                    new_session_id = hashlib.sha256(f"{user_id}:{session_id}".encode()).hexdigest()[:16]
+                    summary["renamed_conversations"] += 1
+                    existing = connection.execute(
+                        select(Conversation.id, Conversation.user_id).where(Conversation.session_id == new_session_id)
+                    ).first()
+                if existing is not None:
+                    conversation_ids[session_id] = existing.id
+                    newest[session_id] = latest_message(connection, existing.id)
+                    continue
+                conversation_ids[session_id] = connection.execute(insert(Conversation).values(
+                    session_id=new_session_id, user_id=user_id,
+                    created_at=datetime.fromisoformat(record["created_at"]),
+                    last_activity=datetime.fromisoformat(record["last_activity"]),
+                ).returning(Conversation.id)).scalar_one()
+                summary["conversations"] += 1
+            elif kind == "message":
+                session_id = record["session_id"]
+                moment = datetime.fromisoformat(record["timestamp"])
+                key = (moment, record["id"])
+                if session_id not in conversation_ids or (session_id in newest and key <= newest[session_id]):
+                    summary["skipped_messages"] += 1
+                    continue
+                newest[session_id] = key
+                rows.append({"conversation_id": conversation_ids[session_id], "role": record["role"],
+                             "content": record["content"], "timestamp": moment})
+                if len(rows) >= batch_rows:
+                    flush(connection)
+                    connection.commit()
+        flush(connection)
+        # Imported messages may be newer than an existing conversation's last activity
+        for session_id, conversation_id in conversation_ids.items():
+            if session_id in newest and newest[session_id][1] != EXISTING:
+                connection.execute(update(Conversation).where(
+                    Conversation.id == conversation_id, Conversation.last_activity < newest[session_id][0]
+                ).values(last_activity=newest[session_id][0]))
+        connection.commit()
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write a user's conversations as JSON Lines")
+    export_parser.add_argument("--username", required=True)
+    export_parser.add_argument("--output", help="file to write (gzip if it ends in .gz); default stdout")
+    export_parser.add_argument("--cursor", help="resume after this checkpoint cursor")
+    import_parser = commands.add_parser("import", help="append an export to a user's conversations")
+    import_parser.add_argument("--username", required=True)
+    import_parser.add_argument("input", help="export file (.jsonl or .jsonl.gz); - for stdin")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        async def run():
+            try:
+                async with AsyncSessionLocal() as db:
+                    user_id = await db.scalar(select(User.id).where(User.username == args.username))
+                if user_id is None:
+                    sys.exit(f"❌ No user named {args.username}")
+                compressed = bool(args.output and args.output.endswith(".gz"))
+                output = open(args.output, "wb") if args.output else sys.stdout.buffer
+                try:
+                    async for chunk in export_chunks(user_id, args.cursor, "gzip" if compressed else "ndjson"):
+                        output.write(chunk)
+                finally:
+                    if output is not sys.stdout.buffer:
+                        output.close()
+            finally:
+                await async_engine.dispose()
+        asyncio.run(run())
+        return
+
+    with engine.connect() as connection:
+        user_id = connection.scalar(select(User.id).where(User.username == args.username))
+    if user_id is None:
+        sys.exit(f"❌ No user named {args.username}")
+    if args.input == "-":
+        lines = sys.stdin.buffer
+    else:
+        lines = gzip.open(args.input, "rb") if args.input.endswith(".gz") else open(args.input, "rb")
+    with lines:
+        summary = import_records(read_records(lines), user_id)
+    print(f"📥 Imported {summary['messages']} messages in {summary['conversations']} new conversations "
+          f"({summary['renamed_conversations']} renamed, {summary['skipped_messages']} messages already present)")
+
+if __name__ == "__main__":
+    main()
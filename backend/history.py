@@ -0,0 +1,133 @@
+"""
+Chat history queries: keyset-paginated conversations and messages
+"""
+
+import base64
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import Conversation, Message
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+def encode_cursor(moment: datetime, row_id: int) -> str:
+    """Encode a (timestamp, id) keyset position as an opaque cursor"""
+    raw = json.dumps([moment.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        moment, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(moment), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+async def list_conversations(db: AsyncSession, user_id: int, limit: int, cursor: Optional[str] = None):
+    """Return one page of a user's conversations, most recently active first
+
+    Uses the (user_id, last_activity) index and keyset pagination, so page
+    cost does not depend on how deep the client has paged.
+    Returns (conversations, next_cursor).
+    """
+    query = select(Conversation).where(Conversation.user_id == user_id)
+    if cursor:
+        last_activity, conversation_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Conversation.last_activity < last_activity,
+            and_(Conversation.last_activity == last_activity, Conversation.id < conversation_id)
+        ))
+    query = query.order_by(Conversation.last_activity.desc(), Conversation.id.desc()).limit(limit + 1)
+
+    result = await db.execute(query)
+    conversations = list(result.scalars().all())
+
+    next_cursor = None
+    if len(conversations) > limit:
+        conversations = conversations[:limit]
+        last = conversations[-1]
+        next_cursor = encode_cursor(last.last_activity, last.id)
+    return conversations, next_cursor
+
+async def load_messages_for(db: AsyncSession, conversation_ids: List[int]) -> Dict[int, List[Dict[str, str]]]:
+    """Load all messages of several conversations in a single query"""
+    if not conversation_ids:
+        return {}
+    result = await db.execute(
+        select(Message.conversation_id, Message.role, Message.content)
+        .where(Message.conversation_id.in_(conversation_ids))
+        .order_by(Message.conversation_id, Message.timestamp, Message.id)
+    )
+    messages = defaultdict(list)
+    for conversation_id, role, content in result.all():
+        messages[conversation_id].append({"role": role, "content": content})
+    return messages
+
+async def load_summaries_for(db: AsyncSession, conversation_ids: List[int]) -> Dict[int, Tuple[int, Optional[Dict[str, str]]]]:
+    """Load the message count and last message of several conversations in a single query"""
+    if not conversation_ids:
+        return {}
+    ranked = (
+        select(
+            Message.conversation_id,
+            Message.role,
+            Message.content,
+            func.row_number().over(
+                partition_by=Message.conversation_id,
+                order_by=(Message.timestamp.desc(), Message.id.desc())
+            ).label("position"),
+            func.count().over(partition_by=Message.conversation_id).label("message_count"),
+        )
+        .where(Message.conversation_id.in_(conversation_ids))
+        .subquery()
+    )
+    result = await db.execute(
+        select(ranked.c.conversation_id, ranked.c.role, ranked.c.content, ranked.c.message_count)
+        .where(ranked.c.position == 1)
+    )
+    return {
+        conversation_id: (message_count, {"role": role, "content": content})
+        for conversation_id, role, content, message_count in result.all()
+    }
+
+async def load_message_page(db: AsyncSession, conversation_id: int, limit: int, before: Optional[str] = None):
+    """Return one page of a conversation's messages, oldest first
+
+    The first page holds the newest `limit` messages; next_cursor pages
+    towards older messages. Returns (messages, next_cursor).
+    """
+    query = select(Message.id, Message.role, Message.content, Message.timestamp).where(
+        Message.conversation_id == conversation_id
+    )
+    if before:
+        timestamp, message_id = decode_cursor(before)
+        query = query.where(or_(
+            Message.timestamp < timestamp,
+            and_(Message.timestamp == timestamp, Message.id < message_id)
+        ))
+    query = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit + 1)
+
+    result = await db.execute(query)
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        oldest = rows[-1]
+        next_cursor = encode_cursor(oldest.timestamp, oldest.id)
+    messages = [{"role": row.role, "content": row.content} for row in reversed(rows)]
+    return messages, next_cursor
+
+async def count_messages(db: AsyncSession, conversation_id: int) -> int:
+    """Count the messages in a conversation"""
+    result = await db.execute(
+        select(func.count()).select_from(Message).where(Message.conversation_id == conversation_id)
+    )
+    return result.scalar_one()
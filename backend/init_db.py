@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Database initialization script
-Run this to create all database tables
+Run this to create all database tables, and before starting the server
+after an upgrade: the app itself no longer migrates on import
 """
 
 import os
@@ -26,9 +27,12 @@ def init_database():
         
         # Test database connection
         with engine.connect() as connection:
-            result = connection.execute(text("SELECT version();"))
-            version = result.fetchone()[0]
-            print(f"📊 Connected to PostgreSQL: {version}")
+            if connection.dialect.name == "sqlite":
+                version = connection.execute(text("SELECT sqlite_version();")).scalar()
+                print(f"📊 Connected to SQLite: {version}")
+            else:
+                version = connection.execute(text("SELECT version();")).scalar()
+                print(f"📊 Connected to PostgreSQL: {version}")
             
     except Exception as e:
         print(f"❌ Error creating database tables: {e}")
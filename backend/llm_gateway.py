@@ -0,0 +1,423 @@
+"""
+Gateway in front of the Groq API
+
+Wraps AsyncGroq with:
+- one shared keep-alive connection pool (HTTP/2 when the h2 package is installed)
+- a deadline per request covering every retry
+- jittered exponential backoff retries that honor Retry-After
+- optional hedging: a second request is sent if the first is slower than
+  the recent p95 latency, and the first answer wins
+- a circuit breaker per model that fails fast while upstream is down
+- fallback to the next configured model
+- usage hooks that see the prompt and completion tokens of every answer
+  (of the winning attempt only when hedged)
+"""
+
+import asyncio
+import email.utils
+import os
+import random
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+if TYPE_CHECKING:
+    import groq  # imported on first use; the SDK adds ~60 ms to every worker's startup
+
+from metrics import record_completion
+
+# Connection pool
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "auto")  # "auto" uses HTTP/2 when h2 is installed
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+
+# Deadline for a whole completion, retries and fallbacks included; for
+# streams it bounds the wait for the first chunk and each gap after it
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+
+# Retries
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.25"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "4"))
+
+# Hedging (completions only; a stream cannot be swapped once it started)
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "200"))
+
+# Circuit breaker
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+class LLMUnavailable(Exception):
+    """No configured model could answer before the deadline"""
+
+class CircuitOpen(LLMUnavailable):
+    """Every configured model's circuit breaker is open"""
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open probe -> closed"""
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURE_THRESHOLD, reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a request may go upstream now (half-open lets a single probe through)"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release_probe(self):
+        """The probe ended without an outcome (cancelled, or refused as non-retryable); let the next request probe"""
+        self._probing = False
+
+class LatencyTracker:
+    """Recent successful call latencies, for the hedging delay"""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if len(self._samples) < 20:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+def is_retryable(error: BaseException) -> bool:
+    import groq
+
+    if isinstance(error, (groq.APITimeoutError, groq.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, groq.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS
+    return False
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Delay requested by the server through retry-after-ms or Retry-After (seconds or HTTP date)"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def http2_available() -> bool:
+    if LLM_HTTP2 != "auto":
+        return LLM_HTTP2.lower() == "true"
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+# Called with (messages, prompt_tokens, completion_tokens) after each upstream call;
+# prompt_tokens is None when a stream did not report usage
+UsageHook = Callable[[List[Dict[str, str]], Optional[int], int], None]
+
+class LLMGateway:
+    """Resilient chat completions over a fallback chain of models"""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        hedge: bool = LLM_HEDGE_ENABLED,
+        breaker_threshold: int = LLM_BREAKER_FAILURE_THRESHOLD,
+        breaker_reset: float = LLM_BREAKER_RESET_SECONDS,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedge = hedge
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latency = LatencyTracker()
+        self._client: Optional["groq.AsyncGroq"] = None
+        self._usage_hooks: List[UsageHook] = []
+        self.counters = {"requests": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+                         "fallbacks": 0, "breaker_rejections": 0, "failures": 0}
+
+    @property
+    def client(self) -> "groq.AsyncGroq":
+        """AsyncGroq on one keep-alive pool; the SDK's own retries are off because the gateway retries"""
+        if self._client is None:
+            import groq
+
+            http_client = httpx.AsyncClient(
+                http2=http2_available(),
+                limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                    max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS),
+                timeout=httpx.Timeout(self.timeout, connect=LLM_CONNECT_TIMEOUT),
+            )
+            self._client = groq.AsyncGroq(
+                api_key=self.api_key or os.getenv("GROQ_API_KEY"),
+                base_url=self.base_url,
+                max_retries=0,
+                http_client=http_client,
+            )
+        return self._client
+
+    def add_usage_hook(self, hook: UsageHook):
+        """Report the tokens of every upstream call to hook (idempotent)"""
+        if hook not in self._usage_hooks:
+            self._usage_hooks.append(hook)
+
+    def _report_usage(self, messages: List[Dict[str, str]], prompt_tokens: Optional[int], completion_tokens: int):
+        for hook in self._usage_hooks:
+            hook(messages, prompt_tokens, completion_tokens)
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self.breakers:
+            self.breakers[model] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+        return self.breakers[model]
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        """Full-jitter exponential backoff, or the server's Retry-After if it asked for longer"""
+        delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+        requested = retry_after_seconds(error)
+        return max(delay, requested) if requested is not None else delay
+
+    def hedge_delay(self) -> float:
+        p = self.latency.percentile(LLM_HEDGE_PERCENTILE)
+        return max(LLM_HEDGE_MIN_DELAY_MS / 1000, p or 0.0)
+
+    async def complete(self, models: Sequence[str], messages: List[Dict[str, str]], **params) -> str:
+        """Return the text of the first successful completion along the model chain"""
+        self.counters["requests"] += 1
+        deadline = time.monotonic() + self.timeout
+        return await self._over_models(models, deadline, lambda model: self._complete_with_retries(model, messages, params, deadline))
+
+    async def stream(self, models: Sequence[str], messages: List[Dict[str, str]], **params) -> AsyncIterator[str]:
+        """Yield content deltas; retries and fallbacks happen only before the first delta"""
+        self.counters["requests"] += 1
+        deadline = time.monotonic() + self.timeout
+        chunks = await self._over_models(models, deadline, lambda model: self._open_stream_with_retries(model, messages, params, deadline))
+        try:
+            async for delta in chunks:
+                yield delta
+        finally:
+            # Closing this generator early must close the upstream stream now, not at garbage collection
+            await chunks.aclose()
+
+    async def _over_models(self, models: Sequence[str], deadline: float, call):
+        last_error: Optional[BaseException] = None
+        tried = False
+        for model in models:
+            breaker = self.breaker(model)
+            probe = breaker.state == "half_open"
+            if not breaker.allow():
+                self.counters["breaker_rejections"] += 1
+                continue
+            if tried:
+                self.counters["fallbacks"] += 1
+            tried = True
+            try:
+                return await call(model)
+            except LLMUnavailable as e:
+                last_error = e
+            finally:
+                # A cancelled probe (client gone, hedge or single-flight waiter cancelled)
+                # records no outcome and would hold the half-open breaker forever
+                if probe:
+                    breaker.release_probe()
+            if time.monotonic() >= deadline:
+                break
+        self.counters["failures"] += 1
+        if not tried:
+            raise CircuitOpen("Circuit open for every configured model")
+        raise LLMUnavailable(f"No model answered: {last_error}") from last_error
+
+    async def _attempt(self, model: str, messages, params, deadline: float) -> Tuple[str, Any]:
+        """One upstream call bounded by the remaining deadline; returns the text and the reported usage"""
+        self.counters["attempts"] += 1
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise asyncio.TimeoutError("Deadline exceeded")
+        start = time.monotonic()
+        async with asyncio.timeout(remaining):
+            response = await self.client.chat.completions.create(model=model, messages=messages, timeout=remaining, **params)
+        elapsed = time.monotonic() - start
+        self.latency.add(elapsed)
+        if response.usage is not None:
+            record_completion(model, response.usage.completion_tokens, elapsed)
+        return response.choices[0].message.content or "", response.usage
+
+    async def _hedged_attempt(self, model: str, messages, params, deadline: float) -> Tuple[str, Any]:
+        """Send a second copy if the first is slower than the recent p95; first success wins"""
+        first = asyncio.ensure_future(self._attempt(model, messages, params, deadline))
+        pending = {first}
+        error: Optional[BaseException] = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_delay())
+            if done:
+                return first.result()
+
+            self.counters["hedges"] += 1
+            second = asyncio.ensure_future(self._attempt(model, messages, params, deadline))
+            pending.add(second)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _complete_with_retries(self, model: str, messages, params, deadline: float) -> str:
+        breaker = self.breaker(model)
+        attempt = 0
+        while True:
+            try:
+                if self.hedge:
+                    text, usage = await self._hedged_attempt(model, messages, params, deadline)
+                else:
+                    text, usage = await self._attempt(model, messages, params, deadline)
+                breaker.record_success()
+                # Only the answer used is reported; a hedge that lost is not billed
+                if usage is not None:
+                    self._report_usage(messages, usage.prompt_tokens, usage.completion_tokens)
+                return text
+            except Exception as e:
+                if not is_retryable(e):
+                    # Refused this model/request, which says nothing about its health: leave the breaker
+                    # as it was (a half-open probe must not close it) and try the next model
+                    breaker.release_probe()
+                    raise LLMUnavailable(f"{model}: {e!r}") from e
+                breaker.record_failure()
+                attempt = await self._before_retry(model, attempt, e, deadline)
+
+    async def _open_stream_with_retries(self, model: str, messages, params, deadline: float) -> AsyncIterator[str]:
+        """Open a stream and wait for its first chunk, retrying failures up to that point"""
+        breaker = self.breaker(model)
+        attempt = 0
+        while True:
+            self.counters["attempts"] += 1
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError("Deadline exceeded")
+                start = time.monotonic()
+                async with asyncio.timeout_at(asyncio.get_running_loop().time() + remaining):
+                    stream = await self.client.chat.completions.create(
+                        model=model, messages=messages, stream=True, timeout=remaining, **params
+                    )
+                    chunks = stream.__aiter__()
+                    first = await chunks.__anext__()
+                self.latency.add(time.monotonic() - start)
+                breaker.record_success()
+                return self._follow_stream(model, messages, start, first, chunks)
+            except StopAsyncIteration:
+                breaker.record_success()
+                return self._follow_stream(model, messages, start, None, None)
+            except Exception as e:
+                if not is_retryable(e):
+                    breaker.release_probe()
+                    raise LLMUnavailable(f"{model}: {e!r}") from e
+                breaker.record_failure()
+                attempt = await self._before_retry(model, attempt, e, deadline)
+
+    async def _follow_stream(self, model: str, messages, start: float, first, chunks) -> AsyncIterator[str]:
+        if first is None:
+            return
+        chunk = first
+        received = 0  # each content chunk is one token
+        usage = None  # Groq reports it on the last chunk
+        try:
+            while True:
+                if chunk.choices:
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        received += 1
+                        yield content
+                usage = chunk.usage or (chunk.x_groq.usage if chunk.x_groq is not None else None) or usage
+                try:
+                    async with asyncio.timeout(self.timeout):
+                        chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    record_completion(model, received, time.monotonic() - start)
+                    return
+        finally:
+            # Also when the consumer stops early: what was generated so far is billed
+            if usage is not None:
+                self._report_usage(messages, usage.prompt_tokens, usage.completion_tokens)
+            else:
+                self._report_usage(messages, None, received)
+
+    async def _before_retry(self, model: str, attempt: int, error: BaseException, deadline: float) -> int:
+        """Sleep before the next attempt, or raise LLMUnavailable to move on to the next model"""
+        if attempt >= self.max_retries or self.breaker(model).state != "closed":
+            raise LLMUnavailable(f"{model}: {error!r}") from error
+        delay = self.backoff(attempt, error)
+        if time.monotonic() + delay >= deadline:
+            raise LLMUnavailable(f"{model}: retry would pass the deadline after {error!r}") from error
+        self.counters["retries"] += 1
+        await asyncio.sleep(delay)
+        return attempt + 1
+
+    def snapshot(self) -> dict:
+        return {
+            **self.counters,
+            "hedge_delay_seconds": self.hedge_delay() if self.hedge else None,
+            "breakers": {model: breaker.state for model, breaker in self.breakers.items()},
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+llm_gateway = LLMGateway()
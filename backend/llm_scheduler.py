@@ -0,0 +1,212 @@
+"""
+Micro-batching scheduler for upstream LLM calls
+
+Requests wait in per-lane queues (interactive ahead of background work)
+and are released in small batches: the dispatcher collects arrivals for
+a few milliseconds, then starts as many as the concurrency limit allows.
+Within a lane users are served round-robin, so one user flooding the
+queue cannot starve everyone else. When a lane or the user's share of it
+is full, or the estimated wait is too long, new requests are refused with SchedulerOverloaded so
+the API can answer 503 + Retry-After instead of piling up.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+from metrics import Histogram
+
+LLM_SCHEDULER_ENABLED = os.getenv("LLM_SCHEDULER_ENABLED", "false").lower() == "true"
+LLM_SCHEDULER_WINDOW_MS = float(os.getenv("LLM_SCHEDULER_WINDOW_MS", "5"))
+LLM_SCHEDULER_CONCURRENCY = int(os.getenv("LLM_SCHEDULER_CONCURRENCY", "32"))
+LLM_SCHEDULER_MAX_WAIT_SECONDS = float(os.getenv("LLM_SCHEDULER_MAX_WAIT_SECONDS", "10"))
+LLM_SCHEDULER_INTERACTIVE_QUEUE = int(os.getenv("LLM_SCHEDULER_INTERACTIVE_QUEUE", "256"))
+LLM_SCHEDULER_BACKGROUND_QUEUE = int(os.getenv("LLM_SCHEDULER_BACKGROUND_QUEUE", "64"))
+LLM_SCHEDULER_USER_QUEUE = int(os.getenv("LLM_SCHEDULER_USER_QUEUE", "16"))  # queued requests per user and lane
+
+# Lanes in priority order
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Interactive requests dispatched for every background one when both wait
+INTERACTIVE_WEIGHT = 4
+
+WAIT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEPTH_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500)
+
+class SchedulerOverloaded(Exception):
+    """Raised when a request is refused by admission control"""
+
+    def __init__(self, lane: str, retry_after: float):
+        super().__init__(f"LLM {lane} queue is full")
+        self.lane = lane
+        self.retry_after = retry_after
+
+@dataclass
+class _Ticket:
+    user: str
+    lane: str
+    granted: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+class LLMScheduler:
+    """Fair, prioritized, bounded-concurrency gate in front of the LLM gateway"""
+
+    def __init__(
+        self,
+        concurrency: int = LLM_SCHEDULER_CONCURRENCY,
+        window: float = LLM_SCHEDULER_WINDOW_MS / 1000,
+        max_wait: float = LLM_SCHEDULER_MAX_WAIT_SECONDS,
+        queue_limits: Optional[Dict[str, int]] = None,
+        user_limit: int = LLM_SCHEDULER_USER_QUEUE,
+    ):
+        self.concurrency = concurrency
+        self.user_limit = user_limit
+        self.window = window
+        self.max_wait = max_wait
+        self.queue_limits = queue_limits or {
+            INTERACTIVE: LLM_SCHEDULER_INTERACTIVE_QUEUE,
+            BACKGROUND: LLM_SCHEDULER_BACKGROUND_QUEUE,
+        }
+        # lane -> user -> tickets, users kept in round-robin order
+        self._lanes: Dict[str, "OrderedDict[str, Deque[_Ticket]]"] = {lane: OrderedDict() for lane in self.queue_limits}
+        self._depth = {lane: 0 for lane in self.queue_limits}
+        self._interactive_streak = 0
+        self.running = 0
+        self._service_seconds: Optional[float] = None  # moving average of how long a slot is held
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds = {lane: Histogram(WAIT_BUCKETS) for lane in self.queue_limits}
+        self.queue_depth = Histogram(DEPTH_BUCKETS)
+
+    def queued(self) -> int:
+        return sum(self._depth.values())
+
+    def estimated_wait(self, lane: str = INTERACTIVE) -> float:
+        """Rough wait for a new request: work queued ahead of it divided across the slots"""
+        if self._service_seconds is None:
+            return 0.0
+        ahead = self._depth[INTERACTIVE] if lane == INTERACTIVE else self.queued()
+        return ahead * self._service_seconds / self.concurrency
+
+    def admit(self, lane: str = INTERACTIVE, user: Optional[str] = None):
+        """Raise SchedulerOverloaded if a new request in this lane should be refused"""
+        estimate = self.estimated_wait(lane)
+        user_queued = len(self._lanes[lane].get(user, ())) if user is not None else 0
+        if (self._depth[lane] >= self.queue_limits[lane]
+                or user_queued >= self.user_limit
+                or (self.running >= self.concurrency and estimate > self.max_wait)):
+            self.rejected += 1
+            raise SchedulerOverloaded(lane, max(1.0, math.ceil(estimate)))
+
+    @asynccontextmanager
+    async def slot(self, user: str, lane: str = INTERACTIVE):
+        """Wait for a turn to call upstream; the slot is held until the block exits"""
+        self.admit(lane, user)
+        self.admitted += 1
+        ticket = _Ticket(user=user, lane=lane, granted=asyncio.get_running_loop().create_future())
+        self._lanes[lane].setdefault(user, deque()).append(ticket)
+        self._depth[lane] += 1
+        self.queue_depth.observe(self.queued())
+        self._start()
+        self._wakeup.set()
+
+        try:
+            await ticket.granted
+        except asyncio.CancelledError:
+            # Gave up while queued; the dispatcher skips cancelled tickets, or
+            # the slot was granted in the same tick and must be handed back
+            if ticket.granted.done() and not ticket.granted.cancelled():
+                self._release(0.0)
+            raise
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    async def run(self, user: str, fn: Callable[[], Awaitable], lane: str = INTERACTIVE):
+        """Run fn() once a slot is free"""
+        async with self.slot(user, lane):
+            return await fn()
+
+    def _release(self, held_seconds: float):
+        self.running -= 1
+        if held_seconds:
+            if self._service_seconds is None:
+                self._service_seconds = held_seconds
+            else:
+                self._service_seconds += 0.1 * (held_seconds - self._service_seconds)
+        self._wakeup.set()
+
+    def _start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        idle = True
+        while True:
+            if not self.queued() or self.running >= self.concurrency:
+                idle = idle or not self.queued()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # After an idle spell, let a batch of arrivals accumulate before
+            # choosing who goes first; under load the queue already is the batch
+            if idle and self.window > 0:
+                await asyncio.sleep(self.window)
+            idle = False
+
+            while self.running < self.concurrency:
+                ticket = self._next_ticket()
+                if ticket is None:
+                    break
+                if ticket.granted.cancelled():
+                    continue
+                self.running += 1
+                self.wait_seconds[ticket.lane].observe(time.monotonic() - ticket.enqueued_at)
+                ticket.granted.set_result(None)
+
+    def _next_ticket(self) -> Optional[_Ticket]:
+        interactive, background = self._lanes[INTERACTIVE], self._lanes[BACKGROUND]
+        if interactive and (not background or self._interactive_streak < INTERACTIVE_WEIGHT):
+            self._interactive_streak += 1
+            return self._pop(INTERACTIVE)
+        if background:
+            self._interactive_streak = 0
+            return self._pop(BACKGROUND)
+        return None
+
+    def _pop(self, lane: str) -> _Ticket:
+        """Oldest ticket of the next user in round-robin order"""
+        users = self._lanes[lane]
+        user, tickets = next(iter(users.items()))
+        ticket = tickets.popleft()
+        if tickets:
+            users.move_to_end(user)
+        else:
+            del users[user]
+        self._depth[lane] -= 1
+        return ticket
+
+    def snapshot(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": dict(self._depth),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "estimated_wait_seconds": self.estimated_wait(INTERACTIVE),
+            "queue_depth": self.queue_depth.snapshot(),
+            "wait_seconds": {lane: histogram.snapshot() for lane, histogram in self.wait_seconds.items()},
+        }
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,252 @@
+"""
+Request instrumentation: Prometheus-style metrics and per-stage spans
+
+MetricsMiddleware times every HTTP request by route template and keeps a
+per-request RequestStats in a context variable. span("stage") blocks
+inside the request add their time to a per-stage histogram, and every SQL
+statement run while serving the request is counted. GET /metrics renders
+everything in the Prometheus text format. With OTEL_ENABLED=true, requests
+and spans are also exported to an OpenTelemetry collector.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# OpenTelemetry export (needs opentelemetry-sdk and opentelemetry-exporter-otlp)
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() == "true"
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "chatbot-api")
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+TOKENS_PER_SECOND_BUCKETS = (5, 10, 25, 50, 100, 200, 400, 800, 1600)
+TOKENS_SAVED_BUCKETS = (0, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus style)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                return
+        self.counts[-1] += 1
+
+    def snapshot(self) -> dict:
+        cumulative, running = {}, 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            running += count
+            cumulative[str(bound)] = running
+        return {"count": self.count, "sum": self.sum, "buckets": cumulative}
+
+class HistogramFamily:
+    """Histograms sharing a name, one per combination of label values"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...], buckets):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.children: Dict[Tuple[str, ...], Histogram] = {}
+
+    def labels(self, *values: str) -> Histogram:
+        histogram = self.children.get(values)
+        if histogram is None:
+            histogram = self.children[values] = Histogram(self.buckets)
+        return histogram
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for values, histogram in self.children.items():
+            labels = format_labels(zip(self.labelnames, values))
+            running = 0
+            for bound, count in zip((*self.buckets, "+Inf"), histogram.counts):
+                running += count
+                yield f"{self.name}_bucket{format_labels(zip(self.labelnames, values), le=bound)} {running}"
+            yield f"{self.name}_sum{labels} {histogram.sum}"
+            yield f"{self.name}_count{labels} {histogram.count}"
+
+class CounterFamily:
+    """Monotonic counters, one per combination of label values"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *values: str, amount: float = 1.0):
+        self.values[values] = self.values.get(values, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for values, total in self.values.items():
+            yield f"{self.name}{format_labels(zip(self.labelnames, values))} {total}"
+
+def format_labels(pairs, **extra) -> str:
+    items = [*pairs, *extra.items()]
+    if not items:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in items)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + "}"
+
+# Metric families
+http_request_seconds = HistogramFamily(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"), LATENCY_BUCKETS)
+stage_seconds = HistogramFamily(
+    "request_stage_duration_seconds", "Time spent in each stage of the request path", ("stage",), LATENCY_BUCKETS)
+db_queries_per_request = HistogramFamily(
+    "db_queries_per_request", "SQL statements executed per HTTP request", ("route",), QUERY_COUNT_BUCKETS)
+llm_tokens_per_second = HistogramFamily(
+    "llm_completion_tokens_per_second", "Upstream completion throughput per call", ("model",), TOKENS_PER_SECOND_BUCKETS)
+llm_tokens = CounterFamily(
+    "llm_completion_tokens_total", "Completion tokens received from upstream", ("model",))
+compaction_tokens_saved = HistogramFamily(
+    "conversation_compaction_tokens_saved", "Prompt tokens saved by the summary, per compacted conversation", (), TOKENS_SAVED_BUCKETS)
+
+FAMILIES = [http_request_seconds, stage_seconds, db_queries_per_request, llm_tokens_per_second, llm_tokens, compaction_tokens_saved]
+
+# Gauges read from other subsystems at scrape time: fn() -> [(name, help, value)]
+_collectors: List[Callable[[], Iterable[Tuple[str, str, float]]]] = []
+
+def add_collector(collector: Callable[[], Iterable[Tuple[str, str, float]]]):
+    """Register a gauge collector (once, however many apps are built)"""
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+def render_metrics() -> str:
+    """Every metric in the Prometheus text exposition format"""
+    lines: List[str] = []
+    for family in FAMILIES:
+        lines.extend(family.render())
+    for collector in _collectors:
+        for name, help_text, value in collector():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+@dataclass
+class RequestStats:
+    """Measurements collected while serving one request"""
+    stages: Dict[str, float] = field(default_factory=dict)
+    db_queries: int = 0
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+def current_request() -> Optional[RequestStats]:
+    return _current_request.get()
+
+_tracer = None
+
+@contextmanager
+def span(stage: str):
+    """Time a stage of the request path (also an OpenTelemetry span when enabled)"""
+    if not METRICS_ENABLED:
+        yield
+        return
+    otel_span = _tracer.start_as_current_span(stage) if _tracer is not None else None
+    if otel_span is not None:
+        otel_span.__enter__()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.labels(stage).observe(elapsed)
+        stats = _current_request.get()
+        if stats is not None:
+            stats.stages[stage] = stats.stages.get(stage, 0.0) + elapsed
+        if otel_span is not None:
+            otel_span.__exit__(None, None, None)
+
+def record_completion(model: str, tokens: int, seconds: float):
+    """Record upstream completion tokens and throughput for one call"""
+    if not METRICS_ENABLED or tokens <= 0:
+        return
+    llm_tokens.inc(model, amount=tokens)
+    if seconds > 0:
+        llm_tokens_per_second.labels(model).observe(tokens / seconds)
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_request.get()
+    if stats is not None:
+        stats.db_queries += 1
+
+def watch_queries(engine):
+    """Count SQL statements against the request being served (idempotent)"""
+    if not event.contains(engine, "before_cursor_execute", _count_query):
+        event.listen(engine, "before_cursor_execute", _count_query)
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (does not buffer streaming responses) recording per-route latency"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        otel_span = _tracer.start_as_current_span(f'{scope["method"]} request') if _tracer is not None else None
+        if otel_span is not None:
+            otel_span.__enter__()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_request_seconds.labels(scope["method"], route, str(status_code)).observe(elapsed)
+            db_queries_per_request.labels(route).observe(stats.db_queries)
+            if otel_span is not None:
+                otel_span.__exit__(None, None, None)
+            _current_request.reset(token)
+
+def configure_tracing():
+    """Export spans to an OTLP/HTTP collector if OTEL_ENABLED and the SDK is installed"""
+    global _tracer
+    if not (METRICS_ENABLED and OTEL_ENABLED):
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        print("⚠️ OTEL_ENABLED is set but opentelemetry-sdk / opentelemetry-exporter-otlp are not installed")
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=OTEL_EXPORTER_OTLP_ENDPOINT)))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("chatbot")
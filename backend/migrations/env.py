@@ -0,0 +1,58 @@
+"""
+Alembic environment: migrates the database configured by DATABASE_URL
+
+database.create_tables() runs the migrations programmatically and passes
+its own connection in config.attributes; the alembic CLI connects itself.
+"""
+
+from logging.config import fileConfig
+
+from alembic import context
+
+from database import Base, engine
+
+config = context.config
+connection = config.attributes.get("connection")
+
+# Leave the application's logging alone when called from create_tables()
+if config.config_file_name is not None and connection is None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """Keep autogenerate away from objects managed outside the models
+
+    The search index (content_tsv, messages_fts*) and the monthly
+    partitions of messages are created by raw DDL.
+    """
+    if type_ == "table" and reflected and compare_to is None:
+        return not (name.startswith("messages_") or name == "alembic_version")
+    if type_ == "column" and name == "content_tsv":
+        return False
+    return True
+
+def run_migrations_offline():
+    """Emit SQL to stdout instead of executing it (alembic upgrade --sql)"""
+    context.configure(url=engine.url.render_as_string(hide_password=False), target_metadata=target_metadata, literal_binds=True,
+                      dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    def run(connection):
+        context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object,
+                          render_as_batch=connection.dialect.name == "sqlite")
+        with context.begin_transaction():
+            context.run_migrations()
+
+    if connection is not None:
+        run(connection)
+    else:
+        with engine.connect() as new_connection:
+            run(new_connection)
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
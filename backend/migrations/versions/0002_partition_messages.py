@@ -0,0 +1,93 @@
+"""Partition messages by month on Postgres
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:01
+
+Rebuilds messages as a range-partitioned table (one partition per month
+plus a default partition) and copies the existing rows across. The
+partition key has to be part of the primary key, which becomes
+(id, timestamp); ids keep coming from the same sequence. The copy holds
+an exclusive lock on messages, so run it in a maintenance window on
+large databases. SQLite keeps the plain table.
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+
+from database import SEARCH_TEXT_CONFIG
+from partitions import ensure_partitions
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = "id, conversation_id, role, content, timestamp"
+
+
+def create_messages_table(partitioned: bool) -> None:
+    primary_key = "PRIMARY KEY (id, timestamp)" if partitioned else "PRIMARY KEY (id)"
+    partition_clause = " PARTITION BY RANGE (timestamp)" if partitioned else ""
+    op.execute(
+        "CREATE TABLE messages ("
+        "id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'), "
+        # Named explicitly: Postgres would otherwise suffix the default name while messages_old holds it,
+        # and 0006 swaps the constraint by that name
+        "conversation_id INTEGER NOT NULL "
+        "CONSTRAINT messages_conversation_id_fkey REFERENCES conversations (id), "
+        "role VARCHAR(20) NOT NULL, "
+        "content TEXT NOT NULL, "
+        "timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL, "
+        f"content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('{SEARCH_TEXT_CONFIG}', content)) STORED, "
+        f"{primary_key}){partition_clause}"
+    )
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    op.execute("CREATE INDEX ix_messages_conversation_timestamp ON messages (conversation_id, timestamp)")
+    op.execute("CREATE INDEX ix_messages_content_tsv ON messages USING GIN (content_tsv)")
+
+
+def move_aside() -> None:
+    """Rename the current table and its constraints and indexes out of the way"""
+    op.execute("LOCK TABLE messages IN ACCESS EXCLUSIVE MODE")
+    op.execute("ALTER TABLE messages RENAME TO messages_old")
+    op.execute("ALTER TABLE messages_old RENAME CONSTRAINT messages_pkey TO messages_old_pkey")
+    op.execute(
+        "ALTER TABLE messages_old RENAME CONSTRAINT messages_conversation_id_fkey TO messages_old_conversation_id_fkey"
+    )
+    op.execute("DROP INDEX IF EXISTS ix_messages_id")
+    op.execute("DROP INDEX IF EXISTS ix_messages_conversation_timestamp")
+    op.execute("DROP INDEX IF EXISTS ix_messages_content_tsv")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+
+    move_aside()
+    create_messages_table(partitioned=True)
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+    oldest = bind.exec_driver_sql("SELECT min(timestamp) FROM messages_old").scalar()
+    ensure_partitions(bind, oldest or datetime.utcnow())
+    op.execute(
+        f"INSERT INTO messages ({COLUMNS}) "
+        f"SELECT id, conversation_id, role, content, COALESCE(timestamp, now() AT TIME ZONE 'utc') FROM messages_old"
+    )
+    op.execute("DROP TABLE messages_old")
+    op.execute("ANALYZE messages")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    move_aside()
+    create_messages_table(partitioned=False)
+    op.execute(f"INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_old")
+    op.execute("CREATE INDEX ix_messages_id ON messages (id)")
+    op.execute("DROP TABLE messages_old")
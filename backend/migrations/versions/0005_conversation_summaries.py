@@ -0,0 +1,34 @@
+"""Rolling summaries for context compaction
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:04
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("conversations", sa.Column("summary", sa.Text(), nullable=True))
+    op.add_column("conversations", sa.Column("summary_through_at", sa.DateTime(), nullable=True))
+    op.add_column("conversations", sa.Column("summary_through_id", sa.Integer(), nullable=True))
+    op.add_column("conversations", sa.Column("summarized_tokens", sa.Integer(), server_default="0", nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("conversations") as batch:
+        batch.drop_column("summarized_tokens")
+        batch.drop_column("summary_through_id")
+        batch.drop_column("summary_through_at")
+        batch.drop_column("summary")
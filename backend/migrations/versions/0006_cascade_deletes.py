@@ -0,0 +1,66 @@
+"""ON DELETE CASCADE for messages, archives and sync tombstones
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:00:05
+
+Deleting a conversation removes its messages and archive in the
+database instead of the ORM loading and deleting every message; deleting
+a user removes their sync tombstones. Postgres swaps the constraints in
+place (on the partitioned messages table this validates the existing
+rows once). SQLite cannot alter constraints, so the three tables are
+rebuilt and the full-text search triggers on messages recreated.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from database import SQLITE_SEARCH_DDL
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, column, referred table); constraints carry Postgres' default names
+FOREIGN_KEYS = [
+    ("messages", "conversation_id", "conversations"),
+    ("conversation_archives", "conversation_id", "conversations"),
+    ("sync_tombstones", "user_id", "users"),
+]
+
+# Names the unnamed SQLite constraints the same way when batch mode reflects them
+NAMING_CONVENTION = {"fk": "%(table_name)s_%(column_0_name)s_fkey"}
+
+SQLITE_SEARCH_TRIGGERS = [statement for statement in SQLITE_SEARCH_DDL if statement.startswith("CREATE TRIGGER")]
+
+
+def replace_foreign_keys(ondelete: Union[str, None]) -> None:
+    bind = op.get_bind()
+    for table, column, referred in FOREIGN_KEYS:
+        name = f"{table}_{column}_fkey"
+        if bind.dialect.name == "sqlite":
+            with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch:
+                batch.drop_constraint(name, type_="foreignkey")
+                batch.create_foreign_key(name, referred, [column], ["id"], ondelete=ondelete)
+        else:
+            op.drop_constraint(name, table, type_="foreignkey")
+            op.create_foreign_key(name, table, referred, [column], ["id"], ondelete=ondelete)
+
+    # Rebuilding messages dropped the triggers that keep messages_fts in step
+    if bind.dialect.name == "sqlite" and bind.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+    ).first():
+        for statement in SQLITE_SEARCH_TRIGGERS:
+            op.execute(statement)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    replace_foreign_keys("CASCADE")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    replace_foreign_keys(None)
@@ -0,0 +1,57 @@
+"""Last message of each conversation archive
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 00:00:07
+
+Lets the conversation list show an archived conversation's last message
+without decompressing its archive. Existing archives are decoded once
+here to fill the columns in.
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from archive import decompress
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, Sequence[str], None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+archives = sa.table(
+    "conversation_archives",
+    sa.column("conversation_id", sa.Integer()),
+    sa.column("codec", sa.String()),
+    sa.column("data", sa.LargeBinary()),
+    sa.column("last_role", sa.String()),
+    sa.column("last_content", sa.Text()),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("conversation_archives", sa.Column("last_role", sa.String(length=20), nullable=True))
+    op.add_column("conversation_archives", sa.Column("last_content", sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    ids = bind.execute(sa.select(archives.c.conversation_id)).scalars().all()
+    for conversation_id in ids:
+        codec, data = bind.execute(
+            sa.select(archives.c.codec, archives.c.data).where(archives.c.conversation_id == conversation_id)
+        ).one()
+        last = json.loads(decompress(data, codec).decode().rsplit("\n", 1)[-1])
+        bind.execute(
+            archives.update().where(archives.c.conversation_id == conversation_id)
+            .values(last_role=last["role"], last_content=last["content"])
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("conversation_archives") as batch:
+        batch.drop_column("last_content")
+        batch.drop_column("last_role")
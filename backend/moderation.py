@@ -0,0 +1,379 @@
+"""
+Blocklist moderation of user messages and model output
+
+Terms and phrases are read from a text file (one per line, `#` comments)
+and compiled into an Aho-Corasick automaton, so checking a message costs
+one pass over its characters however long the list is. The file is
+watched and recompiled off the event loop when it changes; requests keep
+using the previous automaton until the new one is swapped in.
+
+Text and terms are folded the same way: compatibility decomposition
+(NFKD, which covers everything NFKC maps), case folding, combining marks
+and zero-width characters dropped, and whitespace runs collapsed to one
+space. So "ＳＰＡＭ", "Spám" and "spam" all match the term "spam". Terms
+match whole words only; a leading or trailing `*` lets a term match
+inside a longer word on that side ("spam*" also blocks "spammer").
+"""
+
+import asyncio
+import os
+import time
+import unicodedata
+from array import array
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple, Union
+
+# Moderation configuration
+MODERATION_ENABLED = os.getenv("MODERATION_ENABLED", "true").lower() == "true"
+MODERATION_BLOCKLIST_PATH = os.getenv(
+    "MODERATION_BLOCKLIST_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "moderation_blocklist.txt"),
+)
+MODERATION_RELOAD_SECONDS = float(os.getenv("MODERATION_RELOAD_SECONDS", "30"))  # 0 disables the file watcher
+
+# Used when the blocklist file cannot be read
+DEFAULT_TERMS = ("spam", "advertisement")
+
+# Replaces a complete response, or ends a streamed one, that contains a blocked term
+MODERATED_RESPONSE = "I'm sorry, but I can't share that response."
+
+WILDCARD = "*"
+ZERO_WIDTH = {"\u00ad", "\u200b", "\u200c", "\u200d", "\u2060", "\ufeff"}  # soft hyphen, zero-width spaces and joiners
+
+# (length, whole word on the left, whole word on the right, original term)
+Pattern = Tuple[int, bool, bool, str]
+
+_folded: Dict[str, str] = {}
+
+def fold_char(ch: str) -> str:
+    """Normalized form of one character ("" when it is dropped)"""
+    folded = _folded.get(ch)
+    if folded is None:
+        if ch in ZERO_WIDTH:
+            folded = ""
+        elif ch.isspace():
+            folded = " "
+        else:
+            folded = "".join(
+                c for c in unicodedata.normalize("NFKD", ch.casefold()) if not unicodedata.combining(c)
+            )
+        _folded[ch] = folded
+    return folded
+
+def normalize(text: str) -> str:
+    """Fold text for matching: see the module docstring"""
+    if text.isascii():
+        return " ".join(text.lower().split())
+    return " ".join("".join(map(fold_char, text)).split())
+
+def is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+def parse_term(line: str) -> Optional[Tuple[str, bool, bool]]:
+    """(folded text, left boundary, right boundary) for a blocklist line, or None if blank"""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    left = not line.startswith(WILDCARD)
+    right = not line.endswith(WILDCARD)
+    text = normalize(line.strip(WILDCARD))
+    return (text, left, right) if text else None
+
+class Automaton:
+    """Aho-Corasick automaton over folded terms
+
+    States are list indices and fail[state] is the longest proper suffix
+    that is also a prefix of some term. out[state] lists every term ending
+    there, including those reached through fail links. Most states of a
+    large list sit on unbranched runs of a single term, so transitions are
+    stored compactly: goto[state] is a dict only where the trie branches,
+    otherwise the one character leading on ("" for a leaf), with its target
+    in edge[state]. fail, depth and edge are machine-int arrays.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.goto: List[Union[Dict[str, int], str]] = [{}]
+        self.edge = array("l", [0])
+        self.depth = array("l", [0])
+        out: Dict[int, List[Pattern]] = {}
+        self.size = 0
+        for term in terms:
+            parsed = parse_term(term)
+            if parsed is None:
+                continue
+            text, left, right = parsed
+            state = 0
+            for ch in text:
+                following = self.next(state, ch)
+                if following is None:
+                    following = len(self.goto)
+                    self.goto.append("")
+                    self.edge.append(0)
+                    self.depth.append(self.depth[state] + 1)
+                    transitions = self.goto[state]
+                    if transitions.__class__ is dict:
+                        transitions[ch] = following
+                    elif transitions:
+                        self.goto[state] = {transitions: self.edge[state], ch: following}
+                    else:
+                        self.goto[state] = ch
+                        self.edge[state] = following
+                state = following
+            out.setdefault(state, []).append((len(text), left, right, term.strip()))
+            self.size += 1
+
+        # Breadth-first, so a state's fail target is complete before its children need it
+        self.fail = array("l", bytes(self.edge.itemsize * len(self.goto)))
+        queue: Deque[int] = deque(child for _, child in self.children(0))
+        while queue:
+            state = queue.popleft()
+            for ch, child in self.children(state):
+                queue.append(child)
+                target = self.fail[state]
+                while target and self.next(target, ch) is None:
+                    target = self.fail[target]
+                following = self.next(target, ch) or 0
+                self.fail[child] = following if following != child else 0
+                if self.fail[child] in out:
+                    out[child] = out.get(child, []) + out[self.fail[child]]
+        self.out: Dict[int, Tuple[Pattern, ...]] = {state: tuple(patterns) for state, patterns in out.items()}
+
+    def next(self, state: int, ch: str) -> Optional[int]:
+        """Trie transition, or None"""
+        transitions = self.goto[state]
+        if transitions.__class__ is dict:
+            return transitions.get(ch)
+        return self.edge[state] if transitions == ch else None
+
+    def children(self, state: int) -> Iterable[Tuple[str, int]]:
+        transitions = self.goto[state]
+        if transitions.__class__ is dict:
+            return transitions.items()
+        return ((transitions, self.edge[state]),) if transitions else ()
+
+    def step(self, state: int, ch: str) -> int:
+        """Automaton transition, following fail links"""
+        while True:
+            following = self.next(state, ch)
+            if following is not None:
+                return following
+            if state == 0:
+                return 0
+            state = self.fail[state]
+
+    def find(self, text: str) -> Optional[str]:
+        """First blocked term in text, or None"""
+        text = normalize(text)
+        goto, edge, fail, out = self.goto, self.edge, self.fail, self.out
+        state = 0
+        last = len(text) - 1
+        for i, ch in enumerate(text):
+            while True:
+                # next() inlined: this loop is the per-message cost
+                transitions = goto[state]
+                if transitions.__class__ is dict:
+                    following = transitions.get(ch)
+                else:
+                    following = edge[state] if transitions == ch else None
+                if following is not None:
+                    state = following
+                    break
+                if state == 0:
+                    break
+                state = fail[state]
+            if state in out:
+                for length, left, right, term in out[state]:
+                    start = i - length + 1
+                    if left and start > 0 and is_word_char(text[start - 1]):
+                        continue
+                    if right and i < last and is_word_char(text[i + 1]):
+                        continue
+                    return term
+        return None
+
+class StreamModerator:
+    """Incremental moderation for streamed output
+
+    Like StreamingResponseCleaner, text is fed chunk by chunk. Only the
+    characters that could still be the start of a blocked term (the
+    automaton's current depth) are held back, so a term split across
+    chunks is never partly sent. Once a term is found, `blocked` is set
+    and nothing after it is released.
+    """
+
+    def __init__(self, automaton: Automaton):
+        self.automaton = automaton
+        self.blocked: Optional[str] = None
+        self._state = 0
+        self._recent = ""                        # last folded characters, for the left word boundary
+        self._held: Deque[Tuple[str, int]] = deque()  # (original character, folded length)
+        self._held_length = 0
+        self._pending: List[Pattern] = []        # matches waiting for the next character's word boundary
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk of output and return the text safe to emit"""
+        if self.blocked is not None:
+            return ""
+        output = []
+        for ch in chunk:
+            folded = fold_char(ch)
+            length = 0
+            for c in folded:
+                if c == " " and self._recent.endswith(" "):
+                    continue
+                length += 1
+                if self._advance(c):
+                    self._held.clear()
+                    self._held_length = 0
+                    return "".join(output)
+            self._held.append((ch, length))
+            self._held_length += length
+            keep = self.automaton.depth[self._state]
+            for pattern in self._pending:
+                keep = max(keep, pattern[0])
+            while self._held and self._held_length - self._held[0][1] >= keep:
+                released, released_length = self._held.popleft()
+                self._held_length -= released_length
+                output.append(released)
+        return "".join(output)
+
+    def flush(self) -> str:
+        """Release what is left once the stream has finished; the end of text is a word boundary"""
+        if self.blocked is None and self._pending:
+            self.blocked = self._pending[0][3]
+        if self.blocked is not None:
+            return ""
+        output = "".join(ch for ch, _ in self._held)
+        self._held.clear()
+        self._held_length = 0
+        return output
+
+    def _advance(self, c: str) -> bool:
+        """Consume one folded character; True once a blocked term is found"""
+        if self._pending:
+            if not is_word_char(c):
+                self.blocked = self._pending[0][3]
+                return True
+            self._pending = []
+        self._state = self.automaton.step(self._state, c)
+        self._recent = (self._recent + c)[-(self.automaton.depth[self._state] + 2):]
+        if self._state not in self.automaton.out:
+            return False
+        for pattern in self.automaton.out[self._state]:
+            length, left, right, term = pattern
+            if left and len(self._recent) > length and is_word_char(self._recent[-length - 1]):
+                continue
+            if right:
+                self._pending.append(pattern)
+                continue
+            self.blocked = term
+            return True
+        return False
+
+class Moderator:
+    """Holds the compiled blocklist, reloading it when the file changes"""
+
+    def __init__(self, path: str = MODERATION_BLOCKLIST_PATH, reload_interval: float = MODERATION_RELOAD_SECONDS):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._automaton: Optional[Automaton] = None
+        self._mtime: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self.reloads = 0
+        self.reload_failures = 0
+        self.blocked_inputs = 0
+        self.blocked_outputs = 0
+        self.compile_seconds = 0.0
+
+    @property
+    def automaton(self) -> Automaton:
+        """The current automaton, compiled on first use"""
+        if self._automaton is None:
+            self.reload()
+        return self._automaton
+
+    def _read(self) -> Tuple[Optional[float], List[str]]:
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, encoding="utf-8") as f:
+                return mtime, f.read().splitlines()
+        except OSError as e:
+            if self._automaton is None:
+                print(f"⚠️ Moderation blocklist {self.path} not readable ({e}); using the default terms")
+            return None, list(DEFAULT_TERMS)
+
+    def reload(self) -> bool:
+        """Compile the blocklist file if it changed since the last load; True if swapped in"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if self._automaton is not None and mtime == self._mtime:
+            return False
+        start = time.perf_counter()
+        mtime, terms = self._read()
+        automaton = Automaton(terms)
+        self.compile_seconds = time.perf_counter() - start
+        self._automaton, self._mtime = automaton, mtime
+        self.reloads += 1
+        return True
+
+    def start(self):
+        """Compile the blocklist off the event loop and watch the file (idempotent)"""
+        if self.reload_interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                if await asyncio.to_thread(self.reload):
+                    print(f"✅ Moderation blocklist loaded: {self._automaton.size} terms "
+                          f"in {self.compile_seconds * 1000:.0f} ms")
+            except Exception as e:
+                self.reload_failures += 1
+                print(f"⚠️ Moderation blocklist reload failed: {e}")
+            await asyncio.sleep(self.reload_interval)
+
+    def check_input(self, text: str) -> Optional[str]:
+        """Blocked term in a user message, or None"""
+        term = self.automaton.find(text)
+        if term is not None:
+            self.blocked_inputs += 1
+        return term
+
+    def moderate_output(self, text: str) -> str:
+        """The response, or MODERATED_RESPONSE if it contains a blocked term"""
+        if self.automaton.find(text) is None:
+            return text
+        self.blocked_outputs += 1
+        return MODERATED_RESPONSE
+
+    def stream(self) -> StreamModerator:
+        """A moderator for one streamed response; call record_blocked_output() if it trips"""
+        return StreamModerator(self.automaton)
+
+    def record_blocked_output(self):
+        self.blocked_outputs += 1
+
+    def snapshot(self) -> dict:
+        automaton = self._automaton
+        return {
+            "terms": automaton.size if automaton is not None else 0,
+            "states": len(automaton.goto) if automaton is not None else 0,
+            "reloads": self.reloads,
+            "reload_failures": self.reload_failures,
+            "compile_seconds": self.compile_seconds,
+            "blocked_inputs": self.blocked_inputs,
+            "blocked_outputs": self.blocked_outputs,
+        }
+
+moderator = Moderator()
@@ -0,0 +1,98 @@
+"""
+Monthly range partitions of the messages table (Postgres only)
+
+messages is partitioned by timestamp, one partition per calendar month
+named messages_yYYYYmMM, plus messages_default for anything outside the
+created range. Partitions are created ahead of time by the maintenance
+job; retention drops whole partitions instead of deleting rows.
+"""
+
+import os
+import re
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+# Months of empty partitions kept ready beyond the current one
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+PARTITION_NAME = re.compile(r"^messages_y(\d{4})m(\d{2})$")
+
+def month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1)
+
+def add_months(moment: datetime, months: int) -> datetime:
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: datetime) -> str:
+    return f"messages_y{month.year:04d}m{month.month:02d}"
+
+def list_partitions(connection: Connection) -> List[Tuple[str, datetime]]:
+    """Monthly partitions attached to messages, oldest first"""
+    names = connection.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = 'messages'::regclass"
+    )).scalars().all()
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((name, datetime(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+def create_partition(connection: Connection, month: datetime):
+    """Create the partition for one month, moving its rows out of the default partition
+
+    Postgres refuses to attach a range that already has rows in the
+    default partition, so those rows are set aside and re-inserted.
+    """
+    name, start, end = partition_name(month), month, add_months(month, 1)
+    bounds = {"start": start, "end": end}
+    stray = connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM messages_default WHERE timestamp >= :start AND timestamp < :end)"
+    ), bounds).scalar()
+    if stray:
+        connection.execute(text(
+            "CREATE TEMP TABLE stray_messages ON COMMIT DROP AS "
+            "SELECT id, conversation_id, role, content, timestamp FROM messages_default WITH NO DATA"
+        ))
+        connection.execute(text(
+            "WITH moved AS (DELETE FROM messages_default WHERE timestamp >= :start AND timestamp < :end "
+            "RETURNING id, conversation_id, role, content, timestamp) "
+            "INSERT INTO stray_messages SELECT * FROM moved"
+        ), bounds)
+    connection.execute(text(
+        f"CREATE TABLE {name} PARTITION OF messages "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    if stray:
+        connection.execute(text(
+            "INSERT INTO messages (id, conversation_id, role, content, timestamp) "
+            "SELECT id, conversation_id, role, content, timestamp FROM stray_messages"
+        ))
+        connection.execute(text("DROP TABLE stray_messages"))
+
+def ensure_partitions(connection: Connection, first: datetime, months_ahead: int = PARTITION_MONTHS_AHEAD) -> List[str]:
+    """Create any missing monthly partitions from `first` through `months_ahead` after now"""
+    existing = {name for name, _ in list_partitions(connection)}
+    created = []
+    month, last = month_start(first), add_months(month_start(datetime.utcnow()), months_ahead)
+    while month <= last:
+        if partition_name(month) not in existing:
+            create_partition(connection, month)
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+def drop_partitions_before(connection: Connection, cutoff: datetime) -> List[str]:
+    """Drop monthly partitions that end on or before cutoff"""
+    dropped = []
+    for name, month in list_partitions(connection):
+        if add_months(month, 1) <= cutoff:
+            connection.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    return dropped
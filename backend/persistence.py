@@ -0,0 +1,263 @@
+"""
+Write-behind persistence of chat messages
+
+Chat exchanges are queued in memory and written in batches (one bulk
+INSERT per batch) by a background task, so /chat returns without waiting
+on commits. History reads call barrier() first, which flushes the
+caller's pending writes, giving read-your-writes within a worker; when
+they cannot be written in time it raises PersistencePending rather than
+letting the read return history without them.
+
+A batch that fails for a transient reason (the database is down, failing
+over or restarting) stays in flight and is retried with capped
+exponential backoff. Meanwhile the bounded queue fills up and enqueue()
+applies backpressure. Only exchanges the database itself rejects (an
+integrity or data error, e.g. their conversation was deleted meanwhile)
+are dropped, and counted.
+"""
+
+import asyncio
+import os
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import DataError, IntegrityError
+
+from database import AsyncSessionLocal, Conversation, Message
+
+# Write-behind configuration
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true"
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+WRITE_BEHIND_FLUSH_INTERVAL_MS = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_MS", "50"))
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "10000"))
+WRITE_BEHIND_ENQUEUE_TIMEOUT = float(os.getenv("WRITE_BEHIND_ENQUEUE_TIMEOUT", "2.0"))
+WRITE_BEHIND_BARRIER_TIMEOUT = float(os.getenv("WRITE_BEHIND_BARRIER_TIMEOUT", "5.0"))
+WRITE_BEHIND_RETRY_MAX_BACKOFF = float(os.getenv("WRITE_BEHIND_RETRY_MAX_BACKOFF", "5.0"))
+WRITE_BEHIND_CLOSE_TIMEOUT = float(os.getenv("WRITE_BEHIND_CLOSE_TIMEOUT", "30.0"))
+
+# Failures retrying cannot fix: the database rejected the rows themselves
+REJECTED_ERRORS = (IntegrityError, DataError)
+
+class PersistenceBackpressure(Exception):
+    """Raised when the write queue stays full for longer than the enqueue timeout"""
+
+class PersistencePending(Exception):
+    """Raised by barrier() when the caller's queued messages are not written within the barrier timeout"""
+
+@dataclass
+class PendingExchange:
+    """A user message and its assistant reply waiting to be written"""
+    session_id: str
+    user_id: int
+    user_msg: str
+    response_text: str
+    timestamp: datetime
+    sequence: int = 0
+
+class MessageWriter:
+    """Bounded queue of chat exchanges flushed in batches by a background task"""
+
+    def __init__(
+        self,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL_MS / 1000,
+        queue_size: int = WRITE_BEHIND_QUEUE_SIZE,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self._queue: Deque[PendingExchange] = deque()
+        self._space = asyncio.Semaphore(queue_size)
+        self._wakeup = asyncio.Event()
+        self._flushed = asyncio.Condition()
+        self._flush_requested = False
+        self._next_sequence = 1
+        self._flushed_sequence = 0
+        self._last_sequence_by_user: Dict[int, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._in_flight = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.dropped = 0
+
+    def start(self):
+        """Start the background flush task (idempotent)"""
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def enqueue(self, exchange: PendingExchange):
+        """Queue an exchange, waiting for space when the queue is full"""
+        self.start()
+        try:
+            await asyncio.wait_for(self._space.acquire(), WRITE_BEHIND_ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise PersistenceBackpressure("Message write queue is full")
+        exchange.sequence = self._next_sequence
+        self._next_sequence += 1
+        self._last_sequence_by_user[exchange.user_id] = exchange.sequence
+        self._queue.append(exchange)
+        if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def pending(self) -> int:
+        return len(self._queue)
+
+    async def barrier(self, user_id: int):
+        """Wait until every exchange queued for this user has been written"""
+        target = self._last_sequence_by_user.get(user_id)
+        if target is None or self._flushed_sequence >= target:
+            return
+        self._flush_requested = True
+        self._wakeup.set()
+        try:
+            async with self._flushed:
+                await asyncio.wait_for(
+                    self._flushed.wait_for(lambda: self._flushed_sequence >= target),
+                    WRITE_BEHIND_BARRIER_TIMEOUT
+                )
+        except asyncio.TimeoutError:
+            raise PersistencePending(f"Pending messages of user {user_id} are not written yet")
+
+    async def close(self, timeout: float = WRITE_BEHIND_CLOSE_TIMEOUT):
+        """Flush everything still queued and stop the background task
+
+        Gives up after timeout when the database stays unavailable; what
+        is still queued then is lost and counted as dropped.
+        """
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except asyncio.TimeoutError:
+                lost = len(self._queue) + self._in_flight
+                self.dropped += lost
+                print(f"❌ Database unavailable at shutdown, dropping {lost} queued chat exchanges")
+            self._task = None
+
+    async def _run(self):
+        while True:
+            if not self._queue:
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # Give the batch a moment to fill unless it is full or a reader is waiting
+            if len(self._queue) < self.batch_size and not (self._closing or self._flush_requested):
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            self._flush_requested = False
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            self._in_flight = len(batch)
+            await self._write_with_retry(batch)
+            self._in_flight = 0
+            for exchange in batch:
+                self._space.release()
+                if self._last_sequence_by_user.get(exchange.user_id) == exchange.sequence:
+                    del self._last_sequence_by_user[exchange.user_id]
+
+            async with self._flushed:
+                self._flushed_sequence = batch[-1].sequence
+                self._flushed.notify_all()
+
+    async def _write_with_retry(self, batch: List[PendingExchange]):
+        """Write a batch until it succeeds, isolating rows the database rejects"""
+        try:
+            await self._write_until_done(batch)
+            return
+        except REJECTED_ERRORS:
+            pass
+
+        # Write one exchange at a time so a single bad row cannot sink the batch
+        for exchange in batch:
+            try:
+                await self._write_until_done([exchange])
+            except REJECTED_ERRORS as e:
+                self.dropped += 1
+                print(f"❌ Dropping chat message for session {exchange.session_id}: {e}")
+
+    async def _write_until_done(self, batch: List[PendingExchange]):
+        """Retry transient failures with capped exponential backoff; rejected rows raise"""
+        attempt = 0
+        while True:
+            try:
+                await self._write_batch(batch)
+                return
+            except REJECTED_ERRORS:
+                raise
+            except Exception as e:
+                delay = min(WRITE_BEHIND_RETRY_MAX_BACKOFF, 0.1 * 2 ** attempt)
+                attempt += 1
+                self.retries += 1
+                print(f"⚠️ Batched message write failed (attempt {attempt}), retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+
+    async def _write_batch(self, batch: List[PendingExchange]):
+        async with AsyncSessionLocal() as db:
+            # Resolve conversation ids, creating conversations seen for the first time
+            session_ids = {exchange.session_id for exchange in batch}
+            result = await db.execute(
+                select(Conversation.session_id, Conversation.id).where(Conversation.session_id.in_(session_ids))
+            )
+            conversation_ids = dict(result.all())
+
+            new_conversations = {}
+            for exchange in batch:
+                if exchange.session_id not in conversation_ids and exchange.session_id not in new_conversations:
+                    new_conversations[exchange.session_id] = {
+                        "session_id": exchange.session_id,
+                        "user_id": exchange.user_id,
+                        "created_at": exchange.timestamp,
+                        "last_activity": exchange.timestamp,
+                    }
+            if new_conversations:
+                await db.execute(insert(Conversation), list(new_conversations.values()))
+                result = await db.execute(
+                    select(Conversation.session_id, Conversation.id)
+                    .where(Conversation.session_id.in_(new_conversations.keys()))
+                )
+                conversation_ids.update(result.all())
+
+            # One bulk INSERT for every message in the batch, in arrival order
+            rows = []
+            last_activity = {}
+            for exchange in batch:
+                conversation_id = conversation_ids[exchange.session_id]
+                rows.append({"conversation_id": conversation_id, "role": "user",
+                             "content": exchange.user_msg, "timestamp": exchange.timestamp})
+                rows.append({"conversation_id": conversation_id, "role": "assistant",
+                             "content": exchange.response_text, "timestamp": exchange.timestamp})
+                last_activity[conversation_id] = exchange.timestamp
+            await db.execute(insert(Message), rows)
+
+            await db.execute(update(Conversation), [
+                {"id": conversation_id, "last_activity": moment}
+                for conversation_id, moment in last_activity.items()
+            ])
+            await db.commit()
+
+        self.written += len(batch)
+        self.batches += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "pending": len(self._queue),
+            "written": self.written,
+            "batches": self.batches,
+            "retries": self.retries,
+            "dropped": self.dropped,
+        }
+
+message_writer = MessageWriter()
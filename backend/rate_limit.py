@@ -0,0 +1,103 @@
+"""
+Rate limiting with GCRA (generic cell rate algorithm)
+
+Each key stores a single "theoretical arrival time" instead of a list of
+request timestamps, so a check is O(1) in time and memory. The in-memory
+limiter is per process and bounded by LRU eviction; the Redis limiter is
+shared by every worker.
+"""
+
+import os
+import time
+from typing import NamedTuple
+
+# Rate limiting configuration
+RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "10"))
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" or "redis"
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    retry_after: float = 0.0  # seconds until the next request would be allowed
+
+class InMemoryRateLimiter:
+    """GCRA limiter holding at most `max_keys` keys in this process
+
+    Keys are kept in a plain dict in least-recently-used order (re-inserted
+    on access); when full the oldest key is evicted. An evicted key simply
+    starts again with a full burst.
+    """
+
+    def __init__(self, limit: int = RATE_LIMIT_PER_MINUTE, period: float = 60.0, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.limit = limit
+        self.period = period
+        self.interval = period / limit  # time one request "costs"
+        self.max_keys = max_keys
+        self._tat = {}
+
+    async def hit(self, key: str) -> RateLimitResult:
+        return self.hit_nowait(key, time.monotonic())
+
+    def hit_nowait(self, key: str, now: float) -> RateLimitResult:
+        """Synchronous check, also used directly by the benchmark"""
+        tat = self._tat.pop(key, now)
+        if tat < now:
+            tat = now
+        new_tat = tat + self.interval
+        allow_at = new_tat - self.period
+        if now < allow_at:
+            self._tat[key] = tat
+            return RateLimitResult(False, allow_at - now)
+
+        self._tat[key] = new_tat
+        if len(self._tat) > self.max_keys:
+            del self._tat[next(iter(self._tat))]
+        return RateLimitResult(True)
+
+    def __len__(self) -> int:
+        return len(self._tat)
+
+# Runs atomically in Redis and uses the server clock so all workers agree
+GCRA_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + interval
+local allow_at = new_tat - period
+if now < allow_at then
+    return {0, tostring(allow_at - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, '0'}
+"""
+
+class RedisRateLimiter:
+    """GCRA limiter shared across workers through Redis
+
+    Takes any asyncio client speaking the Redis protocol, so a local fake
+    (e.g. fakeredis with Lua support) can be used in tests. Keys expire on
+    their own once the caller is back to a full burst.
+    """
+
+    def __init__(self, client, limit: int = RATE_LIMIT_PER_MINUTE, period: float = 60.0, prefix: str = "ratelimit:"):
+        self.limit = limit
+        self.period = period
+        self.interval = period / limit
+        self._prefix = prefix
+        self._script = client.register_script(GCRA_SCRIPT)
+
+    async def hit(self, key: str) -> RateLimitResult:
+        allowed, retry_after = await self._script(keys=[self._prefix + key], args=[self.interval, self.period])
+        return RateLimitResult(bool(int(allowed)), float(retry_after))
+
+def create_rate_limiter():
+    """Build the rate limiter for the configured backend"""
+    if RATE_LIMIT_BACKEND == "redis":
+        from redis_client import get_redis_client
+        return RedisRateLimiter(get_redis_client())
+    return InMemoryRateLimiter()
+
+rate_limiter = create_rate_limiter()
@@ -0,0 +1,20 @@
+"""
+Shared Redis connection for the optional Redis-backed caches and limiters
+"""
+
+import os
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+_client = None
+
+def get_redis_client():
+    """Return the process-wide asyncio Redis client, creating it on first use"""
+    global _client
+    if _client is None:
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("The redis package is required for Redis-backed caching (pip install redis)") from e
+        _client = redis.from_url(REDIS_URL, decode_responses=True)
+    return _client
@@ -0,0 +1,128 @@
+"""
+Cache of LLM responses for repeated prompts
+"""
+
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update
+
+from database import AsyncSessionLocal, CachedResponse
+from ttl_cache import TTLCache
+
+# Cache configuration
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # "memory" or "database"
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+# Off by default: case carries meaning in code, acronyms and names ("US" vs "us")
+RESPONSE_CACHE_IGNORE_CASE = os.getenv("RESPONSE_CACHE_IGNORE_CASE", "false").lower() == "true"
+
+WHITESPACE = re.compile(r"\s+")
+
+def normalize_content(text: str, ignore_case: bool = RESPONSE_CACHE_IGNORE_CASE) -> str:
+    """Collapse whitespace (and case, when opted in) so trivially different prompts share an entry"""
+    text = WHITESPACE.sub(" ", text).strip()
+    return text.casefold() if ignore_case else text
+
+def response_cache_key(model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+    """Hash of everything that determines the answer: model, prompt and sampling params
+
+    `messages` includes the system prompt and the history sent upstream.
+    """
+    canonical = json.dumps({
+        "model": model,
+        "messages": [[m["role"], normalize_content(m["content"])] for m in messages],
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+class DatabaseResponseStore:
+    """Persistent cache entries in the response_cache table, shared by all workers"""
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[str]:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(CachedResponse.response).where(
+                CachedResponse.key == key,
+                CachedResponse.expires_at > datetime.utcnow()
+            ))
+            response = result.scalar_one_or_none()
+            if response is not None:
+                await db.execute(
+                    update(CachedResponse).where(CachedResponse.key == key)
+                    .values(hit_count=CachedResponse.hit_count + 1)
+                )
+                await db.commit()
+            return response
+
+    async def set(self, key: str, model: str, response: str):
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            await db.merge(CachedResponse(
+                key=key,
+                model=model,
+                response=response,
+                created_at=now,
+                expires_at=now + timedelta(seconds=self.ttl),
+                hit_count=0
+            ))
+            await db.commit()
+
+class ResponseCache:
+    """In-process LRU/TTL cache, optionally backed by the database table"""
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: float = RESPONSE_CACHE_TTL_SECONDS, store: Optional[DatabaseResponseStore] = None):
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._store = store
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        response = self._memory.get(key)
+        if response is None and self._store is not None:
+            try:
+                response = await self._store.get(key)
+            except Exception as e:
+                print(f"Response cache lookup failed: {e}")
+            if response is not None:
+                self._memory.set(key, response)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    async def set(self, key: str, model: str, response: str):
+        self.stores += 1
+        self._memory.set(key, response)
+        if self._store is not None:
+            try:
+                await self._store.set(key, model, response)
+            except Exception as e:
+                print(f"Response cache store failed: {e}")
+
+    def snapshot(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._memory),
+        }
+
+def create_response_cache() -> ResponseCache:
+    """Build the response cache for the configured backend"""
+    store = DatabaseResponseStore() if RESPONSE_CACHE_BACKEND == "database" else None
+    return ResponseCache(store=store)
+
+response_cache = create_response_cache()
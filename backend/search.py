@@ -0,0 +1,222 @@
+"""
+Full-text search over a user's messages, ranked and paginated
+Postgres matches the generated content_tsv column through its GIN index;
+SQLite matches the messages_fts FTS5 table. Both are created in database.py.
+
+Archived conversations (archive.py) are not in either index. Once the
+ranked matches among live messages run out, the user's archives are
+decoded and scanned for messages containing every query word, newest
+conversation first.
+"""
+
+import base64
+import html
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import column, func, literal_column, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from archive import decode_messages
+from database import SEARCH_TEXT_CONFIG, Conversation, ConversationArchive, Message
+from history import InvalidCursor
+
+# Results past this depth are not served; refine the query instead
+MAX_SEARCH_RESULTS = 1000
+MAX_QUERY_TERMS = 16
+
+# Private-use characters mark matches inside snippets, so the text can be
+# HTML-escaped before the markers are turned into <mark> tags
+MATCH_START, MATCH_END = "\ue000", "\ue001"
+SNIPPET_WORDS = 24
+
+class InvalidQuery(ValueError):
+    """Raised when a search query contains nothing searchable"""
+
+class SearchUnavailable(Exception):
+    """Raised when the database has no full-text search index (neither Postgres nor SQLite)"""
+
+def encode_offset(offset: int, archived: bool = False) -> str:
+    raw = json.dumps({"archived": offset} if archived else {"offset": offset}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_offset(cursor: str) -> Tuple[int, bool]:
+    """Return (offset, archived): an offset into the live matches or into the archived ones"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded))
+        archived = "archived" in position
+        offset = int(position["archived"] if archived else position["offset"])
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+    if offset < 0:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    return offset, archived
+
+def highlight(snippet: str) -> str:
+    """HTML-escape a snippet and wrap matched terms in <mark>"""
+    return html.escape(snippet).replace(MATCH_START, "<mark>").replace(MATCH_END, "</mark>")
+
+def fts5_query(query: str) -> str:
+    """Turn free text into an FTS5 expression matching all of its words
+
+    Every word is quoted, so operators and punctuation in user input can
+    never produce an FTS5 syntax error.
+    """
+    terms = query_terms(query)
+    if not terms:
+        raise InvalidQuery("Search query has no searchable words")
+    return " ".join(f'"{term}"' for term in terms)
+
+def query_terms(query: str) -> List[str]:
+    return re.findall(r"\w+", query)[:MAX_QUERY_TERMS]
+
+def words(text: str) -> List[Tuple[int, int, str]]:
+    """(start, end, casefolded word) of every word in text"""
+    return [(match.start(), match.end(), match.group().casefold()) for match in re.finditer(r"\w+", text)]
+
+def archive_snippet(content: str, found: List[Tuple[int, int, str]], terms: set) -> str:
+    """About SNIPPET_WORDS words around the first match, matches marked like the database snippets"""
+    first = next(index for index, (_, _, word) in enumerate(found) if word in terms)
+    start = max(0, first - SNIPPET_WORDS // 3)
+    end = min(len(found), start + SNIPPET_WORDS)
+    parts = ["…"] if start > 0 else []
+    position = found[start][0]
+    for word_start, word_end, word in found[start:end]:
+        parts.append(content[position:word_start])
+        matched = content[word_start:word_end]
+        parts.append(MATCH_START + matched + MATCH_END if word in terms else matched)
+        position = word_end
+    parts.append(content[position:] if end == len(found) else "…")
+    return "".join(parts)
+
+async def search_archives(db: AsyncSession, user_id: int, query: str, offset: int, limit: int) -> List[Dict]:
+    """Messages of the user's archived conversations containing every query word
+
+    Skips the first offset matches and returns up to limit, newest
+    conversation first. Archives are decoded one at a time and the scan
+    stops once enough matches are found.
+    """
+    terms = {term.casefold() for term in query_terms(query)}
+    if not terms:
+        return []
+    result = await db.stream(
+        select(ConversationArchive, Conversation.session_id)
+        .join(Conversation, Conversation.id == ConversationArchive.conversation_id)
+        .where(Conversation.user_id == user_id)
+        .order_by(ConversationArchive.last_timestamp.desc(), ConversationArchive.conversation_id.desc())
+        .execution_options(yield_per=20)
+    )
+    matches = []
+    async for archive, session_id in result:
+        for message in reversed(decode_messages(archive)):
+            found = words(message["content"])
+            if not terms <= {word for _, _, word in found}:
+                continue
+            if offset:
+                offset -= 1
+                continue
+            matches.append({
+                "id": message["id"],
+                "role": message["role"],
+                "timestamp": message["timestamp"],
+                "session_id": session_id,
+                "snippet": archive_snippet(message["content"], found, terms),
+            })
+            if len(matches) == limit:
+                await result.close()
+                return matches
+    return matches
+
+def postgres_search(user_id: int, query: str):
+    """Rank matches in an inner query; build headlines only for the page"""
+    vector = literal_column("messages.content_tsv")
+    tsquery = func.websearch_to_tsquery(SEARCH_TEXT_CONFIG, query)
+    rank = func.ts_rank_cd(vector, tsquery).label("rank")
+    ranked = (
+        select(Message.id, Message.role, Message.content, Message.timestamp, Conversation.session_id, rank)
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .where(Conversation.user_id == user_id, vector.op("@@")(tsquery))
+    )
+    options = (f"StartSel={MATCH_START}, StopSel={MATCH_END}, MaxWords={SNIPPET_WORDS}, "
+               f"MinWords={SNIPPET_WORDS // 3}, MaxFragments=2, FragmentDelimiter=\" … \"")
+
+    def page(offset: int, limit: int):
+        inner = ranked.order_by(rank.desc(), Message.id.desc()).offset(offset).limit(limit).subquery()
+        return select(
+            inner.c.id, inner.c.role, inner.c.timestamp, inner.c.session_id,
+            func.ts_headline(SEARCH_TEXT_CONFIG, inner.c.content, tsquery, options).label("snippet"),
+        ).order_by(inner.c.rank.desc(), inner.c.id.desc())
+    return page
+
+def sqlite_search(user_id: int, query: str):
+    """Match through FTS5; bm25() is lower for better matches"""
+    fts = table("messages_fts", column("rowid"))
+    fts_ref = literal_column("messages_fts")
+    matches = (
+        select(
+            Message.id, Message.role, Message.timestamp, Conversation.session_id,
+            func.snippet(fts_ref, 0, MATCH_START, MATCH_END, "…", SNIPPET_WORDS // 2).label("snippet"),
+        )
+        .select_from(fts)
+        .join(Message, Message.id == fts.c.rowid)
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .where(fts_ref.op("MATCH")(fts5_query(query)), Conversation.user_id == user_id)
+    )
+
+    def page(offset: int, limit: int):
+        return matches.order_by(func.bm25(fts_ref), Message.id.desc()).offset(offset).limit(limit)
+    return page
+
+async def search_messages(db: AsyncSession, user_id: int, query: str, limit: int,
+                          cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """Return one page of the user's messages matching query, best first
+
+    Ranked results cannot be keyset-paginated, so the cursor carries an
+    offset; paging stops at MAX_SEARCH_RESULTS. Matches in archived
+    conversations follow the ranked ones, with their own offset and cap.
+    Returns (results, next_cursor).
+    """
+    offset, archived = decode_offset(cursor) if cursor else (0, False)
+
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        page = postgres_search(user_id, query)
+    elif dialect == "sqlite":
+        page = sqlite_search(user_id, query)
+    else:
+        raise SearchUnavailable(f"Full-text search is not available on {dialect}")
+
+    rows = []
+    if not archived:
+        if offset < MAX_SEARCH_RESULTS:
+            limit = min(limit, MAX_SEARCH_RESULTS - offset)
+            result = await db.execute(page(offset, limit + 1))
+            rows = [row._asdict() for row in result.all()]
+            if len(rows) > limit:
+                next_cursor = encode_offset(offset + limit) if offset + limit < MAX_SEARCH_RESULTS else None
+                return [search_result(row) for row in rows[:limit]], next_cursor
+        # Live matches ran out on this page: continue with the archived ones
+        limit -= len(rows)
+        offset = 0
+
+    next_cursor = None
+    if offset < MAX_SEARCH_RESULTS:
+        limit = min(limit, MAX_SEARCH_RESULTS - offset)
+        matches = await search_archives(db, user_id, query, offset, limit + 1)
+        if len(matches) > limit:
+            matches = matches[:limit]
+            if offset + limit < MAX_SEARCH_RESULTS:
+                next_cursor = encode_offset(offset + limit, archived=True)
+        rows += matches
+    return [search_result(row) for row in rows], next_cursor
+
+def search_result(row: Dict) -> Dict:
+    return {
+        "session_id": row["session_id"],
+        "message_id": row["id"],
+        "role": row["role"],
+        "snippet": highlight(row["snippet"]),
+        "timestamp": row["timestamp"].isoformat(),
+    }
@@ -0,0 +1,135 @@
+"""
+Single-flight request coalescing: concurrent identical calls share one upstream request
+"""
+
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+SINGLEFLIGHT_TIMEOUT_SECONDS = float(os.getenv("SINGLEFLIGHT_TIMEOUT_SECONDS", "60"))
+
+class _Broadcast:
+    """Chunks of one upstream stream, replayable by any number of subscribers"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: str):
+        self.chunks.append(chunk)
+        self._wake()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._wake()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self, timeout: float) -> AsyncIterator[str]:
+        """Yield every chunk from the start, then follow the live stream"""
+        deadline = time.monotonic() + timeout
+        position = 0
+        while True:
+            if position < len(self.chunks):
+                position += 1
+                yield self.chunks[position - 1]
+                continue
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError("Timed out waiting for the shared stream")
+            await asyncio.wait_for(self._changed.wait(), remaining)
+
+class SingleFlight:
+    """Deduplicates concurrent calls with the same key
+
+    The first caller for a key starts the work in a background task;
+    callers arriving while it runs wait for the same result (or exception).
+    The task is shielded, so a waiter timing out or disconnecting does not
+    cancel the call for the others. The key is released as soon as the
+    call finishes, so later calls start fresh. The leader tasks are held
+    in _tasks until they finish; the event loop only keeps weak references,
+    and a collected leader would leave every waiter on its key hanging.
+    """
+
+    def __init__(self, timeout: float = SINGLEFLIGHT_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable], timeout: Optional[float] = None):
+        """Run fn() once for all concurrent callers with this key"""
+        future = self._calls.get(key)
+        if future is None:
+            self.leaders += 1
+            future = asyncio.get_running_loop().create_future()
+            # Mark exceptions as retrieved even if every waiter has gone away
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._calls[key] = future
+            self._spawn(self._run(key, fn, future))
+        else:
+            self.followers += 1
+        return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+
+    def _spawn(self, coroutine: Awaitable):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Hashable, fn: Callable[[], Awaitable], future: asyncio.Future):
+        try:
+            result = await fn()
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            self._calls.pop(key, None)
+
+    def stream(self, key: Hashable, fn: Callable[[], AsyncIterator[str]], timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Share one upstream stream among all concurrent callers with this key
+
+        Late joiners receive the chunks already produced, then the rest live.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self.leaders += 1
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            self._spawn(self._pump(key, fn, broadcast))
+        else:
+            self.followers += 1
+        return broadcast.subscribe(timeout or self.timeout)
+
+    async def _pump(self, key: Hashable, fn: Callable[[], AsyncIterator[str]], broadcast: _Broadcast):
+        try:
+            async for chunk in fn():
+                broadcast.publish(chunk)
+        except BaseException as e:
+            broadcast.finish(e)
+        else:
+            broadcast.finish()
+        finally:
+            self._streams.pop(key, None)
+
+    def snapshot(self) -> dict:
+        return {
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "in_flight": len(self._calls) + len(self._streams),
+        }
+
+llm_flight = SingleFlight()
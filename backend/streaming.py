@@ -0,0 +1,153 @@
+"""
+Helpers for streaming chat responses to the client as they are generated
+"""
+
+import json
+import re
+from typing import Optional
+
+# Blocks the model uses for its hidden reasoning, stripped from the output
+# in this order (mirrors clean_response)
+THINK_BLOCKS = (("<think>", "</think>"), ("<|>", "</|>"))
+
+# Filler preamble stripped up to the next paragraph, after the blocks (mirrors clean_response)
+FILLER_MARKER = "Okay,"
+FILLER_END = re.compile(r"\n(?=\n|[A-Z])")
+
+class StreamingResponseCleaner:
+    """Incremental version of clean_response for streamed completions
+
+    Text is fed chunk by chunk and only the part that can no longer be
+    affected by a later chunk is released, so tags split across chunk
+    boundaries are still removed. Each substitution of clean_response is
+    one stage fed the output of the previous one, so feeding a whole
+    response and flushing gives the same result as clean_response.
+    """
+
+    def __init__(self):
+        self._stages = [_BlockStripper(open_tag, close_tag) for open_tag, close_tag in THINK_BLOCKS]
+        self._stages.append(_FillerStripper())
+        self._started = False                  # leading whitespace already stripped
+        self._pending_space = ""               # trailing whitespace held back
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk of raw model output and return the text safe to emit"""
+        return self._drain(chunk, final=False)
+
+    def flush(self) -> str:
+        """Release whatever is left once the stream has finished"""
+        return self._drain("", final=True)
+
+    def _drain(self, text: str, final: bool) -> str:
+        for stage in self._stages:
+            text = stage.feed(text, final)
+        text = self._emit(text)
+        if final:
+            self._pending_space = ""
+        return text
+
+    def _emit(self, text: str) -> str:
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._started = True
+        text = self._pending_space + text
+        stripped = text.rstrip()
+        self._pending_space = text[len(stripped):]
+        return stripped
+
+class _BlockStripper:
+    """Removes open_tag...close_tag blocks like re.sub with a lazy DOTALL pattern
+
+    An unclosed block does not match, so it is released verbatim once the
+    stream ends.
+    """
+
+    def __init__(self, open_tag: str, close_tag: str):
+        self.open_tag = open_tag
+        self.close_tag = close_tag
+        self._buffer = ""
+        self._in_block = False
+
+    def feed(self, text: str, final: bool) -> str:
+        self._buffer += text
+        output = []
+        while self._buffer:
+            if self._in_block:
+                index = self._buffer.find(self.close_tag)
+                if index == -1:
+                    if final:
+                        output.append(self.open_tag + self._buffer)
+                        self._buffer = ""
+                        self._in_block = False
+                    break
+                self._buffer = self._buffer[index + len(self.close_tag):]
+                self._in_block = False
+                continue
+
+            index = self._buffer.find(self.open_tag)
+            if index != -1:
+                output.append(self._buffer[:index])
+                self._buffer = self._buffer[index + len(self.open_tag):]
+                self._in_block = True
+                continue
+
+            # Hold back a suffix that could be the start of the tag
+            hold = 0 if final else _partial_marker_length(self._buffer, self.open_tag)
+            output.append(self._buffer[:len(self._buffer) - hold])
+            self._buffer = self._buffer[len(self._buffer) - hold:]
+            break
+        if final and self._in_block:
+            # Input ended right after the opening tag
+            output.append(self.open_tag)
+            self._in_block = False
+        return "".join(output)
+
+class _FillerStripper:
+    """Removes FILLER_MARKER up to the next paragraph or capitalised line, or the end"""
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_filler = False
+
+    def feed(self, text: str, final: bool) -> str:
+        self._buffer += text
+        output = []
+        while self._buffer:
+            if self._in_filler:
+                match = FILLER_END.search(self._buffer)
+                if match:
+                    self._buffer = self._buffer[match.start():]
+                    self._in_filler = False
+                    continue
+                # Keep a trailing newline until we know what follows it
+                self._buffer = "\n" if self._buffer.endswith("\n") and not final else ""
+                break
+
+            index = self._buffer.find(FILLER_MARKER)
+            if index != -1:
+                output.append(self._buffer[:index])
+                self._buffer = self._buffer[index + len(FILLER_MARKER):]
+                self._in_filler = True
+                continue
+
+            hold = 0 if final else _partial_marker_length(self._buffer, FILLER_MARKER)
+            output.append(self._buffer[:len(self._buffer) - hold])
+            self._buffer = self._buffer[len(self._buffer) - hold:]
+            break
+        if final:
+            self._in_filler = False
+        return "".join(output)
+
+def _partial_marker_length(text: str, marker: str) -> int:
+    """Length of the longest suffix of text that is a proper prefix of marker"""
+    for size in range(min(len(marker) - 1, len(text)), 0, -1):
+        if text.endswith(marker[:size]):
+            return size
+    return 0
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format a Server-Sent Events frame"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
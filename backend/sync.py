@@ -0,0 +1,142 @@
+"""
+Incremental history sync
+
+Clients keep a local copy of their conversations and ask only for what
+changed since their last sync: conversations active after the cursor with
+their new messages, and tombstones for deleted conversations. Without a
+cursor, or with one older than TOMBSTONE_RETENTION_DAYS, the response is a
+full snapshot flagged reset.
+
+Changed conversations are read in (last_activity, id) order through the
+(user_id, last_activity) index, so a sync may take several pages
+(has_more). Exchanges can commit shortly after their timestamp
+(write-behind, other workers), so the cursor never gets closer than
+SYNC_OVERLAP_SECONDS to now; anything in that window is sent again and
+clients dedupe messages by id. When nothing changed, the same cursor
+yields the same body, which the endpoint turns into a 304.
+"""
+
+import base64
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from archive import TOMBSTONE_RETENTION_DAYS, load_archives
+from database import Conversation, Message, Tombstone
+from history import InvalidCursor
+
+SYNC_OVERLAP_SECONDS = float(os.getenv("SYNC_OVERLAP_SECONDS", "10"))
+
+def encode_sync_cursor(position: datetime, conversation_id: int, since: datetime, snapshot: bool = False) -> str:
+    """Encode a keyset position, the point the sync started from and whether it is a full snapshot"""
+    raw = json.dumps([position.isoformat(), conversation_id, since.isoformat(), snapshot]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_sync_cursor(cursor: str) -> Tuple[datetime, int, datetime, bool]:
+    """Decode a cursor produced by encode_sync_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position, conversation_id, since, snapshot = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(position), int(conversation_id), datetime.fromisoformat(since), bool(snapshot)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+def message_entry(message: dict) -> dict:
+    return {
+        "id": message["id"],
+        "role": message["role"],
+        "content": message["content"],
+        "timestamp": message["timestamp"].isoformat(),
+    }
+
+async def load_changes(db: AsyncSession, user_id: int, cursor: Optional[str], limit: int) -> dict:
+    """Return one page of changes to a user's conversations since cursor
+
+    Messages are those with a timestamp at or after the point the sync
+    started from (all of them in a snapshot), so later pages of the same
+    sync still carry every new message of their conversations. Deletions
+    since that point go out with the last page.
+    """
+    now = datetime.utcnow()
+    if cursor:
+        position, position_id, since, snapshot = decode_sync_cursor(cursor)
+    reset = not cursor or since < now - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    if reset:
+        position, position_id, since, snapshot = None, 0, now, True
+
+    query = select(Conversation).where(Conversation.user_id == user_id)
+    if position is not None:
+        query = query.where(or_(
+            Conversation.last_activity > position,
+            and_(Conversation.last_activity == position, Conversation.id > position_id)
+        ))
+    query = query.order_by(Conversation.last_activity, Conversation.id).limit(limit + 1)
+    result = await db.execute(query)
+    conversations = list(result.scalars().all())
+    has_more = len(conversations) > limit
+    conversations = conversations[:limit]
+
+    messages = defaultdict(list)
+    if conversations:
+        message_query = select(Message.id, Message.conversation_id, Message.role, Message.content, Message.timestamp).where(
+            Message.conversation_id.in_([conversation.id for conversation in conversations])
+        )
+        if not snapshot:
+            message_query = message_query.where(Message.timestamp >= since)
+        result = await db.execute(message_query.order_by(Message.conversation_id, Message.timestamp, Message.id))
+        for row in result.all():
+            messages[row.conversation_id].append(message_entry(row._asdict()))
+    archives = await load_archives(db, [conversation.id for conversation in conversations if conversation.archived_at])
+
+    changed = []
+    for conversation in conversations:
+        archived = [message_entry(m) for m in archives.get(conversation.id, []) if snapshot or m["timestamp"] >= since]
+        changed.append({
+            "session_id": conversation.session_id,
+            "created_at": conversation.created_at.isoformat(),
+            "last_activity": conversation.last_activity.isoformat(),
+            "messages": archived + messages[conversation.id],
+        })
+
+    deleted, newest_deletion = [], None
+    if not has_more:
+        result = await db.execute(
+            select(Tombstone.session_id, Tombstone.deleted_at)
+            .where(Tombstone.user_id == user_id, Tombstone.deleted_at >= since)
+            .order_by(Tombstone.deleted_at)
+        )
+        for session_id, deleted_at in result.all():
+            deleted.append(session_id)
+            newest_deletion = deleted_at
+
+    if conversations:
+        position, position_id = conversations[-1].last_activity, conversations[-1].id
+    if has_more:
+        next_cursor = encode_sync_cursor(position, position_id, since, snapshot)
+    else:
+        # Nothing newer is left, so the next sync can start from the newest change
+        # seen, held back by the overlap window for changes not yet committed. An
+        # idle cursor still moves up to the start of the hour, which keeps it
+        # fresh for the tombstone retention check without changing on every call.
+        if newest_deletion is not None and (position is None or newest_deletion > position):
+            position, position_id = newest_deletion, 0
+        horizon = now - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+        idle_floor = horizon.replace(minute=0, second=0, microsecond=0)
+        if position is None or position < idle_floor:
+            position, position_id = idle_floor, 0
+        elif position > horizon:
+            position, position_id = horizon, 0
+        next_cursor = encode_sync_cursor(position, position_id, position)
+
+    return {
+        "conversations": changed,
+        "deleted": deleted,
+        "cursor": next_cursor,
+        "has_more": has_more,
+        "reset": reset,
+    }
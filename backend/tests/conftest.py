@@ -0,0 +1,83 @@
+"""
+Test configuration: a throwaway SQLite database and a dummy Groq key
+
+Set before any test module imports database or app, which read them at
+import time. Tests that go over HTTP run the app under uvicorn against
+the fake Groq server with benchmarks/harness.py. Run from backend/:
+    python -m pytest tests
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+TEST_DIR = tempfile.mkdtemp(prefix="capstone-tests-")
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ.setdefault("GROQ_API_KEY", "fake-key")
+sys.path.insert(0, os.path.join(BACKEND_DIR, "benchmarks"))
+
+_usernames = itertools.count()
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture(scope="session")
+def database():
+    """The test database, migrated to the latest revision"""
+    from database import create_tables
+    create_tables()
+
+@pytest.fixture
+async def db(database):
+    """Disposes the async engine after the test, whose event loop its pooled connections belong to"""
+    from database import async_engine
+    yield
+    await async_engine.dispose()
+
+@pytest.fixture
+def make_user(database):
+    """Insert a user and return their id"""
+    from sqlalchemy import insert
+    from database import User, engine
+
+    def make(username=None) -> int:
+        username = username or f"user{next(_usernames)}"
+        with engine.begin() as connection:
+            return connection.execute(insert(User).values(
+                username=username, email=f"{username}@example.com", hashed_password="x", is_active=True
+            )).inserted_primary_key[0]
+    return make
+
+@pytest.fixture(scope="session")
+def fake_groq():
+    """Base URL of the fake Groq server"""
+    from harness import fake_groq_server
+    with fake_groq_server(latency_ms=20) as base_url:
+        yield base_url
+
+@pytest.fixture
+def add_conversation(database):
+    """Insert a conversation of alternating user/assistant messages a second apart; returns its id"""
+    from datetime import timedelta
+    from sqlalchemy import insert
+    from database import Conversation, Message, engine
+
+    def add(user_id: int, session_id: str, messages: int, at) -> int:
+        with engine.begin() as connection:
+            conversation_id = connection.execute(insert(Conversation).values(
+                session_id=session_id, user_id=user_id, created_at=at, last_activity=at + timedelta(seconds=messages)
+            )).inserted_primary_key[0]
+            if messages:
+                connection.execute(insert(Message), [
+                    {"conversation_id": conversation_id, "role": "user" if i % 2 == 0 else "assistant",
+                     "content": f"{session_id} message {i}", "timestamp": at + timedelta(seconds=i)}
+                    for i in range(messages)
+                ])
+        return conversation_id
+    return add
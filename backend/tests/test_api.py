@@ -0,0 +1,80 @@
+"""
+End to end over HTTP: the app under uvicorn against the fake Groq server and a fresh SQLite database
+"""
+
+import json
+
+import httpx
+import pytest
+
+from harness import api_server, signup
+
+REPLY = "This is a canned answer from the fake Groq server."
+DAILY_QUOTA = 2000
+
+@pytest.fixture(scope="module")
+def api(fake_groq, tmp_path_factory):
+    database_url = f"sqlite:///{tmp_path_factory.mktemp('api') / 'api.db'}"
+    with api_server(fake_groq, database_url, COMPACTION_ENABLED="false",
+                    USAGE_DAILY_TOKEN_QUOTA=DAILY_QUOTA) as base_url:
+        yield base_url
+
+def auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+def sse_events(body: str) -> list:
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((lines.get("event", "message"), json.loads(lines["data"])))
+    return events
+
+def test_chat_stream_and_history(api):
+    headers = auth(signup(api, "api_chat"))
+    response = httpx.post(api + "/chat", json={"message": "Hello there", "cache": False}, headers=headers, timeout=30)
+    assert response.status_code == 200
+    session_id = response.json()["session_id"]
+    assert response.json()["response"] == REPLY
+
+    response = httpx.post(api + "/chat/stream", json={"message": "And again", "session_id": session_id, "cache": False},
+                          headers=headers, timeout=30)
+    events = sse_events(response.text)
+    assert events[0] == ("start", {"session_id": session_id})
+    assert "".join(data["delta"] for event, data in events if event == "message") == REPLY
+    assert events[-1][0] == "done" and events[-1][1]["response"] == REPLY
+
+    history = httpx.get(api + f"/chat/history/{session_id}", headers=headers).json()
+    assert [m["content"] for m in history["messages"]] == ["Hello there", REPLY, "And again", REPLY]
+
+    results = httpx.get(api + "/chat/search", params={"q": "again"}, headers=headers).json()["results"]
+    assert [r["snippet"] for r in results] == ["And <mark>again</mark>"]
+
+def test_deleted_account_token_stops_working(api):
+    old = auth(signup(api, "api_alice"))
+    assert httpx.post(api + "/chat", json={"message": "Hello there"}, headers=old, timeout=30).status_code == 200
+    assert httpx.get(api + "/chat/history", headers=old).status_code == 200  # cached now
+    assert httpx.delete(api + "/me", headers=old, timeout=60).status_code == 200
+    assert httpx.get(api + "/chat/history", headers=old).status_code == 401
+
+    # The same name signed up again is another account, which the old token must not reach
+    new = auth(signup(api, "api_alice"))
+    assert httpx.post(api + "/chat", json={"message": "I am new"}, headers=new, timeout=30).status_code == 200
+    assert httpx.get(api + "/chat/history", headers=old).status_code == 401
+    assert len(httpx.get(api + "/chat/history", headers=new).json()) == 1
+
+def test_daily_quota(api):
+    headers = auth(signup(api, "api_quota"))
+    for _ in range(100):
+        response = httpx.post(api + "/chat", json={"message": "Hello there", "cache": False}, headers=headers, timeout=30)
+        if response.status_code != 200:
+            break
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) > 0
+    usage = httpx.get(api + "/me/usage", headers=headers).json()
+    assert usage["daily"]["tokens"] >= DAILY_QUOTA
+    assert usage["daily"]["remaining"] == 0
+
+def test_blocked_input(api):
+    headers = auth(signup(api, "api_moderation"))
+    response = httpx.post(api + "/chat", json={"message": "buy my spam"}, headers=headers, timeout=30)
+    assert response.status_code == 400
@@ -0,0 +1,58 @@
+"""
+Authenticated-user cache: hits skip the database, tokens never resolve to another account
+"""
+
+import time
+from datetime import timedelta
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from app import ALGORITHM, SECRET_KEY, authenticate_token, create_access_token
+from auth_cache import user_cache, user_key
+from database import AsyncSessionLocal, User
+
+def token_for(user_id: int, username: str) -> str:
+    return create_access_token({"sub": username, "uid": user_id}, timedelta(minutes=5))
+
+async def authenticate(token: str):
+    async with AsyncSessionLocal() as session:
+        return await authenticate_token(token, session)
+
+@pytest.mark.anyio
+async def test_second_request_is_served_from_the_cache(db, make_user):
+    user_id = make_user("cache_bob")
+    token = token_for(user_id, "cache_bob")
+    assert (await authenticate(token)).id == user_id
+    assert (await user_cache.get(user_key(user_id))).username == "cache_bob"
+    # No session at all: a hit must not touch the database
+    assert (await authenticate_token(token, None)).id == user_id
+
+@pytest.mark.anyio
+async def test_deactivation_invalidates_the_entry(db, make_user):
+    user_id = make_user("cache_carol")
+    token = token_for(user_id, "cache_carol")
+    await authenticate(token)
+    async with AsyncSessionLocal() as session:
+        user = await session.get(User, user_id)
+        user.is_active = False
+        await session.commit()
+    assert await user_cache.get(user_key(user_id)) is None
+    with pytest.raises(HTTPException) as raised:
+        await authenticate(token)
+    assert raised.value.status_code == 401
+
+@pytest.mark.anyio
+async def test_token_of_another_account_is_rejected(db, make_user):
+    user_id = make_user("cache_dave")
+    await authenticate(token_for(user_id, "cache_dave"))  # cached now
+    for token in (
+        token_for(user_id, "cache_eve"),  # same id, other name
+        # Issued before the account existed: an earlier account that had the same id and name
+        jwt.encode({"sub": "cache_dave", "uid": user_id, "iat": time.time() - 3600, "exp": time.time() + 300},
+                   SECRET_KEY, algorithm=ALGORITHM),
+    ):
+        with pytest.raises(HTTPException) as raised:
+            await authenticate(token)
+        assert raised.value.status_code == 401
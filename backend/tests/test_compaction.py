@@ -0,0 +1,40 @@
+"""
+Compaction: older messages folded into the summary, scheduled under the same tenant as the user's chat
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+import compaction
+from compaction import Compactor
+from database import AsyncSessionLocal, Conversation
+
+class RecordingScheduler:
+    """Stands in for the LLM scheduler: records the tenant and answers with a fixed summary"""
+
+    def __init__(self):
+        self.users = []
+
+    async def run(self, user, fn, lane):
+        self.users.append((user, lane))
+        return "The user said hello several times."
+
+@pytest.mark.anyio
+async def test_compaction_runs_under_the_username(db, make_user, add_conversation, monkeypatch):
+    scheduler = RecordingScheduler()
+    monkeypatch.setattr(compaction, "LLM_SCHEDULER_ENABLED", True)
+    monkeypatch.setattr(compaction, "llm_scheduler", scheduler)
+    user_id = make_user("compaction_alice")
+    add_conversation(user_id, "compaction-long", 12, datetime.utcnow() - timedelta(hours=1))
+
+    summarized = await Compactor(threshold=6, keep_recent=4).compact(user_id, "compaction-long")
+    assert summarized == 8
+    assert scheduler.users == [("compaction_alice", compaction.BACKGROUND)]
+    async with AsyncSessionLocal() as session:
+        conversation = (await session.execute(
+            select(Conversation).where(Conversation.session_id == "compaction-long")
+        )).scalar_one()
+    assert conversation.summary == "The user said hello several times."
+    assert await Compactor(threshold=6, keep_recent=4).compact(user_id, "compaction-long") == 0
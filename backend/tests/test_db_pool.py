@@ -0,0 +1,47 @@
+"""
+Connection pool: configuration per URL, checkout wait histogram, timeouts and saturation
+"""
+
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import db_pool
+from db_pool import InstrumentedAsyncPool, PoolMetrics, async_engine_options, pool_metrics
+
+def test_waits_land_in_their_bucket():
+    metrics = PoolMetrics(buckets=(0.01, 0.1))
+    for seconds in (0.001, 0.05, 0.05, 3.0):
+        metrics.record_wait(seconds)
+    snapshot = metrics.snapshot()
+    assert snapshot["wait_buckets"] == {"0.01": 1, "0.1": 2, "+Inf": 1}
+    assert snapshot["checkouts"] == 4 and snapshot["wait_seconds_max"] == 3.0
+
+def test_engine_options():
+    assert async_engine_options("sqlite+aiosqlite:///:memory:") == {}
+    options = async_engine_options("postgresql+asyncpg://db/chat")
+    assert options["poolclass"] is InstrumentedAsyncPool
+    assert "connect_args" not in options
+
+def test_pgbouncer_disables_statement_caches(monkeypatch):
+    monkeypatch.setattr(db_pool, "DB_PGBOUNCER", True)
+    connect_args = async_engine_options("postgresql+asyncpg://db/chat")["connect_args"]
+    assert connect_args["statement_cache_size"] == 0
+    assert connect_args["prepared_statement_name_func"]() != connect_args["prepared_statement_name_func"]()
+
+@pytest.mark.anyio
+async def test_saturated_pool_times_out_and_reports_it(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedAsyncPool,
+                                 pool_size=1, max_overflow=0, pool_timeout=0.1)
+    metrics = PoolMetrics()
+    metrics.watch(engine.sync_engine)
+    timeouts = pool_metrics.timeouts
+    async with engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+        assert metrics.snapshot()["saturation"] == 1.0
+        with pytest.raises(exc.TimeoutError):
+            async with engine.connect():
+                pass
+    assert pool_metrics.timeouts == timeouts + 1
+    assert metrics.snapshot()["checked_out"] == 0 and metrics.connects == 1
+    await engine.dispose()
@@ -0,0 +1,80 @@
+"""
+Batched deletes: messages, archives and tombstones go with their conversation or account
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from archive import Archiver
+from auth_cache import CachedUser, user_cache, user_key
+from database import AsyncSessionLocal, Conversation, ConversationArchive, Message, Tombstone, User, engine
+from deletion import delete_account, delete_conversations
+
+def count(model, *criteria) -> int:
+    with engine.connect() as connection:
+        return connection.scalar(select(func.count()).select_from(model).where(*criteria))
+
+@pytest.mark.anyio
+async def test_delete_conversations_in_batches(db, make_user, add_conversation):
+    user_id = make_user()
+    other_id = make_user()
+    earlier = datetime.utcnow() - timedelta(days=1)
+    doomed = [add_conversation(user_id, f"del-{i}", 25, earlier) for i in range(3)]
+    kept = add_conversation(user_id, "del-kept", 5, earlier)
+    theirs = add_conversation(other_id, "del-theirs", 5, earlier)
+
+    summary = await delete_conversations(user_id, Conversation.session_id.like("del-_"), batch_rows=7)
+    assert summary == {"conversations": 3, "messages": 75}
+    assert count(Message, Message.conversation_id.in_(doomed)) == 0
+    assert count(Message, Message.conversation_id.in_([kept, theirs])) == 10
+    with engine.connect() as connection:
+        tombstones = connection.execute(select(Tombstone.session_id).where(Tombstone.user_id == user_id)).scalars().all()
+    assert sorted(tombstones) == ["del-0", "del-1", "del-2"]
+
+@pytest.mark.anyio
+async def test_database_cascades(db, make_user, add_conversation):
+    user_id = make_user()
+    conversation_id = add_conversation(user_id, "cascade", 10, datetime.utcnow() - timedelta(days=200))
+    await Archiver(archive_after_days=90).archive_before(datetime.utcnow() - timedelta(days=90))
+    assert count(ConversationArchive, ConversationArchive.conversation_id == conversation_id) == 1
+
+    # A plain DELETE, no ORM cascade: the foreign keys remove the archive
+    with engine.begin() as connection:
+        connection.execute(delete(Conversation).where(Conversation.id == conversation_id))
+    assert count(ConversationArchive, ConversationArchive.conversation_id == conversation_id) == 0
+
+@pytest.mark.anyio
+async def test_archived_messages_are_counted(db, make_user, add_conversation):
+    user_id = make_user()
+    add_conversation(user_id, "archived-del", 10, datetime.utcnow() - timedelta(days=200))
+    await Archiver(archive_after_days=90).archive_before(datetime.utcnow() - timedelta(days=90))
+    summary = await delete_conversations(user_id)
+    assert summary == {"conversations": 1, "messages": 10}
+
+@pytest.mark.anyio
+async def test_delete_account(db, make_user, add_conversation):
+    user_id = make_user()
+    add_conversation(user_id, "account-a", 6, datetime.utcnow() - timedelta(hours=1))
+    await delete_conversations(user_id, Conversation.session_id == "account-a")
+    add_conversation(user_id, "account-b", 4, datetime.utcnow() - timedelta(hours=1))
+    await user_cache.store(user_key(user_id), CachedUser(id=user_id, username="x", email="x@example.com"), 0.0)
+
+    summary = await delete_account(user_id, batch_rows=3)
+    assert summary == {"conversations": 1, "messages": 4}
+    assert count(User, User.id == user_id) == 0
+    assert count(Conversation, Conversation.user_id == user_id) == 0
+    assert count(Tombstone, Tombstone.user_id == user_id) == 0
+    # Invalidated explicitly: the Core update does not fire the ORM listener
+    assert await user_cache.get(user_key(user_id)) is None
+
+@pytest.mark.anyio
+async def test_orphans_are_rejected(db):
+    """SQLite enforces the foreign keys the cascades rely on"""
+    from sqlalchemy.exc import IntegrityError
+
+    async with AsyncSessionLocal() as session:
+        session.add(Message(conversation_id=10 ** 9, role="user", content="orphan", timestamp=datetime.utcnow()))
+        with pytest.raises(IntegrityError):
+            await session.commit()
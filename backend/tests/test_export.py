@@ -0,0 +1,72 @@
+"""
+Export and import: archived and live messages in order, resumable from checkpoints, idempotent import
+"""
+
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import export
+from archive import Archiver
+from export import export_chunks, export_records, import_records
+
+async def records(user_id: int, cursor=None) -> list:
+    return [record async for record in export_records(user_id, cursor)]
+
+def contents(exported: list) -> list:
+    return [record["content"] for record in exported if record["type"] == "message"]
+
+@pytest.fixture
+def history(db, make_user, add_conversation):
+    """A user with an archived conversation and a live one"""
+    async def build() -> int:
+        user_id = make_user()
+        now = datetime.utcnow()
+        add_conversation(user_id, f"export-old-{user_id}", 4, now - timedelta(days=200))
+        await Archiver(archive_after_days=90).archive_before(now - timedelta(days=90))
+        add_conversation(user_id, f"export-new-{user_id}", 3, now - timedelta(hours=1))
+        return user_id
+    return build
+
+@pytest.mark.anyio
+async def test_export_covers_archived_and_live_messages(history):
+    user_id = await history()
+    exported = await records(user_id)
+    assert [record["type"] for record in exported][:2] == ["conversation", "message"]
+    assert contents(exported) == [f"export-old-{user_id} message {i}" for i in range(4)] + \
+                                 [f"export-new-{user_id} message {i}" for i in range(3)]
+    assert exported[-1] == {"type": "end", "conversations": 2, "messages": 7}
+
+@pytest.mark.anyio
+async def test_resume_from_a_checkpoint(history, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_CHECKPOINT_RECORDS", 3)
+    user_id = await history()
+    exported = await records(user_id)
+    checkpoints = [i for i, record in enumerate(exported) if record["type"] == "checkpoint"]
+    assert len(checkpoints) == 2
+    for index in checkpoints:  # one inside the archive, one in the live conversation
+        resumed = await records(user_id, exported[index]["cursor"])
+        assert resumed[0]["type"] == "conversation"
+        assert contents(exported[:index]) + contents(resumed) == contents(exported)
+
+@pytest.mark.anyio
+async def test_gzip_chunks_hold_the_same_lines(history):
+    user_id = await history()
+    plain = b"".join([chunk async for chunk in export_chunks(user_id)])
+    compressed = b"".join([chunk async for chunk in export_chunks(user_id, format="gzip")])
+    assert gzip.decompress(compressed) == plain
+    assert [json.loads(line) for line in plain.splitlines()] == await records(user_id)
+
+@pytest.mark.anyio
+async def test_import_is_idempotent(history, make_user):
+    source = await history()
+    exported = await records(source)
+    target = make_user()
+    first = import_records(exported, target)
+    # The source still owns the session ids, so the target's copies are renamed
+    assert first == {"conversations": 2, "renamed_conversations": 2, "messages": 7, "skipped_messages": 0}
+    again = import_records(exported, target)
+    assert again["conversations"] == 0 and again["messages"] == 0 and again["skipped_messages"] == 7
+    assert contents(await records(target)) == contents(exported)
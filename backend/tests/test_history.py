@@ -0,0 +1,79 @@
+"""
+History: keyset-paginated conversations and messages; archived conversations summarized without decoding their archive
+"""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import archive
+from app import get_chat_history
+from archive import Archiver
+from auth_cache import CachedUser
+from database import AsyncSessionLocal
+from history import InvalidCursor, list_conversations, load_message_page
+
+async def history(user_id: int, summary: bool) -> list:
+    async with AsyncSessionLocal() as session:
+        response = await get_chat_history(limit=10, cursor=None, summary=summary,
+                                          current_user=CachedUser(id=user_id, username="u", email="u@example.com"),
+                                          db=session)
+    return json.loads(response.body)
+
+async def all_conversations(user_id: int, limit: int) -> list:
+    sessions, cursor = [], None
+    async with AsyncSessionLocal() as session:
+        while True:
+            page, cursor = await list_conversations(session, user_id, limit, cursor)
+            sessions += [conversation.session_id for conversation in page]
+            if cursor is None:
+                return sessions
+
+@pytest.mark.anyio
+async def test_conversation_pages_cover_everything_once(db, make_user, add_conversation):
+    user_id = make_user()
+    now = datetime.utcnow()
+    for i in range(7):
+        add_conversation(user_id, f"pages-{i}", 2, now - timedelta(minutes=i))
+    for i in range(3):  # equal last_activity: the id breaks the tie
+        add_conversation(user_id, f"pages-tie-{i}", 2, now - timedelta(hours=1))
+    add_conversation(make_user(), "pages-theirs", 2, now)
+
+    sessions = await all_conversations(user_id, limit=3)
+    assert sessions == [f"pages-{i}" for i in range(7)] + [f"pages-tie-{i}" for i in (2, 1, 0)]
+
+@pytest.mark.anyio
+async def test_message_pages_walk_back_from_the_newest(db, make_user, add_conversation):
+    conversation_id = add_conversation(make_user(), "messages", 7, datetime.utcnow() - timedelta(hours=1))
+    pages, cursor = [], None
+    async with AsyncSessionLocal() as session:
+        while True:
+            page, cursor = await load_message_page(session, conversation_id, 3, cursor)
+            pages.append([message["content"].split()[-1] for message in page])
+            if cursor is None:
+                break
+        with pytest.raises(InvalidCursor):
+            await load_message_page(session, conversation_id, 3, "not-a-cursor")
+    assert pages == [["4", "5", "6"], ["1", "2", "3"], ["0"]]
+
+@pytest.mark.anyio
+async def test_summary_lists_archived_conversations_from_their_row(db, make_user, add_conversation, monkeypatch):
+    user_id = make_user()
+    now = datetime.utcnow()
+    add_conversation(user_id, "history-cold", 5, now - timedelta(days=200))
+    add_conversation(user_id, "history-warm", 3, now - timedelta(hours=1))
+    await Archiver(archive_after_days=90).archive_before(now - timedelta(days=90))
+
+    full = await history(user_id, summary=False)
+    assert [c["message_count"] for c in full] == [3, 5]
+    assert full[1]["messages"][-1]["content"] == "history-cold message 4"
+
+    def no_decoding(data, codec):
+        raise AssertionError("summary mode decoded an archive")
+    monkeypatch.setattr(archive, "decompress", no_decoding)
+    summaries = await history(user_id, summary=True)
+    assert [(c["session_id"], c["message_count"], c["messages"]) for c in summaries] == [
+        ("history-warm", 3, [{"role": "user", "content": "history-warm message 2"}]),
+        ("history-cold", 5, [{"role": "user", "content": "history-cold message 4"}]),
+    ]
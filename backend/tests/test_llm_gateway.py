@@ -0,0 +1,129 @@
+"""
+LLM gateway against the fake Groq server: retries, breaker, fallback, hedging and usage
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from llm_gateway import CircuitBreaker, CircuitOpen, LLMGateway, LLMUnavailable
+
+MESSAGES = [{"role": "user", "content": "Hello there"}]
+
+@pytest.fixture
+def faults(fake_groq):
+    """Set injected faults for one test; cleared afterwards"""
+    def set_faults(**values):
+        httpx.post(fake_groq + "/faults", json=values).raise_for_status()
+
+    yield set_faults
+    set_faults(error_rate=0.0, error_status=503, slow_rate=0.0, retry_after=None, failing_models=[])
+
+def gateway(fake_groq, **options) -> LLMGateway:
+    return LLMGateway(api_key="fake-key", base_url=fake_groq, **options)
+
+def test_breaker_opens_and_probes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+def test_breaker_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.0)
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+@pytest.mark.anyio
+async def test_cancelled_probe_is_released():
+    llm = LLMGateway(breaker_threshold=1, breaker_reset=0.0)
+    breaker = llm.breaker("model")
+    breaker.record_failure()
+
+    async def hang(model):
+        await asyncio.sleep(60)
+
+    probe = asyncio.create_task(llm._over_models(["model"], float("inf"), hang))
+    await asyncio.sleep(0.01)
+    assert not breaker.allow()  # the probe is in flight
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+    assert breaker.allow()
+
+@pytest.mark.anyio
+async def test_refused_probe_leaves_the_breaker_half_open(fake_groq, faults):
+    faults(error_rate=1.0, error_status=400)
+    llm = gateway(fake_groq, breaker_threshold=1, breaker_reset=0.0)
+    breaker = llm.breaker("model")
+    breaker.record_failure()
+    with pytest.raises(LLMUnavailable):
+        await llm.complete(["model"], MESSAGES)
+    with pytest.raises(LLMUnavailable):
+        async for _ in llm.stream(["model"], MESSAGES):
+            pass
+    assert breaker.state == "half_open" and breaker.failures == 1
+    assert breaker.allow()  # the probe was released, not left in flight
+    await llm.close()
+
+@pytest.mark.anyio
+async def test_retries_transient_errors(fake_groq, faults):
+    faults(error_rate=0.3, retry_after="0")
+    llm = gateway(fake_groq, max_retries=8, breaker_threshold=10 ** 9)
+    answers = await asyncio.gather(*(llm.complete(["model"], MESSAGES) for _ in range(20)))
+    assert all(answers)
+    assert llm.counters["retries"] > 0
+    await llm.close()
+
+@pytest.mark.anyio
+async def test_open_breaker_fails_fast_then_falls_back(fake_groq, faults):
+    faults(failing_models=["primary"])
+    llm = gateway(fake_groq, max_retries=0, breaker_threshold=2, breaker_reset=60)
+    for _ in range(5):
+        assert await llm.complete(["primary", "fallback"], MESSAGES)
+    assert llm.breaker("primary").state == "open"
+    assert llm.counters["breaker_rejections"] == 3
+    with pytest.raises(CircuitOpen):
+        await llm.complete(["primary"], MESSAGES)
+    await llm.close()
+
+@pytest.mark.anyio
+async def test_outage_raises_unavailable(fake_groq, faults):
+    faults(error_rate=1.0, retry_after="0")
+    llm = gateway(fake_groq, max_retries=1)
+    with pytest.raises(LLMUnavailable):
+        await llm.complete(["model"], MESSAGES)
+    await llm.close()
+
+@pytest.mark.anyio
+async def test_hedged_completion_reports_usage_once(fake_groq, monkeypatch):
+    llm = gateway(fake_groq, hedge=True)
+    monkeypatch.setattr(llm, "hedge_delay", lambda: 0.0)  # both copies are sent and finish together
+    reports = []
+    llm.add_usage_hook(lambda messages, prompt_tokens, completion_tokens: reports.append(completion_tokens))
+    for _ in range(5):
+        assert await llm.complete(["model"], MESSAGES)
+    assert llm.counters["hedges"] == 5
+    assert len(reports) == 5
+    await llm.close()
+
+@pytest.mark.anyio
+async def test_stream_reports_usage_when_the_consumer_stops_early(fake_groq):
+    llm = gateway(fake_groq)
+    reports = []
+    llm.add_usage_hook(lambda messages, prompt_tokens, completion_tokens: reports.append((prompt_tokens, completion_tokens)))
+
+    chunks = llm.stream(["model"], MESSAGES)
+    assert await chunks.__anext__()
+    await chunks.aclose()
+    assert len(reports) == 1
+
+    text = "".join([delta async for delta in llm.stream(["model"], MESSAGES)])
+    assert text == "This is a canned answer from the fake Groq server."
+    assert reports[1][0] is not None  # usage from the last chunk, not an estimate
+    await llm.close()
@@ -0,0 +1,82 @@
+"""
+LLM scheduler: bounded concurrency, round-robin between users, interactive ahead of background work
+"""
+
+import asyncio
+
+import pytest
+
+from llm_scheduler import BACKGROUND, INTERACTIVE, LLMScheduler, SchedulerOverloaded
+
+async def run_all(scheduler: LLMScheduler, requests) -> list:
+    """Queue (user, lane) requests together; return the order they were served in"""
+    order = []
+
+    async def call(user, lane):
+        async def fn():
+            order.append((user, lane))
+            await asyncio.sleep(0.001)
+        await scheduler.run(user, fn, lane=lane)
+
+    await asyncio.gather(*(call(user, lane) for user, lane in requests))
+    return order
+
+@pytest.mark.anyio
+async def test_concurrency_is_bounded():
+    scheduler = LLMScheduler(concurrency=3, window=0.001)
+    running = peak = 0
+
+    async def fn():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    await asyncio.gather(*(scheduler.run(f"user{i % 4}", fn) for i in range(20)))
+    assert peak == 3
+    assert scheduler.running == 0 and scheduler.admitted == 20
+
+@pytest.mark.anyio
+async def test_users_take_turns():
+    scheduler = LLMScheduler(concurrency=1, window=0.01)
+    order = await run_all(scheduler, [("flood", INTERACTIVE)] * 8 + [("quiet", INTERACTIVE)] * 2)
+    assert [user for user, _ in order[:4]] == ["flood", "quiet", "flood", "quiet"]
+
+@pytest.mark.anyio
+async def test_interactive_goes_ahead_of_background():
+    scheduler = LLMScheduler(concurrency=1, window=0.01)
+    order = await run_all(scheduler, [("alice", BACKGROUND)] * 3 + [("bob", INTERACTIVE)] * 6)
+    # Four interactive requests for every background one while both wait
+    assert [lane for _, lane in order[:5]] == [INTERACTIVE] * 4 + [BACKGROUND]
+
+@pytest.mark.anyio
+async def test_admission_control():
+    scheduler = LLMScheduler(concurrency=1, window=0.01, user_limit=2,
+                             queue_limits={INTERACTIVE: 3, BACKGROUND: 1})
+    release = asyncio.Event()
+    waiting = [asyncio.create_task(scheduler.run("alice", release.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+    with pytest.raises(SchedulerOverloaded):
+        scheduler.admit(user="alice")  # alice's share is full
+    waiting.append(asyncio.create_task(scheduler.run("bob", release.wait)))
+    await asyncio.sleep(0)
+    with pytest.raises(SchedulerOverloaded) as raised:
+        scheduler.admit(user="carol")  # the lane is full
+    assert raised.value.retry_after >= 1
+    release.set()
+    await asyncio.gather(*waiting)
+
+@pytest.mark.anyio
+async def test_cancelled_waiter_does_not_leak_a_slot():
+    scheduler = LLMScheduler(concurrency=1, window=0.0)
+    release = asyncio.Event()
+    holder = asyncio.create_task(scheduler.run("alice", release.wait))
+    await asyncio.sleep(0.01)
+    waiter = asyncio.create_task(scheduler.run("bob", release.wait))
+    await asyncio.sleep(0.01)
+    waiter.cancel()
+    release.set()
+    await holder
+    await asyncio.wait_for(scheduler.run("carol", lambda: asyncio.sleep(0)), 1)
+    assert scheduler.running == 0 and scheduler.queued() == 0
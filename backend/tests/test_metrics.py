@@ -0,0 +1,47 @@
+"""
+Request metrics: per-route latency, per-stage spans and SQL statements per request, in the Prometheus format
+"""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from metrics import Histogram, MetricsMiddleware, current_request, format_labels, render_metrics, span, watch_queries
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((1, 5))
+    for value in (0.5, 3, 3, 10):
+        histogram.observe(value)
+    assert histogram.snapshot() == {"count": 4, "sum": 16.5, "buckets": {"1": 1, "5": 3, "+Inf": 4}}
+
+def test_label_values_are_escaped():
+    assert format_labels([("route", 'a"b\\c\nd')]) == '{route="a\\"b\\\\c\\nd"}'
+
+def test_request_is_timed_by_route_template_with_stages_and_queries():
+    engine = create_engine("sqlite://")
+    watch_queries(engine)
+    watch_queries(engine)  # idempotent
+    seen = {}
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics-test/{item_id}")
+    def item(item_id: int):
+        with span("metrics_test_stage"):
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+                connection.execute(text("SELECT 2"))
+        seen.update(current_request().stages, queries=current_request().db_queries)
+        return {"id": item_id}
+
+    with TestClient(app) as client:
+        assert client.get("/metrics-test/1").status_code == 200
+        assert client.get("/metrics-test/2").status_code == 200
+        assert client.get("/metrics-test/x").status_code == 422
+
+    assert seen["queries"] == 2 and seen["metrics_test_stage"] > 0
+    rendered = render_metrics()
+    assert 'http_request_duration_seconds_count{method="GET",route="/metrics-test/{item_id}",status="200"} 2' in rendered
+    assert 'http_request_duration_seconds_count{method="GET",route="/metrics-test/{item_id}",status="422"} 1' in rendered
+    assert 'request_stage_duration_seconds_count{stage="metrics_test_stage"} 2' in rendered
+    assert 'db_queries_per_request_bucket{route="/metrics-test/{item_id}",le="2"} 3' in rendered
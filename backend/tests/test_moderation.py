@@ -0,0 +1,87 @@
+"""
+The blocklist automaton against the matching it replaced and a regex reference
+"""
+
+import random
+import re
+
+import pytest
+
+from moderation import Automaton, StreamModerator, normalize
+
+ALPHABET = "spamadvertismnt _-.!\n"
+
+def old_word_loop(text: str) -> bool:
+    """validate_input before the automaton"""
+    return any(word in text.lower() for word in ["spam", "advertisement"])
+
+def reference(terms, text: str):
+    """Terms matched by regex over the folded text, word boundaries unless wildcarded"""
+    folded = normalize(text)
+    for term in terms:
+        body = re.escape(normalize(term.strip("*")))
+        left = "" if term.startswith("*") else r"(?<!\w)"
+        right = "" if term.endswith("*") else r"(?!\w)"
+        if re.search(left + body + right, folded):
+            return True
+    return False
+
+def streamed(automaton, text: str, rnd) -> tuple:
+    screen = StreamModerator(automaton)
+    output = []
+    position = 0
+    while position < len(text):
+        size = rnd.randint(1, 5)
+        output.append(screen.feed(text[position:position + size]))
+        position += size
+    output.append(screen.flush())
+    return screen.blocked, "".join(output)
+
+def random_text(rnd) -> str:
+    return "".join(rnd.choice(ALPHABET) for _ in range(rnd.randint(0, 40)))
+
+def test_wildcards_match_the_old_substring_loop():
+    automaton = Automaton(["*spam*", "*advertisement*"])
+    rnd = random.Random(1)
+    for _ in range(20000):
+        text = random_text(rnd)
+        if rnd.random() < 0.3:
+            text += rnd.choice(["spam", "Advertisement", "SPAMMER"])
+        assert (automaton.find(text) is not None) == old_word_loop(text), repr(text)
+
+def test_whole_words_match_regex_reference():
+    terms = ["spam", "ad", "spam me", "mad*", "*ment", "a"]
+    automaton = Automaton(terms)
+    rnd = random.Random(2)
+    for _ in range(20000):
+        text = random_text(rnd)
+        assert (automaton.find(text) is not None) == reference(terms, text), repr(text)
+
+def test_stream_moderator_agrees_with_find():
+    terms = ["spam", "spam me", "*vert*"]
+    automaton = Automaton(terms)
+    rnd = random.Random(3)
+    for _ in range(10000):
+        text = random_text(rnd)
+        blocked, released = streamed(automaton, text, rnd)
+        assert (blocked is not None) == (automaton.find(text) is not None), repr(text)
+        if blocked is None:
+            assert released == text
+        else:
+            # Nothing from the blocked term on was sent
+            assert text.startswith(released)
+            assert automaton.find(released) is None
+
+@pytest.mark.parametrize("text", ["ＳＰＡＭ", "Spám", "s\u200bpam", "buy  SPAM now"])
+def test_folding(text):
+    assert Automaton(["spam"]).find(text) == "spam"
+
+@pytest.mark.parametrize("text", ["spammer", "antispam", "spam_bot"])
+def test_whole_word_only(text):
+    assert Automaton(["spam"]).find(text) is None
+
+def test_validate_input_uses_the_blocklist():
+    from app import validate_input
+
+    assert validate_input("this is spam") == (False, "Message contains inappropriate content")
+    assert validate_input("How do I write a function?") == (True, "")
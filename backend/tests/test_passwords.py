@@ -0,0 +1,51 @@
+"""
+Password hashing: bcrypt off the event loop, bounded queue, rehash on cost changes
+"""
+
+import asyncio
+
+import pytest
+
+from passwords import PasswordHasher, PasswordPoolSaturated, hash_password, needs_rehash
+
+@pytest.mark.anyio
+async def test_hash_and_verify_in_the_pool():
+    hasher = PasswordHasher(workers=2, queue_size=2)
+    hashed = await hasher.hash("correct horse")
+    assert await hasher.verify("correct horse", hashed)
+    assert not await hasher.verify("wrong horse", hashed)
+    assert hasher.in_flight == 0
+    hasher.shutdown()
+
+@pytest.mark.anyio
+async def test_event_loop_keeps_running_while_hashing():
+    hasher = PasswordHasher(workers=1, queue_size=0)
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    await hasher._run(hash_password, "password", 13)  # a few hundred ms of bcrypt
+    ticker.cancel()
+    assert ticks > 5
+    hasher.shutdown()
+
+@pytest.mark.anyio
+async def test_saturated_pool_rejects_instead_of_queueing():
+    hasher = PasswordHasher(workers=1, queue_size=1)
+    running = [asyncio.create_task(hasher._run(hash_password, "password", 10)) for _ in range(2)]
+    await asyncio.sleep(0)
+    with pytest.raises(PasswordPoolSaturated):
+        await hasher.hash("one too many")
+    await asyncio.gather(*running)
+    hasher.shutdown()
+
+def test_needs_rehash_when_the_cost_changes():
+    hashed = hash_password("password", rounds=4)
+    assert not needs_rehash(hashed, rounds=4)
+    assert needs_rehash(hashed, rounds=12)
+    assert needs_rehash("not a bcrypt hash")
@@ -0,0 +1,98 @@
+"""
+Write-behind persistence: batches survive a database outage, rows the database rejects are dropped
+"""
+
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+import app
+import persistence
+from database import AsyncSessionLocal, Conversation, Message
+from persistence import MessageWriter, PendingExchange, PersistenceBackpressure, PersistencePending
+
+def exchange(user_id: int, session_id: str) -> PendingExchange:
+    return PendingExchange(session_id=session_id, user_id=user_id, user_msg="Hello there",
+                           response_text="Hi", timestamp=datetime.utcnow())
+
+async def stored(session_id: str) -> int:
+    async with AsyncSessionLocal() as session:
+        return len((await session.execute(
+            select(Message.id).join(Conversation).where(Conversation.session_id == session_id)
+        )).all())
+
+def fail_first(writer: MessageWriter, failures: int):
+    """Make the writer's next writes fail as if the database were unreachable"""
+    write_batch = writer._write_batch
+    calls = {"failed": 0}
+
+    async def flaky(batch):
+        if calls["failed"] < failures:
+            calls["failed"] += 1
+            raise OperationalError("INSERT", {}, ConnectionRefusedError("database is restarting"))
+        await write_batch(batch)
+    writer._write_batch = flaky
+
+@pytest.fixture
+def backoff(monkeypatch):
+    monkeypatch.setattr(persistence, "WRITE_BEHIND_RETRY_MAX_BACKOFF", 0.2)
+
+@pytest.mark.anyio
+async def test_outage_is_retried_until_written(db, make_user, backoff):
+    user_id = make_user()
+    writer = MessageWriter(flush_interval=0.01)
+    fail_first(writer, failures=8)  # well past the old three attempts
+    await writer.enqueue(exchange(user_id, "outage"))
+    await writer.close()
+    assert await stored("outage") == 2
+    assert writer.retries == 8
+    assert writer.dropped == 0
+
+@pytest.mark.anyio
+async def test_full_queue_applies_backpressure_during_an_outage(db, make_user, backoff, monkeypatch):
+    monkeypatch.setattr(persistence, "WRITE_BEHIND_ENQUEUE_TIMEOUT", 0.1)
+    user_id = make_user()
+    writer = MessageWriter(flush_interval=0.01, queue_size=2)
+    fail_first(writer, failures=10 ** 6)
+    await writer.enqueue(exchange(user_id, "backpressure"))
+    await writer.enqueue(exchange(user_id, "backpressure"))
+    with pytest.raises(PersistenceBackpressure):
+        await writer.enqueue(exchange(user_id, "backpressure"))
+    await writer.close(timeout=0.1)
+    assert writer.dropped == 2
+
+@pytest.mark.anyio
+async def test_only_rejected_exchanges_are_dropped(db, make_user):
+    user_id = make_user()
+    writer = MessageWriter(flush_interval=0.01)
+    await writer.enqueue(exchange(user_id, "rejected-good"))
+    await writer.enqueue(exchange(10 ** 6, "rejected-bad"))  # no such user: the foreign key rejects it
+    await writer.close()
+    assert await stored("rejected-good") == 2
+    assert await stored("rejected-bad") == 0
+    assert writer.dropped == 1
+    assert writer.retries == 0
+
+@pytest.mark.anyio
+async def test_barrier_refuses_to_read_past_unwritten_messages(db, make_user, backoff, monkeypatch):
+    monkeypatch.setattr(persistence, "WRITE_BEHIND_BARRIER_TIMEOUT", 0.2)
+    user_id = make_user()
+    writer = MessageWriter(flush_interval=0.01)
+    fail_first(writer, failures=4)
+    await writer.enqueue(exchange(user_id, "barrier"))
+    with pytest.raises(PersistencePending):
+        await writer.barrier(user_id)
+    await writer.barrier(make_user())  # nothing queued for another user
+
+    # The history endpoints answer 503 instead of history without the exchange
+    monkeypatch.setattr(app, "message_writer", writer)
+    with pytest.raises(HTTPException) as raised:
+        await app.wait_for_writes(user_id)
+    assert raised.value.status_code == 503
+
+    await writer.close()
+    await writer.barrier(user_id)
+    assert await stored("barrier") == 2
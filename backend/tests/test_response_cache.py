@@ -0,0 +1,19 @@
+"""
+Response cache keys: whitespace-insensitive, case-sensitive unless opted in
+"""
+
+from response_cache import normalize_content, response_cache_key
+
+def key(content: str) -> str:
+    return response_cache_key("model", [{"role": "system", "content": "System"}, {"role": "user", "content": content}], 0.7, 512)
+
+def test_whitespace_differences_share_a_key():
+    assert key("What is   the capital\nof France?") == key("  What is the capital of France? ")
+
+def test_case_differences_do_not():
+    assert key("Is the US economy growing?") != key("Is the us economy growing?")
+    assert key("print(X)") != key("print(x)")
+
+def test_case_folding_is_opt_in():
+    assert normalize_content("Hello  World", ignore_case=True) == "hello world"
+    assert normalize_content("Hello  World") == "Hello World"
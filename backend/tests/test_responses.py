@@ -0,0 +1,55 @@
+"""
+Responses: fast JSON, ETags and brotli/gzip compression above a size threshold
+"""
+
+import json
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from responses import CompressionMiddleware, FastJSONResponse, dumps, etag_for, etag_matches
+
+ROWS = [{"role": "user", "content": f"message {i} — ünïcode"} for i in range(200)]
+
+def test_dumps_is_compact_utf8_json():
+    body = dumps(ROWS)
+    assert json.loads(body) == ROWS
+    assert "ünïcode".encode() in body and b", " not in body
+
+def test_etags():
+    etag = etag_for(b"body")
+    assert etag == etag_for(b"body") != etag_for(b"other")
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"nope", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag) and not etag_matches('"nope"', etag)
+
+def client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+    @app.get("/rows")
+    def rows(count: int = 200):
+        return FastJSONResponse(ROWS[:count])
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((dumps(row) + b"\n" for row in ROWS), media_type="application/x-ndjson")
+
+    return TestClient(app)
+
+def test_large_bodies_are_compressed_with_the_best_accepted_encoding():
+    with client() as http:
+        for accepted, encoding in (("gzip, br", "br"), ("gzip", "gzip"), ("identity", None)):
+            response = http.get("/rows", headers={"Accept-Encoding": accepted})
+            assert response.headers.get("content-encoding") == encoding
+            assert response.json() == ROWS
+        small = http.get("/rows", params={"count": 1}, headers={"Accept-Encoding": "br"})
+        assert "content-encoding" not in small.headers
+
+def test_streams_are_compressed_chunk_by_chunk():
+    with client() as http:
+        response = http.get("/stream", headers={"Accept-Encoding": "br"})
+        assert response.headers["content-encoding"] == "br"
+        assert [json.loads(line) for line in response.text.splitlines()] == ROWS
@@ -0,0 +1,57 @@
+"""
+Full-text search: ranked live matches, then archived ones, one cursor across both
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from archive import Archiver
+from database import AsyncSessionLocal
+from search import InvalidQuery, SearchUnavailable, search_messages
+
+async def search(user_id: int, query: str, limit: int = 20, cursor=None):
+    async with AsyncSessionLocal() as session:
+        return await search_messages(session, user_id, query, limit, cursor)
+
+async def search_all(user_id: int, query: str, limit: int) -> list:
+    results, cursor = await search(user_id, query, limit)
+    while cursor:
+        page, cursor = await search(user_id, query, limit, cursor)
+        results += page
+    return results
+
+@pytest.mark.anyio
+async def test_live_and_archived_matches(db, make_user, add_conversation):
+    user_id = make_user()
+    other_id = make_user()
+    now = datetime.utcnow()
+    add_conversation(user_id, "search-old", 6, now - timedelta(days=200))
+    add_conversation(user_id, "search-new", 4, now - timedelta(hours=1))
+    add_conversation(other_id, "search-theirs", 4, now - timedelta(hours=1))
+    await Archiver(archive_after_days=90).archive_before(now - timedelta(days=90))
+
+    results = await search_all(user_id, "message", limit=3)
+    sessions = [result["session_id"] for result in results]
+    # Every match once: the live conversation's first, then the archived one's, newest first
+    assert sessions == ["search-new"] * 4 + ["search-old"] * 6
+    assert len({result["message_id"] for result in results}) == 10
+    archived = [result for result in results if result["session_id"] == "search-old"]
+    assert [result["snippet"] for result in archived][0] == "search-old <mark>message</mark> 5"
+
+    results, _ = await search(user_id, "search-old 3")
+    assert [result["snippet"] for result in results] == [
+        "<mark>search</mark>-<mark>old</mark> message <mark>3</mark>"
+    ]
+
+@pytest.mark.anyio
+async def test_invalid_query(db, make_user):
+    with pytest.raises(InvalidQuery):
+        await search(make_user(), "!!!")
+
+@pytest.mark.anyio
+async def test_other_databases_are_unavailable():
+    session = SimpleNamespace(bind=SimpleNamespace(dialect=SimpleNamespace(name="mysql")))
+    with pytest.raises(SearchUnavailable):
+        await search_messages(session, 1, "hello", 10)
@@ -0,0 +1,87 @@
+"""
+Single-flight: one upstream call per key, shared results, waiters leaving without cancelling it
+"""
+
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+@pytest.mark.anyio
+async def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    results = await asyncio.gather(*(flight.do("key", work) for _ in range(10)))
+    assert results == ["answer"] * 10
+    assert len(runs) == 1
+    assert (flight.leaders, flight.followers) == (1, 9)
+    assert await flight.do("key", work) == "answer" and len(runs) == 2  # the key was released
+
+@pytest.mark.anyio
+async def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    results = await asyncio.gather(*(flight.do("key", work) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+@pytest.mark.anyio
+async def test_cancelled_leader_does_not_cancel_the_call():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return "answer"
+
+    leader = asyncio.create_task(flight.do("key", work))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.do("key", work))
+    await asyncio.sleep(0)
+    leader.cancel()
+    with pytest.raises(asyncio.TimeoutError):
+        await flight.do("key", work, timeout=0.01)  # a waiter timing out leaves it running too
+    assert len(flight._tasks) == 1  # held until it finishes, not only weakly by the event loop
+    release.set()
+    assert await follower == "answer"
+    assert leader.cancelled()
+    await asyncio.sleep(0)
+    assert not flight._tasks
+
+@pytest.mark.anyio
+async def test_stream_followers_replay_and_survive_a_leaver():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def chunks():
+        yield "a"
+        yield "b"
+        await release.wait()
+        yield "c"
+
+    async def read(stream, count=None):
+        received = []
+        async for chunk in stream:
+            received.append(chunk)
+            if count and len(received) == count:
+                break
+        return received
+
+    assert await read(flight.stream("key", chunks), count=1) == ["a"]  # the first reader leaves early
+    late = asyncio.create_task(read(flight.stream("key", chunks)))
+    await asyncio.sleep(0.01)
+    release.set()
+    assert await late == ["a", "b", "c"]
+    assert flight.leaders == 1
+    await asyncio.sleep(0)
+    assert not flight._tasks
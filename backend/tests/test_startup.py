@@ -0,0 +1,33 @@
+"""
+Startup: importing the app touches nothing; readiness reflects the database and the LLM API key
+"""
+
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+from app import create_app
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_import_and_factory_have_no_side_effects(tmp_path):
+    database = tmp_path / "untouched.db"
+    env = {key: value for key, value in os.environ.items() if key != "GROQ_API_KEY"}
+    env["DATABASE_URL"] = f"sqlite:///{database}"
+    subprocess.run([sys.executable, "-c", "import app; app.create_app()"],
+                   cwd=BACKEND_DIR, env=env, check=True, timeout=60)
+    assert not database.exists()  # no schema work, not even a connection
+
+def test_liveness_and_readiness(database, monkeypatch):
+    with TestClient(create_app()) as client:
+        assert client.get("/healthz").json() == {"status": "ok"}
+        response = client.get("/readyz")
+        assert response.status_code == 200
+        assert response.json()["checks"] == {"started": True, "llm_api_key": True, "database": True}
+
+        monkeypatch.delenv("GROQ_API_KEY")
+        response = client.get("/readyz")
+        assert response.status_code == 503
+        assert response.json()["checks"]["llm_api_key"] is False
@@ -0,0 +1,53 @@
+"""
+StreamingResponseCleaner must release exactly what clean_response returns for the whole reply
+"""
+
+import random
+
+import pytest
+
+from app import clean_response
+from streaming import StreamingResponseCleaner
+
+# Whole and partial tags, filler and text, so tags also form across chunk boundaries
+TOKENS = ["<think>", "</think>", "<|>", "</|>", "Okay,", "\n", "\n\n", " ", "\t", "Hello", "a", "B",
+          "<", "|", ">", "</", "<th", "ink>", "Ok", "ay,"]
+
+def stream(text: str, sizes) -> str:
+    cleaner = StreamingResponseCleaner()
+    output = []
+    position = 0
+    while position < len(text):
+        size = next(sizes)
+        output.append(cleaner.feed(text[position:position + size]))
+        position += size
+    output.append(cleaner.flush())
+    return "".join(output)
+
+@pytest.mark.parametrize("text, expected", [
+    ("Okay,\n<think>a</think>Hello", "Hello"),
+    ("Okay, let me see<think>plan</think>\nAnswer", "Answer"),
+    ("Hello<think>", "Hello<think>"),
+    ("Hello <think>never closed", "Hello <think>never closed"),
+    ("Okay, so <think>unclosed\nAnswer", "Answer"),
+    ("<|>a<think>b</|>c</think>Done", "<|>aDone"),
+    ("  <think>x</think>  Hi there \n", "Hi there"),
+])
+def test_matches_clean_response(text, expected):
+    assert clean_response(text) == expected
+    for size in range(1, len(text) + 1):
+        assert stream(text, iter(lambda: size, None)) == expected
+
+def test_random_chunked_parity():
+    rnd = random.Random(20261017)
+    sizes = iter(lambda: rnd.randint(1, 6), None)
+    for _ in range(20000):
+        text = "".join(rnd.choice(TOKENS) for _ in range(rnd.randint(0, 12)))
+        assert stream(text, sizes) == clean_response(text), repr(text)
+
+def test_releases_text_before_the_stream_ends():
+    cleaner = StreamingResponseCleaner()
+    assert cleaner.feed("<think>plan</think>Hello, ") == "Hello,"
+    assert cleaner.feed("world <th") == " world"
+    assert cleaner.feed("ink>more</think>!") == " !"
+    assert cleaner.flush() == ""
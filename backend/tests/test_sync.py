@@ -0,0 +1,71 @@
+"""
+Incremental sync: only changes after the cursor, tombstones for deletions, stable idle cursors
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from database import AsyncSessionLocal, Conversation, Message, engine
+from deletion import delete_conversations
+from sync import load_changes
+
+async def sync(user_id: int, cursor=None, limit: int = 50) -> dict:
+    async with AsyncSessionLocal() as db:
+        return await load_changes(db, user_id, cursor, limit)
+
+def contents(changes: dict) -> dict:
+    return {c["session_id"]: [m["content"] for m in c["messages"]] for c in changes["conversations"]}
+
+@pytest.mark.anyio
+async def test_snapshot_then_only_changes(db, make_user, add_conversation):
+    user_id = make_user()
+    earlier = datetime.utcnow() - timedelta(hours=2)
+    add_conversation(user_id, "sync-a", 4, earlier)
+    add_conversation(user_id, "sync-b", 2, earlier + timedelta(minutes=1))
+
+    snapshot = await sync(user_id)
+    assert snapshot["reset"] and not snapshot["has_more"]
+    assert contents(snapshot) == {
+        "sync-a": [f"sync-a message {i}" for i in range(4)],
+        "sync-b": ["sync-b message 0", "sync-b message 1"],
+    }
+
+    # Nothing changed: the same cursor gives the same body (the endpoint answers 304)
+    idle = await sync(user_id, snapshot["cursor"])
+    assert idle == await sync(user_id, snapshot["cursor"])
+    assert idle["conversations"] == [] and idle["deleted"] == [] and not idle["reset"]
+
+    now = datetime.utcnow()
+    with engine.begin() as connection:
+        conversation_id = connection.execute(
+            Conversation.__table__.select().where(Conversation.session_id == "sync-b")
+        ).first().id
+        connection.execute(insert(Message).values(
+            conversation_id=conversation_id, role="user", content="sync-b new", timestamp=now
+        ))
+        connection.execute(Conversation.__table__.update().where(Conversation.id == conversation_id).values(last_activity=now))
+    changes = await sync(user_id, idle["cursor"])
+    assert contents(changes) == {"sync-b": ["sync-b new"]}
+
+@pytest.mark.anyio
+async def test_pages_and_tombstones(db, make_user, add_conversation):
+    user_id = make_user()
+    earlier = datetime.utcnow() - timedelta(hours=2)
+    for i in range(5):
+        add_conversation(user_id, f"page-{i}", 2, earlier + timedelta(minutes=i))
+
+    seen, cursor = [], None
+    while True:
+        page = await sync(user_id, cursor, limit=2)
+        seen += [c["session_id"] for c in page["conversations"]]
+        cursor = page["cursor"]
+        if not page["has_more"]:
+            break
+    assert seen == [f"page-{i}" for i in range(5)]
+
+    await delete_conversations(user_id, Conversation.session_id.in_(["page-1", "page-3"]))
+    changes = await sync(user_id, cursor)
+    assert sorted(changes["deleted"]) == ["page-1", "page-3"]
+    assert changes["conversations"] == []
@@ -0,0 +1,102 @@
+"""
+Token accounting: quotas enforced from memory, batched flushes, several workers sharing the table
+"""
+
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import delete, select
+
+from database import TokenUsage, User, engine
+from usage import QuotaExceeded, UsageTracker, UserTotals, charge, utc_today
+
+def stored(user_id: int) -> list:
+    with engine.connect() as connection:
+        return connection.execute(
+            select(TokenUsage.prompt_tokens, TokenUsage.completion_tokens, TokenUsage.requests)
+            .where(TokenUsage.user_id == user_id)
+        ).all()
+
+@pytest.mark.anyio
+async def test_daily_quota(db, make_user):
+    user_id = make_user()
+    tracker = UsageTracker(daily_quota=1000, monthly_quota=0)
+    await tracker.check(user_id)
+    tracker.add(user_id, 600, 300)
+    await tracker.check(user_id)
+    tracker.add(user_id, 50, 50)
+    with pytest.raises(QuotaExceeded) as raised:
+        await tracker.check(user_id)
+    assert raised.value.period == "daily"
+    assert 0 < raised.value.retry_after <= 86400
+    assert tracker.rejected == 1
+
+@pytest.mark.anyio
+async def test_flush_is_one_row_per_user_and_day(db, make_user):
+    user_id = make_user()
+    tracker = UsageTracker(daily_quota=0, monthly_quota=0)
+    for _ in range(5):
+        tracker.add(user_id, 100, 20)
+    assert await tracker.flush() == 1
+    tracker.add(user_id, 100, 20)
+    await tracker.flush()
+    assert stored(user_id) == [(600, 120, 6)]
+
+@pytest.mark.anyio
+async def test_workers_see_each_others_flushed_usage(db, make_user):
+    user_id = make_user()
+    first = UsageTracker(daily_quota=10000, monthly_quota=0)
+    second = UsageTracker(daily_quota=10000, monthly_quota=0)
+    await second.check(user_id)  # loaded before the other worker's usage
+
+    first.add(user_id, 8000, 2000)
+    await first.flush()
+    await second.check(user_id)  # still within the flush interval: not seen yet
+    await second.flush()  # refreshes its active users from the table
+    with pytest.raises(QuotaExceeded):
+        await second.check(user_id)
+
+@pytest.mark.anyio
+async def test_monthly_quota_counts_earlier_days(db, make_user):
+    user_id = make_user()
+    today = utc_today()
+    if today.day == 1:
+        pytest.skip("no earlier day this month")
+    tracker = UsageTracker(daily_quota=0, monthly_quota=500)
+    tracker.add(user_id, 400, 100, day=today - timedelta(days=1))
+    await tracker.flush()
+    with pytest.raises(QuotaExceeded) as raised:
+        await tracker.check(user_id)
+    assert raised.value.period == "monthly"
+
+def test_totals_roll_over():
+    today = utc_today()
+    totals = UserTotals(today, day_tokens=100, month_tokens=400)
+    tomorrow = today + timedelta(days=1)
+    totals.roll(tomorrow)
+    assert totals.day_tokens == 0
+    assert totals.month_tokens == (400 if tomorrow.month == today.month else 0)
+
+@pytest.mark.anyio
+async def test_record_charges_the_current_user(db, make_user):
+    user_id = make_user()
+    tracker = UsageTracker(daily_quota=0, monthly_quota=0)
+    tracker.record([{"role": "user", "content": "no user charged yet"}], 10, 5)
+    assert tracker.recorded_calls == 0
+    charge(user_id)
+    tracker.record([{"role": "user", "content": "Hello there"}], None, 5)  # prompt estimated
+    assert tracker.recorded_calls == 1
+    assert (await tracker.report(user_id))["daily"]["tokens"] > 5
+
+@pytest.mark.anyio
+async def test_flush_drops_usage_of_deleted_accounts(db, make_user):
+    kept, deleted = make_user(), make_user()
+    tracker = UsageTracker(daily_quota=0, monthly_quota=0)
+    tracker.add(kept, 10, 10)
+    tracker.add(deleted, 10, 10)
+    with engine.begin() as connection:
+        connection.execute(delete(User).where(User.id == deleted))
+    assert await tracker.flush() == 2
+    assert stored(kept) == [(10, 10, 1)]
+    assert stored(deleted) == []
+    assert tracker.flush_failures == 0
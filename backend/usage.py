@@ -0,0 +1,337 @@
+"""
+Per-user token accounting and quotas
+
+The LLM gateway reports the prompt and completion tokens of every
+upstream call (estimated when a stream does not report them), charged to
+the user set with charge() for the current request or compaction job.
+Counts are aggregated in memory and added to token_usage, one row per
+user per UTC day, by one batched upsert every USAGE_FLUSH_INTERVAL_SECONDS
+instead of a write per request.
+
+The quota check on /chat only reads memory: the user's totals for today
+and this month as of the last flush (every worker's usage) plus what
+this worker counted since. Other workers' usage shows up within one
+flush interval, so a quota can be overshot by about that much. A user's
+totals are loaded with one query on their first request, refreshed after
+each flush while they are active, and dropped once they go idle.
+"""
+
+import asyncio
+import os
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from context import estimate_tokens
+from database import AsyncSessionLocal, TokenUsage, User, async_engine
+
+# Usage accounting configuration
+USAGE_ENABLED = os.getenv("USAGE_ENABLED", "true").lower() == "true"
+USAGE_FLUSH_INTERVAL_SECONDS = float(os.getenv("USAGE_FLUSH_INTERVAL_SECONDS", "10"))
+USAGE_DAILY_TOKEN_QUOTA = int(os.getenv("USAGE_DAILY_TOKEN_QUOTA", "0"))  # 0 = unlimited
+USAGE_MONTHLY_TOKEN_QUOTA = int(os.getenv("USAGE_MONTHLY_TOKEN_QUOTA", "0"))  # 0 = unlimited
+USAGE_LOAD_BATCH = 1000  # users per totals query, well under the drivers' bind parameter limits
+
+_charged_user: ContextVar[Optional[int]] = ContextVar("charged_user", default=None)
+
+def charge(user_id: int):
+    """Charge upstream calls made by the rest of the current task, and tasks it starts, to user_id"""
+    _charged_user.set(user_id)
+
+def utc_today() -> date:
+    return datetime.utcnow().date()
+
+def first_of_month(day: date) -> date:
+    return day.replace(day=1)
+
+class QuotaExceeded(Exception):
+    """A user has used up their daily or monthly token quota"""
+
+    def __init__(self, period: str, quota: int, retry_after: float):
+        super().__init__(f"{period.capitalize()} token quota of {quota} exceeded")
+        self.period = period
+        self.quota = quota
+        self.retry_after = retry_after
+
+class UserTotals:
+    """A user's tokens today and this month"""
+
+    __slots__ = ("day", "day_tokens", "month_tokens")
+
+    def __init__(self, day: date, day_tokens: int = 0, month_tokens: int = 0):
+        self.day = day
+        self.day_tokens = day_tokens
+        self.month_tokens = month_tokens
+
+    def roll(self, day: date):
+        """Start counting from zero when the UTC day (or month) has changed"""
+        if day != self.day:
+            if first_of_month(day) != first_of_month(self.day):
+                self.month_tokens = 0
+            self.day_tokens = 0
+            self.day = day
+
+    def add(self, day: date, tokens: int):
+        self.roll(day)
+        self.day_tokens += tokens
+        self.month_tokens += tokens
+
+def upsert_statement(dialect: str):
+    """INSERT ... ON CONFLICT adding to the existing row of the same user and day"""
+    insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+    statement = insert(TokenUsage)
+    return statement.on_conflict_do_update(
+        index_elements=[TokenUsage.user_id, TokenUsage.day],
+        set_={
+            "prompt_tokens": TokenUsage.prompt_tokens + statement.excluded.prompt_tokens,
+            "completion_tokens": TokenUsage.completion_tokens + statement.excluded.completion_tokens,
+            "requests": TokenUsage.requests + statement.excluded.requests,
+        },
+    )
+
+class UsageTracker:
+    """In-memory token counts per user, flushed to token_usage in batches"""
+
+    def __init__(
+        self,
+        flush_interval: float = USAGE_FLUSH_INTERVAL_SECONDS,
+        daily_quota: int = USAGE_DAILY_TOKEN_QUOTA,
+        monthly_quota: int = USAGE_MONTHLY_TOKEN_QUOTA,
+    ):
+        self.flush_interval = flush_interval
+        self.daily_quota = daily_quota
+        self.monthly_quota = monthly_quota
+        # [prompt_tokens, completion_tokens, requests] per (user, day) not yet in the table
+        self._pending: Dict[Tuple[int, date], List[int]] = {}
+        self._totals: Dict[int, UserTotals] = {}
+        self._active: set = set()  # users seen since the last flush
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.recorded_calls = 0
+        self.recorded_tokens = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.flush_failures = 0
+        self.rejected = 0
+
+    @property
+    def quotas_enabled(self) -> bool:
+        return self.daily_quota > 0 or self.monthly_quota > 0
+
+    def start(self):
+        """Start the periodic flush (idempotent)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the periodic flush and write what is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"⚠️ Final token usage flush failed: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"⚠️ Token usage flush failed: {e}")
+
+    def record(self, messages: List[Dict[str, str]], prompt_tokens: Optional[int], completion_tokens: int):
+        """LLM gateway usage hook: count a call against the charged user, if any"""
+        user_id = _charged_user.get()
+        if user_id is None:
+            return
+        if prompt_tokens is None:
+            prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+        self.add(user_id, prompt_tokens, completion_tokens)
+
+    def add(self, user_id: int, prompt_tokens: int, completion_tokens: int, day: Optional[date] = None):
+        """Count one upstream call of a user"""
+        day = day or utc_today()
+        entry = self._pending.get((user_id, day))
+        if entry is None:
+            entry = self._pending[(user_id, day)] = [0, 0, 0]
+        entry[0] += prompt_tokens
+        entry[1] += completion_tokens
+        entry[2] += 1
+        totals = self._totals.get(user_id)
+        if totals is not None:
+            totals.add(day, prompt_tokens + completion_tokens)
+        self._active.add(user_id)
+        self.recorded_calls += 1
+        self.recorded_tokens += prompt_tokens + completion_tokens
+
+    async def check(self, user_id: int):
+        """Raise QuotaExceeded if the user has used up a quota
+
+        Memory only, except for one query on a user's first request since
+        they were last active.
+        """
+        if not self.quotas_enabled:
+            return
+        today = utc_today()
+        totals = self._totals.get(user_id)
+        if totals is None:
+            totals = self._totals[user_id] = (await self._load([user_id]))[user_id]
+        totals.roll(today)
+        self._active.add(user_id)
+
+        if self.daily_quota and totals.day_tokens >= self.daily_quota:
+            self.rejected += 1
+            tomorrow = datetime.combine(today + timedelta(days=1), datetime.min.time())
+            raise QuotaExceeded("daily", self.daily_quota, (tomorrow - datetime.utcnow()).total_seconds())
+        if self.monthly_quota and totals.month_tokens >= self.monthly_quota:
+            self.rejected += 1
+            next_month = datetime.combine(first_of_month(first_of_month(today) + timedelta(days=32)), datetime.min.time())
+            raise QuotaExceeded("monthly", self.monthly_quota, (next_month - datetime.utcnow()).total_seconds())
+
+    def forget(self, user_id: int):
+        """Drop everything held for a user, e.g. after their account was deleted"""
+        for key in [key for key in self._pending if key[0] == user_id]:
+            del self._pending[key]
+        self._totals.pop(user_id, None)
+        self._active.discard(user_id)
+
+    def _pending_by_user(self, user_ids: Iterable[int], today: date) -> Dict[int, List[int]]:
+        """[today's tokens, this month's tokens] per user from the counts not yet flushed"""
+        wanted = set(user_ids)
+        month = first_of_month(today)
+        pending: Dict[int, List[int]] = {}
+        for (user_id, day), (prompt_tokens, completion_tokens, _) in self._pending.items():
+            if user_id in wanted and day >= month:
+                sums = pending.setdefault(user_id, [0, 0])
+                if day == today:
+                    sums[0] += prompt_tokens + completion_tokens
+                sums[1] += prompt_tokens + completion_tokens
+        return pending
+
+    async def _load(self, user_ids: List[int]) -> Dict[int, UserTotals]:
+        """Totals of some users: the table (every worker's flushed usage) plus this worker's pending counts"""
+        today = utc_today()
+        tokens = TokenUsage.prompt_tokens + TokenUsage.completion_tokens
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(TokenUsage.user_id, func.sum(case((TokenUsage.day == today, tokens), else_=0)), func.sum(tokens))
+                .where(TokenUsage.user_id.in_(user_ids), TokenUsage.day >= first_of_month(today))
+                .group_by(TokenUsage.user_id)
+            )
+            flushed = {user_id: (int(day_tokens), int(month_tokens)) for user_id, day_tokens, month_tokens in result.all()}
+        pending = self._pending_by_user(user_ids, today)
+        loaded = {}
+        for user_id in user_ids:
+            day_tokens, month_tokens = flushed.get(user_id, (0, 0))
+            extra_day, extra_month = pending.get(user_id, (0, 0))
+            loaded[user_id] = UserTotals(today, day_tokens + extra_day, month_tokens + extra_month)
+        return loaded
+
+    async def flush(self) -> int:
+        """Add the pending counts to token_usage in one batched upsert, then refresh active users
+
+        Returns the number of rows written. On failure the counts are kept
+        for the next flush.
+        """
+        async with self._lock:
+            batch, self._pending = self._pending, {}
+            active, self._active = self._active, set()
+            if batch:
+                # Sorted, so concurrent flushes from several workers lock rows in the same order
+                rows = [
+                    {"user_id": user_id, "day": day, "prompt_tokens": prompt_tokens,
+                     "completion_tokens": completion_tokens, "requests": requests}
+                    for (user_id, day), (prompt_tokens, completion_tokens, requests) in sorted(batch.items())
+                ]
+                try:
+                    await self._upsert(rows)
+                except Exception:
+                    for key, counts in batch.items():
+                        entry = self._pending.setdefault(key, [0, 0, 0])
+                        for i, count in enumerate(counts):
+                            entry[i] += count
+                    self._active |= active
+                    self.flush_failures += 1
+                    raise
+                self.flushes += 1
+                self.flushed_rows += len(rows)
+
+            # Idle users are reloaded on their next request; the others pick up other workers' usage
+            for user_id in [user_id for user_id in self._totals if user_id not in active]:
+                del self._totals[user_id]
+            users = list(self._totals)
+            for offset in range(0, len(users), USAGE_LOAD_BATCH):
+                self._totals.update(await self._load(users[offset:offset + USAGE_LOAD_BATCH]))
+            return len(batch)
+
+    async def _upsert(self, rows: List[Dict]):
+        statement = upsert_statement(async_engine.dialect.name)
+        async with AsyncSessionLocal() as db:
+            try:
+                await db.execute(statement, rows)
+                await db.commit()
+                return
+            except IntegrityError:
+                await db.rollback()
+            # Usage of accounts deleted since it was counted has nowhere to go
+            result = await db.execute(select(User.id).where(User.id.in_({row["user_id"] for row in rows})))
+            existing = set(result.scalars().all())
+            rows = [row for row in rows if row["user_id"] in existing]
+            if rows:
+                await db.execute(statement, rows)
+            await db.commit()
+
+    async def report(self, user_id: int) -> dict:
+        """The user's usage per day this month, today and this month, with their quotas"""
+        today = utc_today()
+        month = first_of_month(today)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(TokenUsage.day, TokenUsage.prompt_tokens, TokenUsage.completion_tokens, TokenUsage.requests)
+                .where(TokenUsage.user_id == user_id, TokenUsage.day >= month)
+            )
+            days = {day: [prompt_tokens, completion_tokens, requests] for day, prompt_tokens, completion_tokens, requests in result.all()}
+        for (pending_user, day), counts in list(self._pending.items()):
+            if pending_user == user_id and day >= month:
+                entry = days.setdefault(day, [0, 0, 0])
+                for i, count in enumerate(counts):
+                    entry[i] += count
+
+        def period(tokens: int, quota: int) -> dict:
+            return {"tokens": tokens, "quota": quota or None, "remaining": max(0, quota - tokens) if quota else None}
+
+        today_counts = days.get(today, [0, 0, 0])
+        return {
+            "day": today.isoformat(),
+            "daily": period(today_counts[0] + today_counts[1], self.daily_quota),
+            "monthly": period(sum(p + c for p, c, _ in days.values()), self.monthly_quota),
+            "days": [
+                {"day": day.isoformat(), "prompt_tokens": p, "completion_tokens": c, "requests": r}
+                for day, (p, c, r) in sorted(days.items())
+            ],
+        }
+
+    def snapshot(self) -> dict:
+        return {
+            "pending_rows": len(self._pending),
+            "tracked_users": len(self._totals),
+            "recorded_calls": self.recorded_calls,
+            "recorded_tokens": self.recorded_tokens,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "flush_failures": self.flush_failures,
+            "rejected": self.rejected,
+        }
+
+usage_tracker = UsageTracker()
@@ -19,33 +19,66 @@ export default function Chat({ onAuthError }) {
     };
   };
 
-  // Function to fetch chat history
-  const fetchHistory = async () => {
-    setError('');
-    setLoading(true);
-          try {
-        const res = await fetch(API_ENDPOINTS.CHAT_HISTORY, {
-        headers: getAuthHeaders()
+  // Local copy of the user's conversations, kept current by /chat/sync
+  const syncState = useRef({ cursor: null, etag: null, conversations: new Map() });
+
+  const mergeMessages = (existing, incoming) => {
+    const seen = new Set(existing.map(msg => msg.id));
+    return [...existing, ...incoming.filter(msg => !seen.has(msg.id))];
+  };
+
+  // Fetch only what changed since the last sync and merge it into the local copy
+  const syncHistory = async () => {
+    const state = syncState.current;
+    let hasMore = true;
+    while (hasMore) {
+      const url = state.cursor
+        ? `${API_ENDPOINTS.CHAT_SYNC}?cursor=${encodeURIComponent(state.cursor)}`
+        : API_ENDPOINTS.CHAT_SYNC;
+      const res = await fetch(url, {
+        headers: { ...getAuthHeaders(), ...(state.etag && { 'If-None-Match': state.etag }) },
+        cache: 'no-store'
       });
+      if (res.status === 304) break;
       const data = await res.json();
       if (!res.ok) {
         if (res.status === 401 || res.status === 403) {
           if (onAuthError) onAuthError();
-          return;
+          return null;
         }
-        setError(data.detail || 'No chat history found');
-        setMessages([
-          { role: 'bot', content: 'Hello! Ask me anything.' }
-        ]);
-        return;
+        throw new Error(data.detail || 'No chat history found');
       }
-      // If data is an array of chat sessions, use the latest session's messages
-      if (Array.isArray(data) && data.length > 0) {
-        setConversations(data);
+      if (data.reset) state.conversations = new Map();
+      for (const conversation of data.conversations) {
+        const known = state.conversations.get(conversation.session_id);
+        state.conversations.set(conversation.session_id, {
+          ...conversation,
+          messages: mergeMessages(known ? known.messages : [], conversation.messages)
+        });
+      }
+      for (const sessionId of data.deleted) state.conversations.delete(sessionId);
+      state.cursor = data.cursor;
+      state.etag = res.headers.get('ETag');
+      hasMore = data.has_more;
+    }
+    const list = [...state.conversations.values()]
+      .sort((a, b) => b.last_activity.localeCompare(a.last_activity));
+    setConversations(list);
+    return list;
+  };
+
+  // Load chat history and open the latest conversation
+  const fetchHistory = async () => {
+    setError('');
+    setLoading(true);
+    try {
+      const list = await syncHistory();
+      if (!list) return;
+      if (list.length > 0) {
         // Use the latest session's messages
-        const latestSession = data[0];
+        const latestSession = list[0];
         setSelectedSession(latestSession.session_id);
-        setMessages(latestSession.messages || [
+        setMessages(latestSession.messages.length > 0 ? latestSession.messages : [
           { role: 'bot', content: 'Hello! Ask me anything.' }
         ]);
       } else {
@@ -54,7 +87,7 @@ export default function Chat({ onAuthError }) {
         ]);
       }
     } catch (err) {
-      setError('No chat history found');
+      setError(err.message || 'No chat history found');
       setMessages([
         { role: 'bot', content: 'Hello! Ask me anything.' }
       ]);
@@ -85,24 +118,57 @@ export default function Chat({ onAuthError }) {
     setInput('');
     setLoading(true);
     try {
-      const res = await fetch(API_ENDPOINTS.CHAT, {
+      const res = await fetch(API_ENDPOINTS.CHAT_STREAM, {
         method: 'POST',
         headers: getAuthHeaders(),
-        body: JSON.stringify({ message: userMsg.content })
+        body: JSON.stringify({ message: userMsg.content, session_id: selectedSession })
       });
-      const data = await res.json();
       if (!res.ok) {
         if (res.status === 401 || res.status === 403) {
           if (onAuthError) onAuthError();
           return;
         }
-        setError(data.error || 'Error from server');
+        const data = await res.json();
+        setError(data.detail || 'Error from server');
         return;
       }
-      setMessages(msgs => [...msgs, { role: 'bot', content: data.response }]);
-      // Only refresh sidebar if this is a new conversation (no selected session)
+
+      // Read Server-Sent Events and grow the bot message as deltas arrive
+      setMessages(msgs => [...msgs, { role: 'bot', content: '' }]);
+      const appendToBotMessage = (text) => {
+        setMessages(msgs => {
+          const last = msgs[msgs.length - 1];
+          return [...msgs.slice(0, -1), { ...last, content: last.content + text }];
+        });
+      };
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let sessionId = selectedSession;
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const frames = buffer.split('\n\n');
+        buffer = frames.pop();
+        for (const frame of frames) {
+          const event = (frame.match(/^event: (.*)$/m) || [])[1] || 'message';
+          const dataLine = (frame.match(/^data: (.*)$/m) || [])[1];
+          if (!dataLine) continue;
+          const data = JSON.parse(dataLine);
+          if (event === 'message') {
+            appendToBotMessage(data.delta);
+          } else if (event === 'start') {
+            sessionId = data.session_id;
+          } else if (event === 'error') {
+            setError(data.detail || 'Error from server');
+          }
+        }
+      }
+      // Pick up the saved exchange (and changes from other devices) without re-fetching all history
+      await syncHistory();
       if (!selectedSession) {
-        await fetchHistory();
+        setSelectedSession(sessionId);
       }
     } catch (err) {
       setError('Network error');
@@ -155,6 +221,7 @@ export default function Chat({ onAuthError }) {
       }
       
       // Remove from local state
+      syncState.current.conversations.delete(sessionId);
       setConversations(prev => prev.filter(conv => conv.session_id !== sessionId));
       
       // If this was the selected conversation, clear it
@@ -6,7 +6,9 @@ export const API_ENDPOINTS = {
   LOGIN: `${API_BASE_URL}/login`,
   SIGNUP: `${API_BASE_URL}/signup`,
   CHAT: `${API_BASE_URL}/chat`,
+  CHAT_STREAM: `${API_BASE_URL}/chat/stream`,
   CHAT_HISTORY: `${API_BASE_URL}/chat/history`,
+  CHAT_SYNC: `${API_BASE_URL}/chat/sync`,
   CHAT_HISTORY_BY_SESSION: (sessionId) => `${API_BASE_URL}/chat/history/${sessionId}`,
   DELETE_CHAT_HISTORY: (sessionId) => `${API_BASE_URL}/chat/history/${sessionId}`,
 };